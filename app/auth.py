@@ -1,28 +1,48 @@
+import time
 from datetime import datetime, timezone
 
 import bcrypt
 from jose import jwt
 
-from app.crud import get_user_by_username
+from app.identity import Identity, get_login_identity
+from app.metrics import PASSWORD_HASH_SECONDS
+from app.scopes import decode_scopes, encode_scopes
 from app.settings import (
     ALGORITHM,
+    SCOPE_ENCODING,
     SECRET_KEY,
     access_token_expires_delta,
 )
+from app.timing import record, timer
+from app.tracing import span
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
-    )
+    start = time.perf_counter()
+    try:
+        with span("bcrypt.check"):
+            return bcrypt.checkpw(
+                plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+            )
+    finally:
+        elapsed = time.perf_counter() - start
+        PASSWORD_HASH_SECONDS.observe(elapsed, "check")
+        record("bcrypt", elapsed)
 
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    start = time.perf_counter()
+    try:
+        with span("bcrypt.hash"):
+            return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    finally:
+        elapsed = time.perf_counter() - start
+        PASSWORD_HASH_SECONDS.observe(elapsed, "hash")
+        record("bcrypt", elapsed)
 
 
-async def authenticate_user(username: str, password: str):
-    user = await get_user_by_username(username)
+async def authenticate_user(username: str, password: str) -> Identity | None:
+    user = await get_login_identity(username)
     if not user:
         return None
     if not user.hashed_password:
@@ -41,6 +61,26 @@ def create_access_token(
     expire = datetime.now(timezone.utc) + (
         expires_delta or access_token_expires_delta()
     )
-    to_encode.update({"exp": expire, "scopes": scopes or []})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode["exp"] = expire
+    to_encode.update(scope_claims(scopes or []))
+    with timer("jwt"):
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def scope_claims(scopes: list[str], encoding: str = SCOPE_ENCODING) -> dict:
+    compact = encode_scopes(scopes) if encoding != "names" else None
+    if compact is None:
+        return {"scopes": list(scopes)}
+    if encoding == "compact":
+        return {"scp": compact}
+    return {"scopes": list(scopes), "scp": compact}
+
+
+def token_scopes(payload: dict) -> list[str]:
+    """Scopes from either claim form — tokens of both kinds are live during migration."""
+    if "scopes" in payload:
+        return payload["scopes"] or []
+    if "scp" in payload:
+        return decode_scopes(payload["scp"])
+    return []
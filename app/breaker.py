@@ -0,0 +1,112 @@
+"""
+Circuit breaker for optional dependencies (Redis).
+
+Closed: calls go through; `failure_threshold` consecutive failures open it.
+Open: calls are refused with `CircuitOpen` for `cooldown` seconds, so a dead
+dependency costs nothing instead of a connect/read timeout per request.
+Half-open: after the cooldown one call is let through as a probe; success
+closes the breaker, failure reopens it for another cooldown.
+
+    try:
+        async with redis_breaker:
+            data = await get_redis().get(key)
+    except CircuitOpen:
+        data = None
+
+Only `failures` exceptions count against the dependency; anything else
+(e.g. a Redis `ResponseError`) passes through without tripping it.
+"""
+
+import time
+from typing import Callable
+
+from loguru import logger
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        cooldown: float,
+        failures: tuple[type[BaseException], ...] = (Exception,),
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = failures
+        self._clock = clock
+        self.reset()
+
+    def reset(self) -> None:
+        self._state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.cooldown:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; claims the probe slot when half-open."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._state, self._probing = HALF_OPEN, True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        if self._state != CLOSED:
+            logger.info("Circuit {} closed", self.name)
+        self._state, self._consecutive, self._probing = CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        self._consecutive += 1
+        if self._state == HALF_OPEN or self._consecutive >= self.failure_threshold:
+            if self._state != OPEN:
+                self.trips += 1
+                logger.warning(
+                    "Circuit {} open for {}s after {} failure(s)",
+                    self.name, self.cooldown, self._consecutive,
+                )
+            self._state, self._opened_at, self._probing = OPEN, self._clock(), False
+
+    async def __aenter__(self) -> "CircuitBreaker":
+        if not self.allow():
+            raise CircuitOpen(self.name)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if exc is None:
+            self.record_success()
+        elif isinstance(exc, self.failures):
+            self.record_failure()
+        elif isinstance(exc, Exception):
+            # The dependency answered, just not the way the caller liked.
+            self.record_success()
+        else:
+            self._probing = False  # cancelled mid-call: let the next call probe
+        return False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
@@ -1,74 +1,217 @@
+import asyncio
 import hashlib
 import json
+from typing import NamedTuple
 
 from loguru import logger
-from redis.asyncio import Redis
-
-from app.settings import CONTACT_RATE_LIMIT, CONTACT_RATE_WINDOW, REDIS_URL
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.breaker import CircuitBreaker, CircuitOpen
+from app.metrics import VERIFY_CACHE_LOOKUPS
+from app.settings import (
+    REDIS_BREAKER_COOLDOWN,
+    REDIS_BREAKER_FAILURES,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_URL,
+    VERIFY_LOCAL_CACHE_SIZE,
+    VERIFY_LOCAL_TTL,
+)
+from app.timing import timer
+from app.tracking import TrackedCache, track
+from app.tracing import span
 
 _redis: Redis | None = None
+_blocking_redis: Redis | None = None
 VERIFY_TTL = 300  # 5 minutes
 
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=REDIS_BREAKER_FAILURES,
+    cooldown=REDIS_BREAKER_COOLDOWN,
+    failures=(RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError),
+)
+
 
 def get_redis() -> Redis:
+    """Shared client for request-path calls; wrap them in `redis_breaker`."""
     global _redis
     if _redis is None:
-        _redis = Redis.from_url(REDIS_URL, decode_responses=True)
+        pool = BlockingConnectionPool.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_SOCKET_TIMEOUT,  # wait for a free connection
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=30,
+        )
+        _redis = Redis(connection_pool=pool)
     return _redis
 
 
+def get_blocking_redis() -> Redis:
+    """Client without a read timeout, for blocking reads (XREAD BLOCK)."""
+    global _blocking_redis
+    if _blocking_redis is None:
+        _blocking_redis = Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        )
+    return _blocking_redis
+
+
+# Verify-cache entries are hashes {uid, at, payload}. `at` is the Redis server
+# time (µs) at which the miss that produced the entry was observed, i.e. before
+# the user was read from the DB. Invalidating a user stamps a floor
+# (`auth:user_floor:<id>`) with the current server time; entries with
+# `at <= floor` read as misses and just age out. Invalidation is therefore a
+# single SET per user whatever the number of live tokens, and an entry built
+# from a DB read that raced an invalidation can never outlive it.
+#
+# The read script derives the floor key from the entry, so these scripts
+# assume a single (non-cluster) Redis.
+FLOOR_TTL = 2 * VERIFY_TTL  # outlives every entry stamped before the floor
+_MAX_STAMP_AGE_US = VERIFY_TTL * 1_000_000
+_TOKEN_PREFIX = "auth:verify:v2:"
+_FLOOR_PREFIX = "auth:user_floor:"
+_REDIS = {"db.system": "redis"}  # span attributes
+
+# Only populated while `track_verify_cache` runs (REDIS_CLIENT_TRACKING).
+verify_local = TrackedCache(VERIFY_LOCAL_CACHE_SIZE, VERIFY_LOCAL_TTL)
+
+_NOW_LUA = """
+local t = redis.call('TIME')
+local now = t[1] .. string.format('%06d', t[2])
+"""
+
+_READ_LUA = _NOW_LUA + """
+local e = redis.call('HMGET', KEYS[1], 'uid', 'at', 'payload')
+if e[1] then
+    local floor = redis.call('GET', ARGV[1] .. e[1])
+    if not floor or tonumber(e[2]) > tonumber(floor) then
+        return {now, e[3]}
+    end
+end
+return {now}
+"""
+
+_SET_LUA = _NOW_LUA + """
+local floor = redis.call('GET', KEYS[2])
+if floor and tonumber(ARGV[2]) <= tonumber(floor) then
+    return 0
+end
+if tonumber(now) - tonumber(ARGV[2]) > tonumber(ARGV[5]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'uid', ARGV[1], 'at', ARGV[2], 'payload', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+_INVALIDATE_LUA = _NOW_LUA + """
+for _, key in ipairs(KEYS) do
+    local floor = redis.call('GET', key)
+    if floor and tonumber(floor) > tonumber(now) then
+        redis.call('SET', key, floor, 'EX', ARGV[1])
+    else
+        redis.call('SET', key, now, 'EX', ARGV[1])
+    end
+end
+return now
+"""
+
+
+_scripts: dict[str, tuple[Redis, AsyncScript]] = {}
+
+
+def _script(source: str) -> AsyncScript:
+    """EVALSHA with a transparent EVAL fallback on NOSCRIPT, built once per client."""
+    client = get_redis()
+    cached = _scripts.get(source)
+    if cached is None or cached[0] is not client:
+        cached = _scripts[source] = (client, client.register_script(source))
+    return cached[1]
+
+
+class VerifyLookup(NamedTuple):
+    payload: dict | None
+    stamp: str | None  # server time of the lookup; hand it to `set_verify_cache`
+
+
 def _token_key(token: str) -> str:
-    return f"auth:verify:{hashlib.sha256(token.encode()).hexdigest()}"
+    return f"{_TOKEN_PREFIX}{hashlib.sha256(token.encode()).hexdigest()}"
 
 
-def _user_tokens_key(user_id: str) -> str:
-    return f"auth:user_tokens:{user_id}"
+def _floor_key(user_id: str) -> str:
+    return f"{_FLOOR_PREFIX}{user_id}"
 
 
-async def get_verify_cache(token: str) -> dict | None:
+async def get_verify_cache(token: str) -> VerifyLookup:
+    key = _token_key(token)
+    if (payload := verify_local.get(key)) is not None:
+        VERIFY_CACHE_LOOKUPS.inc("local_hit")
+        return VerifyLookup(payload, None)
+    generation = verify_local.begin()
     try:
-        data = await get_redis().get(_token_key(token))
-        return json.loads(data) if data else None
+        with timer("redis"), span("cache.get_verify", attributes=_REDIS):
+            async with redis_breaker:
+                reply = await _script(_READ_LUA)(keys=[key], args=[_FLOOR_PREFIX])
+    except CircuitOpen:
+        VERIFY_CACHE_LOOKUPS.inc("skipped")
+        return VerifyLookup(None, None)
     except Exception:
+        VERIFY_CACHE_LOOKUPS.inc("error")
         logger.warning("Redis get failed — skipping cache", exc_info=True)
-        return None
+        return VerifyLookup(None, None)
+    payload = json.loads(reply[1]) if len(reply) > 1 else None
+    VERIFY_CACHE_LOOKUPS.inc("miss" if payload is None else "hit")
+    if payload is not None and verify_local.enabled:
+        verify_local.put(key, payload["user_id"], payload, generation)
+    return VerifyLookup(payload, reply[0])
 
 
-async def set_verify_cache(token: str, user_id: str, payload: dict) -> None:
-    try:
-        token_hash = hashlib.sha256(token.encode()).hexdigest()
-        pipe = get_redis().pipeline()
-        pipe.setex(_token_key(token), VERIFY_TTL, json.dumps(payload))
-        pipe.sadd(_user_tokens_key(user_id), token_hash)
-        pipe.expire(_user_tokens_key(user_id), VERIFY_TTL)
-        await pipe.execute()
-    except Exception:
-        logger.warning("Redis set failed — skipping cache", exc_info=True)
+async def track_verify_cache() -> None:
+    """Background task: serve verify hits from `verify_local` while Redis tracks them."""
+    await track(verify_local, REDIS_URL, [_TOKEN_PREFIX, _FLOOR_PREFIX], _FLOOR_PREFIX)
 
 
-async def check_contact_rate_limit(ip: str) -> bool:
-    """Returns True if the request is allowed, False if rate-limited."""
-    key = f"contact:rate:{ip}"
+async def set_verify_cache(token: str, user_id: str, payload: dict, stamp: str | None) -> None:
+    """Cache `payload` unless `user_id` was invalidated since `stamp` was taken."""
+    if stamp is None:
+        return
     try:
-        r = get_redis()
-        current = await r.incr(key)
-        if current == 1:
-            await r.expire(key, CONTACT_RATE_WINDOW)
-        return current <= CONTACT_RATE_LIMIT
+        with timer("redis"), span("cache.set_verify", attributes=_REDIS):
+            async with redis_breaker:
+                await _script(_SET_LUA)(
+                    keys=[_token_key(token), _floor_key(user_id)],
+                    args=[user_id, stamp, json.dumps(payload), VERIFY_TTL, _MAX_STAMP_AGE_US],
+                )
+    except CircuitOpen:
+        pass
     except Exception:
-        logger.warning("Redis rate-limit check failed — allowing request", exc_info=True)
-        return True
+        logger.warning("Redis set failed — skipping cache", exc_info=True)
 
 
 async def invalidate_user_cache(user_id: str) -> None:
+    await invalidate_users_cache([user_id])
+
+
+async def invalidate_users_cache(user_ids: list[str]) -> None:
+    """Drop every cached verify entry of these users in one atomic call."""
+    if not user_ids:
+        return
     try:
-        r = get_redis()
-        user_key = _user_tokens_key(user_id)
-        token_hashes = await r.smembers(user_key)
-        if token_hashes:
-            keys = [f"auth:verify:{h}" for h in token_hashes]
-            await r.delete(*keys, user_key)
-        else:
-            await r.delete(user_key)
+        keys = [_floor_key(user_id) for user_id in user_ids]
+        with timer("redis"), span("cache.invalidate", attributes={**_REDIS, "users": len(keys)}):
+            async with redis_breaker:
+                await _script(_INVALIDATE_LUA)(keys=keys, args=[FLOOR_TTL])
+    except CircuitOpen:
+        logger.warning("Redis circuit open — invalidation skipped: users={}", len(user_ids))
     except Exception:
         logger.warning("Redis invalidate failed", exc_info=True)
@@ -1,33 +1,88 @@
+import json
 from uuid import UUID
 
 from ms_core import CRUD
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
 
+from app.db import read
+from app.metrics import db_helper
 from app.models import User
 from app.schemas import Schema
+from app.settings import USER_SEARCH_SCAN_LIMIT, USER_SEARCH_TIMEOUT_MS
 
 user_crud = CRUD(User, Schema)
 
-
-async def get_user_by_username(username: str) -> User | None:
+SEARCH_FIELDS = ("id", "username", "full_name", "email", "is_active", "scopes")
+
+# Trigram-ranked search; ILIKE and % are both served by the GIN gin_trgm_ops
+# indexes from migration 3.
+_SEARCH_SQL_PG = """
+SELECT id, username, full_name, email, is_active, scopes,
+       GREATEST(
+           similarity(username, $1),
+           similarity(COALESCE(full_name, ''), $1),
+           similarity(COALESCE(email, ''), $1)
+       ) AS rank
+FROM "user"
+WHERE username ILIKE $2 OR full_name ILIKE $2 OR email ILIKE $2
+   OR username % $1 OR full_name % $1 OR email % $1
+ORDER BY rank DESC, username
+LIMIT $3 OFFSET $4
+"""
+
+
+class SearchTimeout(Exception):
+    """The search query exceeded `USER_SEARCH_TIMEOUT_MS`."""
+
+
+@db_helper
+async def get_user_by_username(username: str, *, replica: bool = False) -> User | None:
+    """`replica=True` for identity reads that may tolerate bounded replica lag."""
+    if replica:
+        return await read(
+            lambda db: User.get_or_none(username=username, using_db=db), username
+        )
     return await User.get_or_none(username=username)
 
 
+@db_helper
 async def get_user_by_email(email: str) -> User | None:
     return await User.get_or_none(email=email)
 
 
+@db_helper
 async def get_user_by_google_id(google_id: str) -> User | None:
     return await User.get_or_none(google_id=google_id)
 
 
-async def get_user_by_id(user_id: UUID) -> User | None:
+@db_helper
+async def get_user_by_id(user_id: UUID, *, replica: bool = True) -> User | None:
+    """`replica=False` when the caller already knows a newer version than a replica may have."""
+    if replica:
+        return await read(lambda db: User.get_or_none(id=user_id, using_db=db), user_id)
     return await User.get_or_none(id=user_id)
 
 
+@db_helper
+async def get_user_version(user_id: UUID) -> int | None:
+    """Version-only lookup for conditional GETs — no row is materialised."""
+    return await read(
+        lambda db: User.filter(id=user_id)
+        .using_db(db)
+        .first()
+        .values_list("version", flat=True),
+        user_id,
+    )
+
+
+@db_helper
 async def get_user_by_verification_token(token: str) -> User | None:
     return await User.get_or_none(email_verification_token=token)
 
 
+@db_helper
 async def create_user(
     username: str,
     email: str | None,
@@ -50,10 +105,45 @@ async def create_user(
     )
 
 
+@db_helper
 async def get_users_by_ids(ids: list[UUID]) -> list[User]:
-    return await User.filter(id__in=ids).all()
+    return await read(lambda db: User.filter(id__in=ids).using_db(db).all(), *ids)
+
+
+@db_helper
+async def get_user_rows(*fields: str, scopes: list[str] | None = None) -> list[dict]:
+    """
+    Users as plain dicts — skips model instantiation for list endpoints.
+
+    `scopes` keeps only users holding all of them: JSONB containment (`@>`,
+    served by the GIN index from migration 4) on Postgres, a scan elsewhere.
+    """
+
+    async def _rows(db: BaseDBAsyncClient) -> list[dict]:
+        qs = User.all().using_db(db)
+        if not scopes:
+            return await qs.values(*fields)
+        if db.capabilities.dialect == "postgres":
+            return await qs.filter(scopes__contains=list(scopes)).values(*fields)
+        wanted = set(scopes)
+        rows = await qs.values(*fields, *(() if "scopes" in fields else ("scopes",)))
+        rows = [row for row in rows if wanted.issubset(row["scopes"] or ())]
+        if "scopes" not in fields:
+            for row in rows:
+                del row["scopes"]
+        return rows
+
+    return await read(_rows)
+
+
+@db_helper
+async def get_user_rows_by_ids(ids: list[UUID], *fields: str) -> list[dict]:
+    return await read(
+        lambda db: User.filter(id__in=ids).using_db(db).values(*fields), *ids
+    )
 
 
+@db_helper
 async def update_user_scopes(user_id: UUID, scopes: list[str]) -> User | None:
     user = await User.get_or_none(id=user_id)
     if not user:
@@ -61,3 +151,85 @@ async def update_user_scopes(user_id: UUID, scopes: list[str]) -> User | None:
     user.scopes = scopes
     await user.save()
     return user
+
+
+@db_helper
+async def update_user_fields(user_id: UUID, data: dict) -> User | None:
+    """Apply a partial update through `User.save()` so the version is bumped."""
+    user = await User.get_or_none(id=user_id)
+    if not user:
+        return None
+    for field, value in data.items():
+        setattr(user, field, value)
+    await user.save()
+    return user
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _fallback_rank(q: str, row: dict) -> float:
+    needle = q.lower()
+    best = 0.0
+    for field in ("username", "full_name", "email"):
+        value = (row[field] or "").lower()
+        if value == needle:
+            return 1.0
+        if value.startswith(needle):
+            best = max(best, 0.75)
+        elif needle in value:
+            best = max(best, 0.5)
+    return best
+
+
+async def _search_postgres(
+    db: BaseDBAsyncClient, q: str, limit: int, offset: int
+) -> list[dict]:
+    from asyncpg.exceptions import QueryCanceledError
+
+    try:
+        async with in_transaction(db.connection_name) as conn:
+            await conn.execute_script(
+                f"SET LOCAL statement_timeout = {int(USER_SEARCH_TIMEOUT_MS)}"
+            )
+            rows = await conn.execute_query_dict(
+                _SEARCH_SQL_PG, [q, _like_pattern(q), limit, offset]
+            )
+    except QueryCanceledError as exc:
+        raise SearchTimeout(q) from exc
+    for row in rows:
+        if isinstance(row["scopes"], str):
+            row["scopes"] = json.loads(row["scopes"])
+    return rows
+
+
+async def _search_scan(
+    db: BaseDBAsyncClient, q: str, limit: int, offset: int
+) -> list[dict]:
+    rows = (
+        await User.filter(
+            Q(username__icontains=q) | Q(full_name__icontains=q) | Q(email__icontains=q)
+        )
+        .using_db(db)
+        .order_by("username")
+        .limit(USER_SEARCH_SCAN_LIMIT)
+        .values(*SEARCH_FIELDS)
+    )
+    for row in rows:
+        row["rank"] = _fallback_rank(q, row)
+    rows.sort(key=lambda row: -row["rank"])
+    return rows[offset : offset + limit]
+
+
+@db_helper
+async def search_users(q: str, limit: int, offset: int) -> list[dict]:
+    """Ranked match on username, full name and email (trigram on Postgres)."""
+
+    async def _search(db: BaseDBAsyncClient) -> list[dict]:
+        if db.capabilities.dialect == "postgres":
+            return await _search_postgres(db, q, limit, offset)
+        return await _search_scan(db, q, limit, offset)
+
+    return await read(_search)
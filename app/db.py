@@ -0,0 +1,148 @@
+"""
+Read-replica routing for read-only user queries.
+
+When `DB_REPLICA_URL` is set, the read helpers in `app.crud` run on the
+`replica` connection, falling back to the primary (`default`) when:
+- the user being read wrote recently (read-your-writes, tracked per process),
+- the last probe saw replay lag above `DB_REPLICA_MAX_LAG_SECONDS`,
+- the replica failed a probe or a query (skipped until the next good probe).
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from loguru import logger
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import DBConnectionError, OperationalError
+
+from app.pool import db_connection
+from app.settings import (
+    DB_REPLICA_CHECK_INTERVAL,
+    DB_REPLICA_MAX_LAG_SECONDS,
+    DB_REPLICA_STICKY_SECONDS,
+    DB_REPLICA_URL,
+)
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+# Zero while the replica has replayed everything it received, so an idle
+# primary doesn't read as growing lag.
+_PG_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END AS lag"
+)
+_REPLICA_ERRORS = (DBConnectionError, OperationalError, OSError, asyncio.TimeoutError)
+_STICKY_PRUNE_AT = 10_000
+
+T = TypeVar("T")
+
+_enabled = False
+_healthy = False
+_lag: float | None = None
+_sticky: dict[str, float] = {}
+
+
+def register_replica(url: str = DB_REPLICA_URL) -> bool:
+    """Add the replica alias to Tortoise's config; the client is created lazily."""
+    global _enabled
+    if not url:
+        return False
+    connections.db_config[REPLICA] = db_connection(url)
+    _enabled = True
+    return True
+
+
+def reset_replica() -> None:
+    global _enabled, _healthy, _lag
+    _enabled = _healthy = False
+    _lag = None
+    _sticky.clear()
+
+
+def _set_healthy(healthy: bool, reason: str = "") -> None:
+    global _healthy
+    if healthy != _healthy:
+        if healthy:
+            logger.info("DB replica in rotation (lag={}s)", _lag)
+        else:
+            logger.warning("DB replica out of rotation: {}", reason)
+    _healthy = healthy
+
+
+def mark_written(*keys: Any) -> None:
+    """Pin reads for these keys (user id, username) to the primary for a while."""
+    if not _enabled:
+        return
+    now = time.monotonic()
+    deadline = now + DB_REPLICA_STICKY_SECONDS
+    for key in keys:
+        if key is not None:
+            _sticky[str(key)] = deadline
+    if len(_sticky) > _STICKY_PRUNE_AT:
+        for key, until in list(_sticky.items()):
+            if until <= now:
+                del _sticky[key]
+
+
+def _is_sticky(keys: tuple[Any, ...]) -> bool:
+    now = time.monotonic()
+    for key in keys:
+        until = _sticky.get(str(key))
+        if until is not None and until > now:
+            return True
+    return False
+
+
+def read_db(*keys: Any) -> BaseDBAsyncClient:
+    """Connection for a read about `keys` — the replica only when it's safe."""
+    if _enabled and _healthy and not _is_sticky(keys):
+        return connections.get(REPLICA)
+    return connections.get(PRIMARY)
+
+
+async def read(query: Callable[[BaseDBAsyncClient], Awaitable[T]], *keys: Any) -> T:
+    """Run `query` on `read_db(*keys)`, retrying on the primary if the replica fails."""
+    db = read_db(*keys)
+    if db.connection_name != REPLICA:
+        return await query(db)
+    try:
+        return await query(db)
+    except _REPLICA_ERRORS as exc:
+        _set_healthy(False, f"query failed: {exc!r}")
+        return await query(connections.get(PRIMARY))
+
+
+async def probe_replica() -> float | None:
+    """Measure replay lag and update routing. Returns the lag, or None if unreachable."""
+    global _lag
+    if not _enabled:
+        return None
+    db = connections.get(REPLICA)
+    try:
+        if db.capabilities.dialect == "postgres":
+            _, rows = await db.execute_query(_PG_LAG_SQL)
+            lag = float(rows[0]["lag"])
+        else:
+            await db.execute_query("SELECT 1")
+            lag = 0.0
+    except Exception as exc:
+        _lag = None
+        _set_healthy(False, f"probe failed: {exc!r}")
+        return None
+    _lag = lag
+    _set_healthy(lag <= DB_REPLICA_MAX_LAG_SECONDS, f"lag {lag:.2f}s")
+    return lag
+
+
+async def monitor_replica(interval: float = DB_REPLICA_CHECK_INTERVAL) -> None:
+    while True:
+        await probe_replica()
+        await asyncio.sleep(interval)
+
+
+def replica_state() -> dict:
+    return {"enabled": _enabled, "healthy": _healthy, "lag_seconds": _lag}
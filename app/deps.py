@@ -1,17 +1,28 @@
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, Security, status
+from fastapi import Depends, HTTPException, Request, Security, status
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jose import JWTError, jwt
 
-from app.crud import get_user_by_username
+from app.auth import token_scopes
+from app.cache import get_verify_cache, set_verify_cache
+from app.crud import get_user_by_id
+from app.identity import Identity, from_verify_payload, get_identity, verify_payload
 from app.models import User
 from app.schemas import TokenData
-from app.scopes import SCOPE_DESCS, UserScope
+from app.scopes import (
+    SCOPE_DESCS,
+    UserScope,
+    granted_mask,
+    has_scopes,
+    missing_scopes,
+    required_mask,
+)
 from app.settings import (
     ALGORITHM,
     SECRET_KEY,
 )
+from app.timing import timer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", scopes=SCOPE_DESCS)
 
@@ -23,27 +34,79 @@ _CREDENTIALS_EXCEPTION = HTTPException(
 )
 
 
-async def resolve_user(token: str) -> User:
-    """Decode JWT and load the user from DB. Used by verify route + get_current_user."""
+def _token_subject(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
-        if username is None:
-            raise _CREDENTIALS_EXCEPTION
+        with timer("jwt"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise _CREDENTIALS_EXCEPTION
+    if payload.get("sub") is None:
+        raise _CREDENTIALS_EXCEPTION
+    return payload
+
 
-    user = await get_user_by_username(username)
+async def resolve_user(token: str) -> Identity:
+    """
+    Decode JWT and load the user's identity. Used by the verify route, which
+    caches the result, so the read is on the primary: a lagging replica would
+    re-cache scopes a revoke on another pod has just removed.
+    """
+    username = _token_subject(token)["sub"]
+    user = await get_identity(username)
     if user is None or not user.is_active:
         raise _CREDENTIALS_EXCEPTION
 
     return user
 
 
+class CurrentUser:
+    """
+    The authenticated caller. Identity fields are available immediately; the
+    `User` row is only read by `await load()`, once per request.
+    """
+
+    __slots__ = ("id", "username", "scopes", "is_active", "version", "_user")
+
+    def __init__(self, identity: Identity) -> None:
+        self.id = identity.id
+        self.username = identity.username
+        self.scopes = identity.scopes
+        self.is_active = identity.is_active
+        self.version = identity.version
+        self._user: User | None = None
+
+    async def load(self) -> User:
+        if self._user is None:
+            user = await get_user_by_id(self.id)
+            if user is not None and user.version < self.version:
+                # The identity came from the primary or the verify cache; this
+                # pod has no stickiness for the user and the replica lags.
+                user = await get_user_by_id(self.id, replica=False)
+            if user is None:
+                raise _CREDENTIALS_EXCEPTION
+            self._user = user
+        return self._user
+
+
+async def _identify(token: str, username: str) -> Identity | None:
+    """
+    Verify cache first (shared with forwardAuth); a miss reads the primary and
+    fills it, as `resolve_user` does.
+    """
+    cached, stamp = await get_verify_cache(token)
+    if cached is not None:
+        return from_verify_payload(cached)
+    identity = await get_identity(username)
+    if identity is not None and identity.is_active:
+        await set_verify_cache(token, str(identity.id), verify_payload(identity), stamp)
+    return identity
+
+
 async def get_current_user(
+    request: Request,
     security_scopes: SecurityScopes,
     token: Annotated[str, Depends(oauth2_scheme)],
-) -> User:
+) -> CurrentUser:
     authenticate_value = (
         f'Bearer scope="{security_scopes.scope_str}"'
         if security_scopes.scopes
@@ -51,36 +114,42 @@ async def get_current_user(
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
-        token_scopes: list[str] = payload.get("scopes", [])
-        if username is None:
-            raise _CREDENTIALS_EXCEPTION
-        token_data = TokenData(username=username, scopes=token_scopes)
-    except JWTError:
+        payload = _token_subject(token)
+        token_data = TokenData(username=payload["sub"], scopes=token_scopes(payload))
+    except ValueError:
         raise _CREDENTIALS_EXCEPTION
 
-    for scope in security_scopes.scopes:
-        if scope not in token_data.scopes:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions",
-                headers={"WWW-Authenticate": authenticate_value},
-            )
+    if not has_scopes(
+        granted_mask(token_data.scopes), required_mask(security_scopes.scopes)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions",
+            headers={"WWW-Authenticate": authenticate_value},
+        )
 
-    user = await get_user_by_username(token_data.username)  # type: ignore[arg-type]
-    if user is None:
+    # FastAPI only reuses a dependency's result for the same scopes; the memo
+    # covers every `Security(...)` variant within the request.
+    memo: dict[str, CurrentUser] | None = getattr(request.state, "current_users", None)
+    if memo is None:
+        memo = request.state.current_users = {}
+    if (user := memo.get(token)) is not None:
+        return user
+
+    identity = await _identify(token, token_data.username)  # type: ignore[arg-type]
+    if identity is None:
         raise _CREDENTIALS_EXCEPTION
 
-    if not user.is_active:
+    if not identity.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Account is deactivated"
         )
 
+    user = memo[token] = CurrentUser(identity)
     return user
 
 
-async def get_current_active_user(current_user=Security(get_current_user)) -> User:
+async def get_current_active_user(current_user=Security(get_current_user)) -> CurrentUser:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -88,13 +157,15 @@ async def get_current_active_user(current_user=Security(get_current_user)) -> Us
 
 async def get_current_admin_user(
     current_user=Security(get_current_user, scopes=[UserScope.ADMIN]),
-) -> User:
+) -> CurrentUser:
     return current_user
 
 
 def require_scopes(*required: str):
     """
     Factory that returns a dependency enforcing one or more scopes.
+    Scopes are compiled to a bitmask here, so unknown names fail at import time
+    and implied scopes (e.g. "admin:venues" => "admin:venues:read") satisfy checks.
 
     Usage:
         @router.get("/admin-only")
@@ -102,11 +173,14 @@ def require_scopes(*required: str):
             ...
     """
 
+    required_bits = required_mask(required)
+
     async def _dep(
-        current_user: User = Depends(get_current_active_user),
-    ) -> User:
-        missing = [s for s in required if s not in current_user.scopes]
-        if missing:
+        current_user: CurrentUser = Depends(get_current_active_user),
+    ) -> CurrentUser:
+        granted = granted_mask(current_user.scopes)
+        if not has_scopes(granted, required_bits):
+            missing = missing_scopes(granted, required_bits)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Missing required scopes: {', '.join(missing)}",
@@ -0,0 +1,40 @@
+"""
+Strong ETags for user resources, derived from `User.version`.
+
+The version is bumped by `User.save()` on every write, so `"<id>-<version>"`
+changes whenever any representation of the user could have changed.
+"""
+
+from uuid import UUID
+
+from fastapi import Response, status
+
+_CACHE_CONTROL = "private, no-cache"
+
+
+def user_etag(user_id: UUID | str, version: int) -> str:
+    return f'"{user_id}-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """`If-None-Match` uses weak comparison (RFC 9110 §13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = _CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": _CACHE_CONTROL},
+    )
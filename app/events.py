@@ -0,0 +1,148 @@
+"""
+User change events on a Redis Stream, for peer-service cache coherence.
+
+Every write that changes what peers see about a user appends a compact entry
+to `USER_EVENTS_STREAM`:
+
+    id=<uuid>  v=<User.version>  op=update|delete  f=<comma-separated fields>
+
+Peers keep long-lived caches of `/users/bulk` results and follow the stream
+(`follow_user_changes`) to drop or refresh entries. Stream offsets are the
+entry ids, so a peer persists the last offset it applied and resumes from
+it; `v` lets it ignore events older than what it already holds. The stream
+is trimmed to roughly `USER_EVENTS_MAXLEN` entries — a peer whose saved offset
+has been trimmed away gets `ReplayGap` and must resync from `/users/bulk`.
+
+Publishing never fails the request that triggered it: like the verify
+cache, Redis errors are logged and dropped.
+"""
+
+from typing import AsyncIterator, Iterable, NamedTuple
+from uuid import UUID
+
+from loguru import logger
+
+from app.breaker import CircuitOpen
+from app.cache import get_blocking_redis, get_redis, redis_breaker
+from app.settings import USER_EVENTS_MAXLEN, USER_EVENTS_STREAM
+from app.timing import timer
+
+START = "0-0"  # replay everything still in the stream
+LATEST = "$"  # only events published from now on
+
+
+class UserChange(NamedTuple):
+    user_id: UUID | str
+    version: int | None
+    fields: tuple[str, ...] = ()
+    op: str = "update"
+
+
+class UserChangeEvent(NamedTuple):
+    offset: str
+    user_id: str
+    version: int | None
+    fields: tuple[str, ...]
+    op: str
+
+
+class ReplayGap(LookupError):
+    """The requested offset was trimmed away; resync from `/users/bulk`."""
+
+
+def _encode(change: UserChange) -> dict[str, str]:
+    return {
+        "id": str(change.user_id),
+        "v": "" if change.version is None else str(change.version),
+        "op": change.op,
+        "f": ",".join(change.fields),
+    }
+
+
+def _decode(offset: str, data: dict[str, str]) -> UserChangeEvent:
+    return UserChangeEvent(
+        offset=offset,
+        user_id=data["id"],
+        version=int(data["v"]) if data.get("v") else None,
+        fields=tuple(data["f"].split(",")) if data.get("f") else (),
+        op=data.get("op", "update"),
+    )
+
+
+async def publish_user_changes(changes: Iterable[UserChange]) -> None:
+    """Append `changes` in one pipelined round trip."""
+    changes = list(changes)
+    if not changes:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for change in changes:
+            pipe.xadd(
+                USER_EVENTS_STREAM,
+                _encode(change),
+                maxlen=USER_EVENTS_MAXLEN,
+                approximate=True,
+            )
+        with timer("redis"):
+            async with redis_breaker:
+                await pipe.execute()
+    except CircuitOpen:
+        logger.warning("Redis circuit open — user change events dropped: count={}", len(changes))
+    except Exception:
+        logger.warning("User change events not published: count={}", len(changes), exc_info=True)
+
+
+async def publish_user_change(
+    user_id: UUID | str,
+    version: int | None,
+    fields: Iterable[str] = (),
+    op: str = "update",
+) -> None:
+    await publish_user_changes([UserChange(user_id, version, tuple(fields), op)])
+
+
+async def read_user_changes(after: str = START, count: int = 500) -> list[UserChangeEvent]:
+    """
+    Events strictly after `after`, oldest first. Raises `ReplayGap` if trimmed.
+    Nothing is after `LATEST` yet; `follow_user_changes` waits for it.
+    """
+    if after == LATEST:
+        return []
+    r = get_blocking_redis()
+    if after != START:
+        first = await r.xrange(USER_EVENTS_STREAM, count=1)
+        if first and _stream_id(after) < _stream_id(first[0][0]):
+            raise ReplayGap(after)
+    entries = await r.xrange(USER_EVENTS_STREAM, min=f"({after}", count=count)
+    return [_decode(offset, data) for offset, data in entries]
+
+
+def _stream_id(offset: str) -> tuple[int, int]:
+    ms, _, seq = offset.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def follow_user_changes(
+    after: str = LATEST,
+    count: int = 500,
+    block_ms: int = 5000,
+) -> AsyncIterator[UserChangeEvent]:
+    """
+    Replay events after `after`, then tail the stream forever.
+
+        async for event in follow_user_changes(saved_offset):
+            local_cache.pop(event.user_id, None)
+            saved_offset = event.offset
+    """
+    r = get_blocking_redis()
+    if after != LATEST:
+        while batch := await read_user_changes(after, count):
+            for event in batch:
+                yield event
+            after = batch[-1].offset
+    while True:
+        reply = await r.xread({USER_EVENTS_STREAM: after}, count=count, block=block_ms)
+        for _, entries in reply or ():
+            for offset, data in entries:
+                yield _decode(offset, data)
+                after = offset
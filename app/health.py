@@ -0,0 +1,154 @@
+"""
+Background dependency checks behind `/health/ready`.
+
+`health_monitor` (started by the lifespan) probes every dependency each
+`HEALTH_CHECK_INTERVAL` seconds, concurrently and each within
+`HEALTH_CHECK_TIMEOUT`:
+
+- `postgres`: `SELECT 1` on the primary;
+- `redis`: PING on the shared client (outside the breaker, so a failing probe
+  never trips it);
+- `notifications`: GET `HEALTH_NOTIFICATIONS_URL`, only when it is set.
+
+After each round the readiness response is rendered once; the endpoint only
+returns it, so kubelet probe storms cost nothing downstream. Readiness fails
+when a dependency named in `HEALTH_CRITICAL` (default: postgres) failed its
+last check, or when the results are older than three intervals (the monitor
+is stuck). The others are reported but don't take the pod out of rotation.
+"""
+
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+
+import httpx
+from loguru import logger
+from tortoise import connections
+
+from app.cache import get_redis
+from app.db import PRIMARY
+from app.pool import WaitHistogram
+from app.settings import (
+    HEALTH_CHECK_INTERVAL,
+    HEALTH_CHECK_TIMEOUT,
+    HEALTH_CRITICAL,
+    HEALTH_NOTIFICATIONS_URL,
+)
+
+_STALE_INTERVALS = 3
+_STARTING = (503, b'{"status": "starting"}')
+
+
+async def check_postgres() -> None:
+    await connections.get(PRIMARY).execute_query("SELECT 1")
+
+
+async def check_redis() -> None:
+    await get_redis().ping()
+
+
+async def check_notifications() -> None:
+    async with httpx.AsyncClient(timeout=HEALTH_CHECK_TIMEOUT) as client:
+        resp = await client.get(HEALTH_NOTIFICATIONS_URL)
+    if resp.status_code >= 500:
+        raise RuntimeError(f"HTTP {resp.status_code}")
+
+
+class Dependency:
+    def __init__(self, name: str, probe: Callable[[], Awaitable[None]], critical: bool) -> None:
+        self.name = name
+        self.probe = probe
+        self.critical = critical
+        self.ok: bool | None = None  # None until the first check
+        self.latency: float | None = None
+        self.error: str | None = None
+        self.failures = 0  # consecutive
+        self.latencies = WaitHistogram()
+
+    async def check(self, timeout: float) -> None:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.probe(), timeout)
+        except Exception as exc:
+            error = str(exc) or type(exc).__name__
+            if self.ok is not False:
+                logger.warning("Health check {} failing: {}", self.name, error)
+            self.ok, self.error = False, error
+            self.failures += 1
+        else:
+            if self.ok is False:
+                logger.info("Health check {} recovered", self.name)
+            self.ok, self.error = True, None
+            self.failures = 0
+        self.latency = time.perf_counter() - start
+        self.latencies.observe(self.latency)
+
+    def detail(self) -> dict:
+        return {
+            "ok": self.ok,
+            "critical": self.critical,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 2),
+            "error": self.error,
+        }
+
+
+def default_dependencies() -> list[Dependency]:
+    probes = {"postgres": check_postgres, "redis": check_redis}
+    if HEALTH_NOTIFICATIONS_URL:
+        probes["notifications"] = check_notifications
+    return [Dependency(name, probe, name in HEALTH_CRITICAL) for name, probe in probes.items()]
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        dependencies: list[Dependency],
+        interval: float = HEALTH_CHECK_INTERVAL,
+        timeout: float = HEALTH_CHECK_TIMEOUT,
+    ) -> None:
+        self.dependencies = dependencies
+        self.interval = interval
+        self.timeout = timeout
+        self.checked_at: float | None = None  # monotonic, end of the last round
+        self._response = _STARTING
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.check_all()
+            except Exception:
+                logger.warning("Health check round failed", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(dep.check(self.timeout) for dep in self.dependencies))
+        ready = all(dep.ok for dep in self.dependencies if dep.critical)
+        body = {
+            "status": "ok" if ready else "error",
+            "dependencies": {dep.name: dep.detail() for dep in self.dependencies},
+        }
+        self._response = (200 if ready else 503, json.dumps(body).encode())
+        self.checked_at = time.monotonic()
+
+    def readiness(self) -> tuple[int, bytes]:
+        """Status code and JSON body from the last round."""
+        if self.checked_at is None:
+            return _STARTING
+        age = time.monotonic() - self.checked_at
+        if age > _STALE_INTERVALS * self.interval + self.timeout:
+            return 503, b'{"status": "stale", "age_seconds": %d}' % age
+        return self._response
+
+    def snapshot(self) -> dict:
+        return {
+            dep.name: {
+                **dep.detail(),
+                "consecutive_failures": dep.failures,
+                "latency_seconds": dep.latencies.snapshot(),
+            }
+            for dep in self.dependencies
+        }
+
+
+health_monitor = HealthMonitor(default_dependencies())
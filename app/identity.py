@@ -0,0 +1,97 @@
+"""
+Lean identity lookups for the hot auth paths (forwardAuth verify, login).
+
+These callers only need who the user is and what they may do, so they skip
+the ORM query builder and model instantiation and get an `Identity` tuple.
+On Postgres the statements below go straight to the asyncpg connection;
+asyncpg keeps a per-connection LRU of prepared statements
+(`DB_STATEMENT_CACHE_SIZE`, see `app.pool`), so each one is parsed and
+planned once per connection and later calls only bind and execute. Other
+databases use a `values_list` query with the same result.
+
+Handlers that need ORM fields or want to write keep using `app.crud`.
+"""
+
+import json
+from typing import NamedTuple
+from uuid import UUID
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from app.db import PRIMARY, read
+from app.metrics import db_helper
+from app.models import User
+from app.scopes import encode_scopes
+
+IDENTITY_FIELDS = ("id", "username", "scopes", "is_active", "version")
+
+_IDENTITY_SQL = (
+    'SELECT id, username, scopes, is_active, version FROM "user" WHERE username = $1'
+)
+_LOGIN_SQL = (
+    "SELECT id, username, scopes, is_active, version, hashed_password "
+    'FROM "user" WHERE username = $1'
+)
+
+
+class Identity(NamedTuple):
+    id: UUID
+    username: str
+    scopes: list[str]
+    is_active: bool
+    version: int
+    hashed_password: str | None = None  # only loaded by `get_login_identity`
+
+
+def verify_payload(identity: Identity) -> dict:
+    """What the verify cache stores for an active user (see `app.cache`)."""
+    return {
+        "user_id": str(identity.id),
+        "username": identity.username,
+        "scopes": " ".join(identity.scopes),
+        "scope_bits": encode_scopes(identity.scopes),
+        "version": identity.version,
+    }
+
+
+def from_verify_payload(payload: dict) -> Identity:
+    """Only active users are cached, and deactivation invalidates the entry."""
+    return Identity(
+        UUID(payload["user_id"]),
+        payload["username"],
+        payload["scopes"].split(),
+        True,
+        payload["version"],
+    )
+
+
+def _identity(row) -> Identity:
+    user_id, username, scopes, *rest = row
+    if isinstance(scopes, str):  # asyncpg returns jsonb as text
+        scopes = json.loads(scopes)
+    return Identity(user_id, username, scopes or [], *rest)
+
+
+async def _fetch(db: BaseDBAsyncClient, username: str, with_password: bool) -> Identity | None:
+    if db.capabilities.dialect == "postgres":
+        async with db.acquire_connection() as conn:
+            row = await conn.fetchrow(_LOGIN_SQL if with_password else _IDENTITY_SQL, username)
+    else:
+        fields = (*IDENTITY_FIELDS, "hashed_password") if with_password else IDENTITY_FIELDS
+        row = await User.filter(username=username).using_db(db).first().values_list(*fields)
+    return _identity(row) if row is not None else None
+
+
+@db_helper
+async def get_identity(username: str, *, replica: bool = False) -> Identity | None:
+    """`replica=True` for reads that may tolerate bounded replica lag (see `app.db`)."""
+    if replica:
+        return await read(lambda db: _fetch(db, username, False), username)
+    return await _fetch(connections.get(PRIMARY), username, False)
+
+
+@db_helper
+async def get_login_identity(username: str) -> Identity | None:
+    """Identity plus password hash, always from the primary."""
+    return await _fetch(connections.get(PRIMARY), username, True)
@@ -0,0 +1,11 @@
+from .base import (
+    JobConflict,
+    JobNotFound,
+    KeysetJob,
+    cancel_jobs,
+    load_state,
+    resumable,
+    start_job,
+)
+from .default_scopes import DefaultScopesJob
+from .scope_batch import ScopeBatchJob
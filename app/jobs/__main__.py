@@ -0,0 +1,91 @@
+"""
+Run or resume user jobs from a shell (progress is logged per chunk).
+
+    uv run python -m app.jobs scopes --add venues:images --has-scope venues:me
+    uv run python -m app.jobs scopes --remove admin:venues --user-id <uuid> ...
+    uv run python -m app.jobs defaults --retire payments:legacy --dry-run
+    uv run python -m app.jobs defaults --concurrency 4 --pause-ms 200
+    uv run python -m app.jobs resume <job_id>
+    uv run python -m app.jobs status <job_id>
+"""
+
+import argparse
+import asyncio
+import sys
+
+from tortoise import Tortoise
+
+from app.jobs.base import KeysetJob, load_state, resumable
+from app.jobs.default_scopes import DefaultScopesJob
+from app.jobs.scope_batch import ScopeBatchJob
+from app.logging import setup_logging
+from app.schemas import DefaultScopesRequest, ScopeBatchRequest
+from app.scopes import unknown_scopes
+from app.settings import db_url
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--chunk-size", type=int, default=1000)
+    options.add_argument("--concurrency", type=int, default=1)
+    options.add_argument("--pause-ms", type=int, default=0)
+    options.add_argument("--dry-run", action="store_true")
+
+    scopes = sub.add_parser("scopes", parents=[options], help="grant/revoke scopes in bulk")
+    scopes.add_argument("--add", action="append", default=[])
+    scopes.add_argument("--remove", action="append", default=[])
+    scopes.add_argument("--user-id", dest="user_ids", action="append")
+    scopes.add_argument("--has-scope", dest="has_scopes", action="append", default=[])
+    active = scopes.add_mutually_exclusive_group()
+    active.add_argument("--active-only", dest="is_active", action="store_const", const=True)
+    active.add_argument("--inactive-only", dest="is_active", action="store_const", const=False)
+
+    defaults = sub.add_parser(
+        "defaults", parents=[options], help="backfill the current default scopes"
+    )
+    defaults.add_argument("--retire", action="append", default=[])
+    defaults.add_argument("--include-admins", action="store_true")
+    active = defaults.add_mutually_exclusive_group()
+    active.add_argument("--active-only", dest="is_active", action="store_const", const=True)
+    active.add_argument("--inactive-only", dest="is_active", action="store_const", const=False)
+
+    for name in ("resume", "status"):
+        sub.add_parser(name).add_argument("job_id")
+    return parser
+
+
+async def _main(args: argparse.Namespace) -> int:
+    await Tortoise.init(db_url=db_url, modules={"models": ["app.models"]})
+    try:
+        if args.command == "status":
+            print((await load_state(args.job_id)).model_dump_json(indent=2))
+            return 0
+        fields = {k: v for k, v in vars(args).items() if k != "command"}
+        if args.command == "resume":
+            state = await load_state(args.job_id)
+            if not resumable(state):
+                print(f"Job {state.job_id} is {state.status}", file=sys.stderr)
+                return 2
+            job = KeysetJob.from_state(state)
+        elif args.command == "defaults":
+            job = DefaultScopesJob.from_request(DefaultScopesRequest.model_validate(fields))
+            print(f"job_id={job.state.job_id}")
+        else:
+            if unknown := unknown_scopes(args.add):
+                print(f"Unknown scopes: {', '.join(unknown)}", file=sys.stderr)
+                return 2
+            job = ScopeBatchJob.from_request(ScopeBatchRequest.model_validate(fields))
+            print(f"job_id={job.state.job_id}")
+        state = await job.run()
+        print(state.model_dump_json(indent=2))
+        return 0 if state.status == "completed" else 1
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    sys.exit(asyncio.run(_main(_parser().parse_args())))
@@ -0,0 +1,259 @@
+"""
+Resumable, keyset-batched jobs over the user table.
+
+A job walks users in primary-key order, `chunk_size` rows at a time. Up to
+`concurrency` consecutive chunks form a wave and are applied concurrently,
+each in its own transaction; the affected users' verify cache is invalidated
+in one pipelined batch and progress is checkpointed to Redis
+(`jobs:<job_id>`) once the whole wave has committed. When a chunk fails, the
+chunks that did commit are still invalidated and published before the job
+stops. A job stopped by a deploy or crash resumes from the last checkpoint,
+so `apply_chunk` must be idempotent (re-applying a committed chunk changes
+nothing). A running job also re-saves its checkpoint every
+`HEARTBEAT_SECONDS`; one silent for `STALE_AFTER_SECONDS` is taken for dead
+and may be resumed elsewhere.
+
+Between waves the job sleeps `pause_ms`, and waits while the read replica
+lags more than `DB_REPLICA_MAX_LAG_SECONDS`. With `dry_run` the same diff is
+computed and counted but nothing is written.
+"""
+
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timezone
+from typing import ClassVar, NamedTuple
+from uuid import UUID
+
+from loguru import logger
+
+from app.cache import get_redis, invalidate_users_cache, redis_breaker
+from app.db import mark_written, replica_state
+from app.events import UserChange, publish_user_changes
+from app.schemas import JobOptions, JobState
+from app.settings import DB_REPLICA_CHECK_INTERVAL, DB_REPLICA_MAX_LAG_SECONDS
+
+JOB_TTL = 7 * 24 * 3600  # checkpoints outlive any sane job + a weekend
+HEARTBEAT_SECONDS = 15  # a running job checkpoints at least this often
+STALE_AFTER_SECONDS = 4 * HEARTBEAT_SECONDS  # a "running" job silent this long is dead
+
+_tasks: dict[str, asyncio.Task] = {}
+_local_states: dict[str, JobState] = {}
+
+
+class Chunk(NamedTuple):
+    ids: list[UUID]  # rows in this chunk the job should apply to
+    scanned: int  # rows read to find them
+    cursor: UUID | None  # last id read; None when the table is exhausted
+
+
+class Changed(NamedTuple):
+    id: UUID
+    username: str
+    added: tuple[str, ...] = ()
+    removed: tuple[str, ...] = ()
+    version: int | None = None  # after the change
+
+
+class JobNotFound(LookupError):
+    pass
+
+
+class JobConflict(RuntimeError):
+    pass
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _job_key(job_id: str) -> str:
+    return f"jobs:{job_id}"
+
+
+async def save_state(state: JobState) -> None:
+    state.updated_at = _now()
+    _local_states[state.job_id] = state
+    try:
+        async with redis_breaker:
+            await get_redis().set(_job_key(state.job_id), state.model_dump_json(), ex=JOB_TTL)
+    except Exception:
+        logger.warning("Job checkpoint not persisted: job_id={}", state.job_id, exc_info=True)
+
+
+async def load_state(job_id: str) -> JobState:
+    try:
+        async with redis_breaker:
+            data = await get_redis().get(_job_key(job_id))
+    except Exception:
+        logger.warning("Job checkpoint lookup failed: job_id={}", job_id, exc_info=True)
+        data = None
+    if data:
+        return JobState.model_validate_json(data)
+    if job_id in _local_states:
+        return _local_states[job_id]
+    raise JobNotFound(job_id)
+
+
+class KeysetJob(ABC):
+    kind: ClassVar[str]
+    changed_fields: ClassVar[tuple[str, ...]] = ()  # for user change events
+    registry: ClassVar[dict[str, type["KeysetJob"]]] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        if "kind" in cls.__dict__:
+            KeysetJob.registry[cls.kind] = cls
+
+    def __init__(self, state: JobState) -> None:
+        self.state = state
+
+    @classmethod
+    def create(cls, params: dict, options: JobOptions) -> "KeysetJob":
+        now = _now()
+        state = JobState(
+            job_id=uuid.uuid4().hex,
+            kind=cls.kind,
+            params=params,
+            **options.model_dump(),
+            created_at=now,
+            updated_at=now,
+        )
+        return cls(state)
+
+    @staticmethod
+    def from_state(state: JobState) -> "KeysetJob":
+        return KeysetJob.registry[state.kind](state)
+
+    @abstractmethod
+    async def select_chunk(self, after: UUID | None) -> Chunk:
+        """The next chunk of ids after `after`, in primary-key order."""
+
+    @abstractmethod
+    async def apply_chunk(self, ids: list[UUID], stats: Counter) -> list[Changed]:
+        """
+        Apply the change to `ids` in one transaction (or only compute it when
+        `state.dry_run`); return the rows that changed. Job-specific counters
+        go into `stats`.
+        """
+
+    async def _select_wave(self) -> list[Chunk]:
+        wave, cursor = [], self.state.last_id
+        for _ in range(self.state.concurrency):
+            chunk = await self.select_chunk(cursor)
+            if chunk.cursor is None:
+                break
+            wave.append(chunk)
+            cursor = chunk.cursor
+        return wave
+
+    async def _apply_wave(self, wave: list[Chunk], stats: Counter) -> list[Changed]:
+        results = await asyncio.gather(
+            *(self.apply_chunk(c.ids, stats) for c in wave if c.ids),
+            return_exceptions=True,
+        )
+        changed, error = [], None
+        for result in results:
+            if isinstance(result, BaseException):
+                error = error or result
+            else:
+                changed.extend(result)
+        # Sibling chunks of a failed one have committed: a resume would find
+        # their rows already changed, so their caches and events can't wait.
+        await self._propagate(changed)
+        if error is not None:
+            raise error
+        return changed
+
+    async def _propagate(self, changed: list[Changed]) -> None:
+        if not changed or self.state.dry_run:
+            return
+        await invalidate_users_cache([str(c.id) for c in changed])
+        await publish_user_changes(
+            UserChange(c.id, c.version, self.changed_fields) for c in changed
+        )
+        for c in changed:
+            mark_written(c.id, c.username)
+
+    async def _throttle(self) -> None:
+        if self.state.pause_ms:
+            await asyncio.sleep(self.state.pause_ms / 1000)
+        while (lag := replica_state()["lag_seconds"]) and lag > DB_REPLICA_MAX_LAG_SECONDS:
+            logger.info("Job paused for replica lag: job_id={} lag={}s", self.state.job_id, lag)
+            await asyncio.sleep(DB_REPLICA_CHECK_INTERVAL)
+
+    async def _heartbeat(self) -> None:
+        """Checkpoint through long waves and lag waits, so a live job never looks stale."""
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            await save_state(self.state)
+
+    async def run(self) -> JobState:
+        state = self.state
+        state.status, state.error = "running", None
+        await save_state(state)
+        logger.info(
+            "Job started: job_id={} kind={} from={} dry_run={}",
+            state.job_id, state.kind, state.last_id, state.dry_run,
+        )
+        heartbeat = asyncio.create_task(self._heartbeat(), name=f"job-{state.job_id}-heartbeat")
+        try:
+            while wave := await self._select_wave():
+                stats: Counter = Counter()
+                changed = await self._apply_wave(wave, stats)
+                for c in changed:
+                    stats.update(f"added:{s}" for s in c.added)
+                    stats.update(f"removed:{s}" for s in c.removed)
+                state.stats = dict(Counter(state.stats) + stats)
+                state.last_id = wave[-1].cursor
+                state.scanned += sum(c.scanned for c in wave)
+                state.updated += len(changed)
+                state.chunks += len(wave)
+                await save_state(state)
+                logger.info(
+                    "Job progress: job_id={} chunks={} scanned={} updated={}",
+                    state.job_id, state.chunks, state.scanned, state.updated,
+                )
+                await self._throttle()
+            state.status = "completed"
+        except asyncio.CancelledError:
+            state.status = "interrupted"
+            await save_state(state)
+            raise
+        except Exception as exc:
+            logger.exception("Job failed: job_id={}", state.job_id)
+            state.status, state.error = "failed", repr(exc)
+        finally:
+            heartbeat.cancel()
+        await save_state(state)
+        logger.info("Job {}: job_id={} updated={}", state.status, state.job_id, state.updated)
+        return state
+
+
+def resumable(state: JobState) -> bool:
+    if state.job_id in _tasks or state.status == "completed":
+        return False
+    if state.status == "running":
+        return (_now() - state.updated_at).total_seconds() > STALE_AFTER_SECONDS
+    return True
+
+
+async def start_job(job: KeysetJob) -> JobState:
+    """Run `job` in the background of this process; progress is in its checkpoint."""
+    state = job.state
+    if not resumable(state):
+        raise JobConflict(f"Job {state.job_id} is {state.status}")
+    await save_state(state)
+    task = asyncio.create_task(job.run(), name=f"job-{state.job_id}")
+    _tasks[state.job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(state.job_id, None))
+    return state
+
+
+async def cancel_jobs() -> None:
+    """Stop this process's jobs; they checkpoint as "interrupted" and can resume."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
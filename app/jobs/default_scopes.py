@@ -0,0 +1,43 @@
+"""
+Backfill the current default scopes onto existing users.
+
+Registration copies `DEFAULT_USER_SCOPES` into the new row, so changing the
+defaults only affects future users. This job appends whatever the defaults
+now contain and the user lacks — owners (holders of `venues:me`) against
+`DEFAULT_OWNER_SCOPES` — and strips `retire`d scopes. Scopes granted on top
+of the defaults are left alone. Admins (`admin:users`) are skipped unless
+`include_admins` is set.
+"""
+
+from collections import Counter
+from uuid import UUID
+
+from app.jobs.base import Chunk
+from app.jobs.scope_diff import ScopeDiffJob, apply_scope_change
+from app.schemas import DefaultScopesRequest, JobOptions
+from app.scopes import DEFAULT_OWNER_SCOPES, DEFAULT_USER_SCOPES, UserScope, VenueScope
+
+_USER_DEFAULTS = [str(s) for s in dict.fromkeys(DEFAULT_USER_SCOPES)]
+_OWNER_DEFAULTS = [str(s) for s in dict.fromkeys(DEFAULT_OWNER_SCOPES)]
+
+
+class DefaultScopesJob(ScopeDiffJob):
+    kind = "default_scopes"
+
+    @classmethod
+    def from_request(cls, request: DefaultScopesRequest) -> "DefaultScopesJob":
+        params = request.model_dump(mode="json", exclude=set(JobOptions.model_fields))
+        return cls.create(params, request)
+
+    def target(self, scopes: list[str], stats: Counter) -> list[str]:
+        params = self.state.params
+        if UserScope.ADMIN in scopes and not params["include_admins"]:
+            stats["skipped_admins"] += 1
+            return scopes
+        owner = VenueScope.ME in scopes
+        stats["owners" if owner else "users"] += 1
+        defaults = _OWNER_DEFAULTS if owner else _USER_DEFAULTS
+        return apply_scope_change(scopes, defaults, params["retire"])
+
+    async def select_chunk(self, after: UUID | None) -> Chunk:
+        return await self.keyset_chunk(after, self.state.params["is_active"])
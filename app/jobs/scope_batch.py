@@ -0,0 +1,33 @@
+"""
+Batch scope grant/revoke across many users.
+"""
+
+from collections import Counter
+from uuid import UUID
+
+from app.jobs.base import Chunk
+from app.jobs.scope_diff import ScopeDiffJob, apply_scope_change
+from app.schemas import JobOptions, ScopeBatchRequest
+
+
+class ScopeBatchJob(ScopeDiffJob):
+    kind = "scope_batch"
+
+    @classmethod
+    def from_request(cls, request: ScopeBatchRequest) -> "ScopeBatchJob":
+        params = request.model_dump(mode="json", exclude=set(JobOptions.model_fields))
+        if params["user_ids"] is not None:
+            params["user_ids"] = sorted(params["user_ids"], key=UUID)
+        return cls.create(params, request)
+
+    def target(self, scopes: list[str], stats: Counter) -> list[str]:
+        params = self.state.params
+        return apply_scope_change(scopes, params["add"], params["remove"])
+
+    async def select_chunk(self, after: UUID | None) -> Chunk:
+        params = self.state.params
+        if params["user_ids"] is not None:
+            ids = [UUID(i) for i in params["user_ids"]]
+            ids = [i for i in ids if after is None or i > after][: self.state.chunk_size]
+            return Chunk(ids, len(ids), ids[-1] if ids else None)
+        return await self.keyset_chunk(after, params["is_active"], params["has_scopes"])
@@ -0,0 +1,102 @@
+"""
+Shared machinery for jobs that rewrite users' scope lists.
+
+`apply_chunk` locks the chunk's rows, asks `target()` for each user's new
+scope list, and writes every changed row with one set-based UPDATE on
+Postgres (row by row elsewhere). A dry run stops after the diff, so it
+reports exactly what a real run would write.
+"""
+
+import json
+from abc import abstractmethod
+from collections import Counter
+from uuid import UUID
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from app.db import PRIMARY
+from app.jobs.base import Changed, Chunk, KeysetJob
+from app.models import User
+
+_WRITE_SQL_PG = """
+UPDATE "user" AS u SET
+    scopes = d.scopes::jsonb,
+    version = u.version + 1,
+    updated_at = CURRENT_TIMESTAMP
+FROM unnest($1::uuid[], $2::text[]) AS d(id, scopes)
+WHERE u.id = d.id
+"""
+
+
+def apply_scope_change(scopes: list[str], add: list[str], remove: list[str]) -> list[str]:
+    """Append missing `add` scopes (existing order kept, no duplicates), drop `remove`."""
+    dropped = set(remove)
+    return [s for s in dict.fromkeys([*scopes, *add]) if s not in dropped]
+
+
+class ScopeDiffJob(KeysetJob):
+    changed_fields = ("scopes",)
+
+    @abstractmethod
+    def target(self, scopes: list[str], stats: Counter) -> list[str]:
+        """The scope list this user should end up with."""
+
+    async def keyset_chunk(
+        self,
+        after: UUID | None,
+        is_active: bool | None = None,
+        has_scopes: list[str] | None = None,
+    ) -> Chunk:
+        """Next `chunk_size` ids after `after` on the primary, optionally filtered."""
+        db = connections.get(PRIMARY)
+        qs = User.all().using_db(db).order_by("id").limit(self.state.chunk_size)
+        if after is not None:
+            qs = qs.filter(id__gt=after)
+        if is_active is not None:
+            qs = qs.filter(is_active=is_active)
+        if has_scopes and db.capabilities.dialect == "postgres":
+            rows = await qs.filter(scopes__contains=has_scopes).values("id")
+        elif has_scopes:
+            scanned = await qs.values("id", "scopes")
+            rows = [r for r in scanned if set(has_scopes).issubset(r["scopes"] or ())]
+            cursor = scanned[-1]["id"] if scanned else None
+            return Chunk([r["id"] for r in rows], len(scanned), cursor)
+        else:
+            rows = await qs.values("id")
+        ids = [r["id"] for r in rows]
+        return Chunk(ids, len(ids), ids[-1] if ids else None)
+
+    async def apply_chunk(self, ids: list[UUID], stats: Counter) -> list[Changed]:
+        async with in_transaction(PRIMARY) as conn:
+            users = await User.filter(id__in=ids).using_db(conn).select_for_update()
+            changed, writes = [], []
+            for user in users:
+                old = user.scopes or []
+                new = self.target(old, stats)
+                if new == old:
+                    continue
+                had, kept = set(old), set(new)
+                changed.append(
+                    Changed(
+                        user.id,
+                        user.username,
+                        added=tuple(s for s in new if s not in had),
+                        removed=tuple(s for s in old if s not in kept),
+                        version=user.version + 1,  # row is locked; both paths bump by one
+                    )
+                )
+                writes.append((user, new))
+            if self.state.dry_run or not writes:
+                return changed
+
+            if conn.capabilities.dialect == "postgres":
+                await conn.execute_query(
+                    _WRITE_SQL_PG,
+                    [[u.id for u, _ in writes], [json.dumps(new) for _, new in writes]],
+                )
+            else:
+                for user, new in writes:
+                    user.scopes = new
+                    await user.save(using_db=conn, update_fields=["scopes"])
+            return changed
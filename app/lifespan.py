@@ -0,0 +1,133 @@
+"""
+Application lifespan: background tasks that need the ORM to be initialised.
+
+`install_lifespan` nests `lifespan` inside whatever lifespan `setup_app`
+registered, so Tortoise connections exist before anything here runs.
+
+Tortoise creates the asyncpg pool and the Redis client connects on first
+use, so without a warm-up the first requests after a restart pay for the
+connection handshakes. `warm_up` runs as the first background task: it
+opens the primary's pool, pings Redis and builds the Google transport
+(deferred at import, see `app.routers.auth`), concurrently and each within
+`WARMUP_TIMEOUT`. `/health/ready` answers 503 until it has finished, so the
+pod only joins the Service once its pools are open; the process itself
+starts serving (and passes liveness) straight away. From then on readiness
+comes from `health_monitor` (see `app.health`).
+"""
+
+import asyncio
+import contextlib
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import FastAPI
+from loguru import logger
+from tortoise import connections
+
+from app import tracing
+from app.cache import get_redis, redis_breaker, track_verify_cache
+from app.db import PRIMARY, monitor_replica, register_replica
+from app.health import health_monitor
+from app.jobs import cancel_jobs
+from app.mail import mailer
+from app.profiler import loop_monitor
+from app.settings import (
+    GOOGLE_CLIENT_ID,
+    LOOP_LAG_THRESHOLD_MS,
+    REDIS_CLIENT_TRACKING,
+    SMTP_PASSWORD,
+    SMTP_USER,
+    WARMUP_TIMEOUT,
+)
+
+_warm = False
+_warmup: dict[str, float | None] = {}  # step -> seconds, None if it failed
+
+
+async def _open_db() -> None:
+    await connections.get(PRIMARY).execute_query("SELECT 1")
+
+
+async def _ping_redis() -> None:
+    async with redis_breaker:
+        await get_redis().ping()
+
+
+async def _google_transport() -> None:
+    from app.routers.auth import google_request
+
+    google_request()
+
+
+async def _timed(name: str, step: Callable[[], Awaitable[None]]) -> None:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), WARMUP_TIMEOUT)
+    except Exception:
+        _warmup[name] = None
+        logger.warning("Warm-up step {} failed", name, exc_info=True)
+    else:
+        _warmup[name] = round(time.perf_counter() - start, 4)
+
+
+async def warm_up() -> None:
+    """
+    Failed steps are logged and don't hold readiness back: `/health/ready`
+    checks the database itself, and Redis is optional.
+    """
+    global _warm
+    steps = {"db": _open_db, "redis": _ping_redis}
+    if GOOGLE_CLIENT_ID:
+        steps["google"] = _google_transport
+    start = time.perf_counter()
+    await asyncio.gather(*(_timed(name, step) for name, step in steps.items()))
+    _warm = True
+    logger.info("Warm-up done in {:.3f}s: {}", time.perf_counter() - start, _warmup)
+
+
+def is_warm() -> bool:
+    return _warm
+
+
+def warmup_state() -> dict:
+    return {"done": _warm, "seconds": dict(_warmup)}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    tasks = [
+        asyncio.create_task(warm_up(), name="warm-up"),
+        asyncio.create_task(health_monitor.run(), name="health-monitor"),
+    ]
+    if register_replica():
+        tasks.append(asyncio.create_task(monitor_replica(), name="replica-monitor"))
+    if REDIS_CLIENT_TRACKING:
+        tasks.append(asyncio.create_task(track_verify_cache(), name="redis-tracking"))
+    if SMTP_USER and SMTP_PASSWORD:
+        tasks.append(asyncio.create_task(mailer.run(), name="mailer"))
+    if LOOP_LAG_THRESHOLD_MS > 0:
+        tasks.append(asyncio.create_task(loop_monitor.run(), name="loop-monitor"))
+    if isinstance(tracing.exporter, tracing.OtlpExporter):
+        tasks.append(asyncio.create_task(tracing.exporter.run(), name="trace-exporter"))
+    try:
+        yield
+    finally:
+        await cancel_jobs()
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+
+def install_lifespan(application: FastAPI) -> None:
+    outer = application.router.lifespan_context
+
+    @asynccontextmanager
+    async def merged(app: FastAPI):
+        async with outer(app) as state:
+            async with lifespan(app):
+                yield state
+
+    application.router.lifespan_context = merged
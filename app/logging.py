@@ -1,45 +1,235 @@
+"""
+Log setup: loguru for everything, stdlib loggers (uvicorn, fastapi,
+tortoise) routed into it.
+
+- `LOG_FORMAT=json` writes one JSON object per line (time, level, logger,
+  function, line, message, bound extras, exception); `text` is the
+  colorized development format.
+- With `LOG_QUEUE_SIZE` > 0 the caller only enqueues the record; a
+  background thread renders and writes it, so a slow stdout never stalls
+  the event loop. When the queue is full, lines are dropped and counted.
+- uvicorn access lines are sampled per path (`LOG_ACCESS_SAMPLE`); 5xx are
+  always kept.
+- Below ERROR, each call site may log `LOG_RATE_LIMIT` lines per second; the
+  next line let through carries `suppressed=<n>`. Access lines are exempt.
+"""
+
+import atexit
+import json
 import logging
+import os
+import queue
+import random
 import sys
+import threading
+import time
+import traceback
+from typing import Callable, TextIO
 
 from loguru import logger
 
+from app.settings import LOG_ACCESS_SAMPLE, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_RATE_LIMIT
+
+_TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
+    "<level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+# Stack depth from `_InterceptHandler.emit` to the code that called
+# `logging.Logger.info` & co.
+_STDLIB_DEPTH = 6
+_levels: dict[str, str | int] = {}
+
 
 class _InterceptHandler(logging.Handler):
-    """Route stdlib logging (uvicorn, fastapi, tortoise) through loguru."""
+    """
+    Route stdlib logging (uvicorn, fastapi, tortoise) through loguru. Access
+    lines are marked `access=True`: `AccessSampler` already thins them, so
+    the call-site limit leaves them alone.
+    """
+
+    def __init__(self, access: bool = False) -> None:
+        super().__init__()
+        self._logger = logger.bind(access=True) if access else logger
+        self._direct = self._logger.opt(depth=_STDLIB_DEPTH)
 
     def emit(self, record: logging.LogRecord) -> None:
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno  # type: ignore[assignment]
+        level = _levels.get(record.levelname)
+        if level is None:
+            try:
+                level = logger.level(record.levelname).name
+            except ValueError:
+                level = record.levelno
+            _levels[record.levelname] = level
 
-        frame, depth = sys._getframe(6), 6
+        frame, depth = sys._getframe(_STDLIB_DEPTH), _STDLIB_DEPTH
         while frame and frame.f_code.co_filename == logging.__file__:
             frame = frame.f_back  # type: ignore[assignment]
             depth += 1
 
-        logger.opt(depth=depth, exception=record.exc_info).log(
-            level, record.getMessage()
-        )
+        if depth == _STDLIB_DEPTH and record.exc_info is None:
+            log = self._direct  # the common case: no new Logger per record
+        else:
+            log = self._logger.opt(depth=depth, exception=record.exc_info)
+        log.log(level, record.getMessage())
+
+
+def parse_sample(spec: str) -> list[tuple[str, bool, float]]:
+    """`"/auth/verify=0.01,/health/*=0"` -> [(path or prefix, is_prefix, rate)]."""
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        path, _, rate = item.partition("=")
+        prefix = path.endswith("*")
+        rules.append((path.rstrip("*"), prefix, float(rate)))
+    return rules
+
+
+class AccessSampler(logging.Filter):
+    """Keep a fraction of uvicorn access lines per path; 5xx always pass."""
+
+    def __init__(self, rules: list[tuple[str, bool, float]]) -> None:
+        super().__init__()
+        self.rules = rules
+
+    def rate(self, path: str) -> float:
+        for pattern, prefix, rate in self.rules:
+            if path == pattern or (prefix and path.startswith(pattern)):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args
+        if not isinstance(args, tuple) or len(args) != 5:
+            return True
+        _, _, path, _, status = args
+        if isinstance(status, int) and status >= 500:
+            return True
+        rate = self.rate(str(path).partition("?")[0])
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
 
+class CallSiteLimiter:
+    """
+    Loguru filter: at most `per_second` lines per call site below ERROR.
+    uvicorn access lines all share one call site and are sampled instead.
+    """
 
-def setup_logging(level: str | None = None) -> None:
-    import os
+    def __init__(self, per_second: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.per_second = per_second
+        self._clock = clock
+        self._windows: dict[tuple, list] = {}  # site -> [window start, count, suppressed]
+
+    def __call__(self, record) -> bool:
+        if record["level"].no >= logging.ERROR or "access" in record["extra"]:
+            return True
+        site = (record["name"], record["function"], record["line"])
+        now = self._clock()
+        window = self._windows.get(site)
+        if window is None or now - window[0] >= 1.0:
+            suppressed = window[2] if window is not None else 0
+            self._windows[site] = [now, 1, 0]
+            if suppressed:
+                record["extra"]["suppressed"] = suppressed
+            return True
+        if window[1] < self.per_second:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+def json_line(message) -> str:
+    record = message.record
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+        **record["extra"],
+    }
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    return json.dumps(entry, default=str) + "\n"
+
+
+class QueuedWriter:
+    """Loguru stream sink whose lines are rendered and written by a daemon thread."""
+
+    _STOP = object()
+
+    def __init__(self, stream: TextIO, render: Callable = str, maxsize: int = 10_000) -> None:
+        self._stream = stream
+        self._render = render
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def write(self, message) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is self._STOP
+            lines = [self._render(message) for message in batch if message is not self._STOP]
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(f"[log queue full: {dropped} line(s) dropped]\n")
+            try:
+                self._stream.write("".join(lines))
+                self._stream.flush()
+            except Exception:
+                pass
+            if stop:
+                return
+
+    def stop(self) -> None:
+        """Write what is queued and end the thread; called by `logger.remove` and at exit."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout=5)
+
+
+def setup_logging(
+    level: str | None = None,
+    fmt: str = LOG_FORMAT,
+    queue_size: int = LOG_QUEUE_SIZE,
+    stream: TextIO | None = None,
+) -> None:
     level = level or os.environ.get("LOG_LEVEL", "INFO")
+    stream = stream or sys.stdout
     logger.remove()
-    logger.add(
-        sys.stdout,
-        level=level,
-        format=(
-            "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
-            "<level>{level: <8}</level> | "
-            "<cyan>{name}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
-        ),
-        colorize=True,
-    )
+    json_mode = fmt == "json"
+    limiter = CallSiteLimiter(LOG_RATE_LIMIT) if LOG_RATE_LIMIT > 0 else None
+    if queue_size > 0:
+        render = json_line if json_mode else str
+        sink = QueuedWriter(stream, render, queue_size)
+        colorize = not json_mode and stream.isatty()
+        logger.add(sink, level=level, format=_TEXT_FORMAT, colorize=colorize, filter=limiter)
+    elif json_mode:
+        logger.add(
+            lambda message: stream.write(json_line(message)), level=level, filter=limiter
+        )
+    else:
+        logger.add(stream, level=level, format=_TEXT_FORMAT, colorize=True, filter=limiter)
 
     logging.basicConfig(handlers=[_InterceptHandler()], level=0, force=True)
     for name in ("uvicorn", "uvicorn.error", "uvicorn.access", "fastapi", "tortoise"):
         log = logging.getLogger(name)
-        log.handlers = [_InterceptHandler()]
+        log.handlers = [_InterceptHandler(access=name == "uvicorn.access")]
         log.propagate = False
+    access = logging.getLogger("uvicorn.access")
+    access.filters = [f for f in access.filters if not isinstance(f, AccessSampler)]
+    access.addFilter(AccessSampler(parse_sample(LOG_ACCESS_SAMPLE)))
@@ -0,0 +1,268 @@
+"""
+Outbound email through a Redis Stream outbox.
+
+`enqueue_email` appends the rendered message to `MAIL_OUTBOX_STREAM` and
+returns; the request never waits on SMTP. `mailer` (started by the lifespan
+when SMTP credentials are set) reads the outbox as a member of the `mailer`
+consumer group, so each message is taken by one pod:
+
+- one authenticated SMTP connection is kept open between messages and closed
+  after `MAIL_SMTP_IDLE_CLOSE` seconds without mail;
+- up to `MAIL_BATCH_SIZE` entries are sent per round over that connection and
+  acknowledged (XACK + XDEL) in one round trip;
+- a connection or 4xx failure reconnects after an exponential backoff; the
+  entry stays pending and is retried, up to `MAIL_MAX_ATTEMPTS` times;
+- a 5xx refusal, or running out of attempts, moves the entry to
+  `<outbox>:dead` for inspection;
+- entries left pending by a pod that died are reclaimed after a while.
+
+Delivery is at-least-once: a message sent just before Redis became
+unreachable may be sent again.
+"""
+
+import asyncio
+import os
+import socket
+import time
+from email import message_from_string
+from email.message import EmailMessage
+from email.policy import default as default_policy
+from typing import Callable
+
+import aiosmtplib
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.breaker import CircuitOpen
+from app.cache import get_blocking_redis, get_redis, redis_breaker
+from app.metrics import outbound
+from app.settings import (
+    MAIL_BATCH_SIZE,
+    MAIL_MAX_ATTEMPTS,
+    MAIL_OUTBOX_STREAM,
+    MAIL_SMTP_IDLE_CLOSE,
+    SMTP_HOST,
+    SMTP_PASSWORD,
+    SMTP_PORT,
+    SMTP_USER,
+)
+from app.timing import timer
+
+GROUP = "mailer"
+_BLOCK_MS = 5000
+_RECLAIM_IDLE_MS = 300_000  # pending this long on another consumer: it is gone
+_RECLAIM_EVERY = 60.0
+_BACKOFF_BASE = 1.0
+_BACKOFF_MAX = 300.0
+
+
+def smtp_client() -> aiosmtplib.SMTP:
+    """Connects with STARTTLS and logs in on `connect()`."""
+    return aiosmtplib.SMTP(
+        hostname=SMTP_HOST,
+        port=SMTP_PORT,
+        username=SMTP_USER,
+        password=SMTP_PASSWORD,
+        start_tls=True,
+        timeout=30,
+    )
+
+
+async def send_now(msg: EmailMessage) -> None:
+    """One-off delivery on a fresh connection, for when the outbox is unavailable."""
+    smtp = smtp_client()
+    with outbound("smtp"):
+        async with smtp:
+            await smtp.send_message(msg)
+
+
+async def enqueue_email(msg: EmailMessage) -> bool:
+    """Queue `msg` for the mailer. False if Redis couldn't take it."""
+    try:
+        with timer("redis"):
+            async with redis_breaker:
+                await get_redis().xadd(MAIL_OUTBOX_STREAM, {"msg": msg.as_string()})
+        return True
+    except CircuitOpen:
+        logger.warning("Redis circuit open — email not queued: subject={}", msg["Subject"])
+    except Exception:
+        logger.warning("Email not queued: subject={}", msg["Subject"], exc_info=True)
+    return False
+
+
+def _permanent(exc: Exception) -> bool:
+    if isinstance(exc, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(exc, aiosmtplib.SMTPResponseException) and exc.code >= 500
+
+
+class Mailer:
+    def __init__(
+        self,
+        connect: Callable[[], aiosmtplib.SMTP] = smtp_client,
+        batch_size: int = MAIL_BATCH_SIZE,
+        max_attempts: int = MAIL_MAX_ATTEMPTS,
+        idle_close: float = MAIL_SMTP_IDLE_CLOSE,
+        consumer: str = f"{socket.gethostname()}-{os.getpid()}",
+    ) -> None:
+        self._connect = connect
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.idle_close = idle_close
+        self.consumer = consumer
+        self._smtp: aiosmtplib.SMTP | None = None
+        self._group_ready = False
+        self._last_sent = 0.0
+        self._last_reclaim = 0.0
+        self._attempts: dict[str, int] = {}
+        self._failures = 0  # consecutive failed rounds, for the backoff
+        self.sent = self.retried = self.dead = self.connects = 0
+
+    async def run(self, redis: Redis | None = None) -> None:
+        redis = redis or get_blocking_redis()
+        while True:
+            try:
+                await self.step(redis)
+                self._failures = 0
+            except asyncio.CancelledError:
+                await self.close()
+                raise
+            except Exception:
+                self._group_ready = False  # the outbox may have been flushed
+                self._failures += 1
+                delay = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** (self._failures - 1))
+                logger.warning("Mailer round failed; retrying in {}s", delay, exc_info=True)
+                await asyncio.sleep(delay)
+
+    async def step(self, redis: Redis) -> int:
+        """One round: read a batch (own retries first) and deliver it. Returns entries sent."""
+        if not self._group_ready:
+            await self._ensure_group(redis)
+        entries = await self._pending(redis) or await self._reclaim(redis)
+        if not entries:
+            reply = await redis.xreadgroup(
+                GROUP,
+                self.consumer,
+                {MAIL_OUTBOX_STREAM: ">"},
+                count=self.batch_size,
+                block=_BLOCK_MS,
+            )
+            entries = [e for _, batch in reply or () for e in batch]
+        if not entries:
+            await self._close_if_idle()
+            return 0
+        return await self._deliver(redis, entries)
+
+    async def _ensure_group(self, redis: Redis) -> None:
+        try:
+            await redis.xgroup_create(MAIL_OUTBOX_STREAM, GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self._group_ready = True
+
+    async def _pending(self, redis: Redis) -> list:
+        """Entries this consumer was given but hasn't acknowledged (failed earlier)."""
+        reply = await redis.xreadgroup(
+            GROUP, self.consumer, {MAIL_OUTBOX_STREAM: "0"}, count=self.batch_size
+        )
+        return [e for _, batch in reply or () for e in batch]
+
+    async def _reclaim(self, redis: Redis) -> list:
+        now = time.monotonic()
+        if now - self._last_reclaim < _RECLAIM_EVERY:
+            return []
+        self._last_reclaim = now
+        reply = await redis.xautoclaim(
+            MAIL_OUTBOX_STREAM, GROUP, self.consumer, _RECLAIM_IDLE_MS, count=self.batch_size
+        )
+        if entries := reply[1]:
+            logger.info("Mailer reclaimed {} abandoned message(s)", len(entries))
+        return entries
+
+    async def _deliver(self, redis: Redis, entries: list) -> int:
+        done: list[str] = []
+        dead: list[tuple[str, str, str]] = []
+        failure: Exception | None = None
+        for entry_id, fields in entries:
+            if not fields:  # deleted while pending
+                done.append(entry_id)
+                continue
+            try:
+                smtp = await self._connection()
+            except Exception as exc:  # login/connect problems are never the message's fault
+                failure = exc
+                break
+            try:
+                with outbound("smtp"):
+                    await smtp.send_message(
+                        message_from_string(fields["msg"], policy=default_policy)
+                    )
+            except Exception as exc:
+                attempts = self._attempts[entry_id] = self._attempts.get(entry_id, 0) + 1
+                if _permanent(exc) or attempts >= self.max_attempts:
+                    logger.error(
+                        "Mail {} undeliverable after {} attempt(s): {}", entry_id, attempts, exc
+                    )
+                    dead.append((entry_id, fields["msg"], repr(exc)))
+                    continue
+                await self.close()
+                self.retried += 1
+                failure = exc
+                break
+            self._last_sent = time.monotonic()
+            done.append(entry_id)
+        await self._settle(redis, done, dead)
+        self.sent += len(done)
+        if failure is not None:
+            raise failure
+        return len(done)
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            smtp = self._connect()
+            await smtp.connect()
+            self._smtp = smtp
+            self.connects += 1
+        return self._smtp
+
+    async def _settle(
+        self, redis: Redis, done: list[str], dead: list[tuple[str, str, str]]
+    ) -> None:
+        ids = done + [entry_id for entry_id, _, _ in dead]
+        if not ids:
+            return
+        pipe = redis.pipeline(transaction=False)
+        for entry_id, raw, error in dead:
+            pipe.xadd(f"{MAIL_OUTBOX_STREAM}:dead", {"msg": raw, "error": error, "id": entry_id})
+        pipe.xack(MAIL_OUTBOX_STREAM, GROUP, *ids)
+        pipe.xdel(MAIL_OUTBOX_STREAM, *ids)
+        await pipe.execute()
+        self.dead += len(dead)
+        for entry_id in ids:
+            self._attempts.pop(entry_id, None)
+
+    async def _close_if_idle(self) -> None:
+        if self._smtp is not None and time.monotonic() - self._last_sent >= self.idle_close:
+            await self.close()
+
+    async def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def snapshot(self) -> dict:
+        return {
+            "connected": self._smtp is not None and self._smtp.is_connected,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "connects": self.connects,
+        }
+
+
+mailer = Mailer()
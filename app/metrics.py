@@ -0,0 +1,223 @@
+"""
+Prometheus metrics, kept in process and rendered as text by `GET /metrics`.
+
+Recording is a dict lookup and an add (plus a bisect for histograms) on the
+event-loop thread, with no locks, so it is safe on the `/auth/verify` path;
+`uv run python -m benchmarks.metrics` measures what it costs there. State
+other modules already keep (DB pool, Redis breaker, mailer, health checks)
+is read at scrape time instead, see `app.routers.metrics`.
+
+Request latency is labelled with the route template, never the raw path.
+Routing happens inside the app, so the in-flight gauge is per method only.
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+from app.pool import WaitHistogram
+from app.timing import record
+from app.tracing import CLIENT, route_template, span
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+REGISTRY: list["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        *,
+        registry: list | None = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: dict[tuple, object] = {}
+        if registry is not None:
+            registry.append(self)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, value in self._series.items():
+            yield f"{self.name}{_labels(self.labels, values)} {value}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        self._series[labels] = value
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple[float, ...] = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = WaitHistogram(self.buckets)
+        series.observe(value)
+
+    def attach(self, series: WaitHistogram, *labels) -> None:
+        """Expose a histogram another module keeps (e.g. the pool's acquire waits)."""
+        self._series[labels] = series
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, series in self._series.items():
+            snapshot = series.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                le = 'le="' + bound + '"'
+                yield f"{self.name}_bucket{_labels(self.labels, values, le)} {count}"
+            labels = _labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {snapshot['sum']}"
+            yield f"{self.name}_count{labels} {snapshot['count']}"
+
+
+def render(extra: Iterable[Metric] = ()) -> str:
+    """Text exposition format 0.0.4 of every registered metric plus `extra`."""
+    lines = [line for metric in (*REGISTRY, *extra) for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by method, route template and status.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being served, by method.", ("method",)
+)
+VERIFY_CACHE_LOOKUPS = Counter(
+    "verify_cache_lookups_total",
+    "Verify cache lookups by result: local_hit, hit, miss, error, skipped (breaker open).",
+    ("result",),
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt time by operation (hash, check).",
+    ("op",),
+    buckets=BCRYPT_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Time per DB helper call, pool acquire included.",
+    ("helper",),
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total", "DB helper calls that raised.", ("helper",)
+)
+OUTBOUND_SECONDS = Histogram(
+    "outbound_request_duration_seconds",
+    "Calls to other services by target (notifications, turnstile, smtp) and outcome.",
+    ("target", "outcome"),
+)
+
+
+def db_helper(fn: Callable) -> Callable:
+    """
+    Time every call of the decorated query coroutine, labelled with its name
+    (and counted as `db` in the request's Server-Timing, traced as `db.<name>`).
+    """
+    name = fn.__name__
+    span_name = f"db.{name}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with span(span_name, attributes={"db.system": "postgresql"}):
+                return await fn(*args, **kwargs)
+        except Exception:
+            DB_QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_SECONDS.observe(elapsed, name)
+            record("db", elapsed)
+
+    return wrapper
+
+
+@contextmanager
+def outbound(target: str) -> Iterator[None]:
+    """Time (and trace) a call to another service; an exception counts as `error`."""
+    start, outcome = time.perf_counter(), "error"
+    try:
+        with span(target, CLIENT):
+            yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        OUTBOUND_SECONDS.observe(elapsed, target, outcome)
+        record(target, elapsed)
+
+
+class MetricsMiddleware:
+    """Pure ASGI, so streaming responses and background tasks are untouched."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method, route_template(scope), status
+            )
@@ -1,5 +1,12 @@
+from typing import Iterable
+
 from ms_core import AbstractModel
 from tortoise import fields
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.db import PRIMARY, mark_written
 
 
 class User(AbstractModel):
@@ -10,6 +17,7 @@ class User(AbstractModel):
     - unique username (can be changed to email later)
     - hashed password stored in DB
     - is_active flag for soft deactivation
+    - version bumped on every write (ETags, peer cache coherence)
     """
 
     id = fields.UUIDField(primary_key=True)
@@ -21,3 +29,51 @@ class User(AbstractModel):
     is_active = fields.BooleanField(default=True)
     email_verification_token = fields.CharField(max_length=128, null=True)
     scopes = fields.JSONField(default=list)
+    version = fields.IntField(default=1)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    async def save(
+        self,
+        using_db: BaseDBAsyncClient | None = None,
+        update_fields: Iterable[str] | None = None,
+        force_create: bool = False,
+        force_update: bool = False,
+    ) -> None:
+        if not self._saved_in_db:
+            await super().save(
+                using_db=using_db,
+                update_fields=update_fields,
+                force_create=force_create,
+                force_update=force_update,
+            )
+        elif using_db is not None:
+            await self._save_bumped(using_db, update_fields, force_update)
+        else:
+            async with in_transaction(PRIMARY) as conn:
+                await self._save_bumped(conn, update_fields, force_update)
+        mark_written(self.id, self.username)
+
+    async def _save_bumped(
+        self,
+        conn: BaseDBAsyncClient,
+        update_fields: Iterable[str] | None,
+        force_update: bool,
+    ) -> None:
+        """
+        Bump `version` in the UPDATE itself and read it back in the same
+        transaction: the row stays locked until commit, so concurrent writers
+        each get a distinct version.
+        """
+        if update_fields is not None:
+            update_fields = [*update_fields, "version", "updated_at"]
+        previous, self.version = self.version, F("version") + 1
+        try:
+            await super().save(
+                using_db=conn, update_fields=update_fields, force_update=force_update
+            )
+            self.version = await (
+                User.filter(id=self.id).using_db(conn).first().values_list("version", flat=True)
+            )
+        except BaseException:
+            self.version = previous
+            raise
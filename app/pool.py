@@ -0,0 +1,150 @@
+"""
+Postgres connection pool settings and metrics.
+
+`db_connection(url)` turns a Postgres URL into a Tortoise connection config
+that uses this module as its engine: the stock asyncpg client, with the pool
+wrapped so that acquiring a connection
+
+- gives up after `DB_POOL_ACQUIRE_TIMEOUT` (raising `DBConnectionError`, so a
+  starved replica pool falls back to the primary like any replica failure);
+- is timed into an acquire-wait histogram.
+
+The pool is sized by `DB_POOL_MIN_SIZE`/`DB_POOL_MAX_SIZE`, every session gets
+`statement_timeout = DB_STATEMENT_TIMEOUT` and asyncpg's prepared-statement
+cache holds `DB_STATEMENT_CACHE_SIZE` entries (0 behind PgBouncer in
+transaction mode). Query parameters already in the URL (`?maxsize=20`) take
+precedence. Other databases (SQLite in development) are passed through.
+
+`pool_state()` reports size, in use, idle, waiters and the wait histogram
+for every connection using a metered pool.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from urllib.parse import urlparse
+
+from tortoise import connections
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import ConfigurationError, DBConnectionError
+
+from app.settings import (
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_STATEMENT_TIMEOUT,
+)
+
+# Upper bounds (seconds) of the acquire-wait histogram buckets; +Inf is implied.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def db_connection(url: str) -> str | dict:
+    """Tortoise connection config for `url` with the pool settings applied."""
+    if urlparse(url).scheme not in ("postgres", "asyncpg"):
+        return url
+    config = expand_db_url(url)
+    config["engine"] = __name__
+    credentials = config["credentials"]
+    credentials.setdefault("minsize", DB_POOL_MIN_SIZE)
+    credentials.setdefault("maxsize", DB_POOL_MAX_SIZE)
+    credentials.setdefault("acquire_timeout", DB_POOL_ACQUIRE_TIMEOUT)
+    credentials.setdefault("statement_cache_size", DB_STATEMENT_CACHE_SIZE)
+    if DB_STATEMENT_TIMEOUT > 0:
+        credentials["server_settings"] = {
+            "statement_timeout": str(int(DB_STATEMENT_TIMEOUT * 1000)),
+        }
+    return config
+
+
+class WaitHistogram:
+    def __init__(self, buckets: tuple[float, ...] = WAIT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        """Cumulative counts per upper bound, Prometheus style."""
+        buckets, running = {}, 0
+        for bound, count in zip((*map(str, self.buckets), "+Inf"), self.counts):
+            running += count
+            buckets[bound] = running
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class MeteredPool:
+    """An `asyncpg.Pool` whose `acquire` is bounded and timed; the rest is delegated."""
+
+    def __init__(self, pool, acquire_timeout: float) -> None:
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.waiting = 0
+        self.timeouts = 0
+        self.wait = WaitHistogram()
+
+    async def acquire(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            return await self._pool.acquire(timeout=self.acquire_timeout or None)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise DBConnectionError(
+                f"No connection available within {self.acquire_timeout}s"
+            ) from None
+        finally:
+            self.waiting -= 1
+            self.wait.observe(time.perf_counter() - start)
+
+    def __getattr__(self, name: str):
+        return getattr(self._pool, name)
+
+    def snapshot(self) -> dict:
+        size, idle = self._pool.get_size(), self._pool.get_idle_size()
+        return {
+            "size": size,
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+            "acquire_wait_seconds": self.wait.snapshot(),
+        }
+
+
+class MeteredAsyncpgClient(AsyncpgDBClient):
+    def __init__(self, acquire_timeout: float = 0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.acquire_timeout = float(acquire_timeout)
+
+    async def create_pool(self, **kwargs) -> MeteredPool:
+        return MeteredPool(await super().create_pool(**kwargs), self.acquire_timeout)
+
+
+client_class = MeteredAsyncpgClient
+
+
+def metered_pools() -> dict[str, MeteredPool]:
+    """Connection alias -> pool, for every connection whose pool exists and is metered."""
+    try:
+        clients = connections.all()
+    except ConfigurationError:  # ORM not initialised
+        return {}
+    return {
+        client.connection_name: client._pool
+        for client in clients
+        if isinstance(getattr(client, "_pool", None), MeteredPool)
+    }
+
+
+def pool_state() -> dict:
+    return {alias: pool.snapshot() for alias, pool in metered_pools().items()}
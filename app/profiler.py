@@ -0,0 +1,206 @@
+"""
+On-demand CPU profiling and event-loop stall detection for a running pod.
+
+`SamplingProfiler` is a daemon thread that reads every other thread's stack
+with `sys._current_frames()` each `interval` and counts identical stacks.
+Nothing is hooked into the interpreter, so code runs at full speed; the cost
+is one stack walk per thread per sample (~1% of a core at 100 Hz). The
+result renders as collapsed stacks (`flamegraph.pl`, speedscope, Grafana
+Pyroscope) or as a speedscope JSON file. `GET /debug/profile` runs one.
+
+`LoopMonitor` (a lifespan task) sleeps `LOOP_LAG_INTERVAL` in a loop and
+measures how late it wakes up. A watchdog thread looks at the loop thread
+while it is late: once it has been stuck for `LOOP_LAG_THRESHOLD_MS`, the
+stack of whatever is blocking it is logged, so the culprit is named even
+if it never returns.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from loguru import logger
+
+from app.pool import WaitHistogram
+from app.settings import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD_MS
+
+_SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+Frame = tuple[str, str, int]  # function, file, first line
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _short(filename: str) -> str:
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker != -1:
+        return filename[marker + len("site-packages") + 1 :]
+    cwd = os.getcwd() + os.sep
+    return filename[len(cwd) :] if filename.startswith(cwd) else filename
+
+
+def _stack(frame) -> tuple[Frame, ...]:
+    """Root-first frames, each keyed by function (not line) so stacks aggregate."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_qualname, _short(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class Profile:
+    def __init__(self, samples: Counter, interval: float, duration: float) -> None:
+        self.samples = samples  # (thread name, stack) -> count
+        self.interval = interval
+        self.duration = duration
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: `thread;root;...;leaf count` per line."""
+        lines = []
+        for (thread, stack), count in self.samples.most_common():
+            frames = ";".join(f"{name} ({file}:{line})" for name, file, line in stack)
+            lines.append(f"{thread};{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str = "profile") -> dict:
+        """Speedscope file, one sampled profile per thread, weights in seconds."""
+        frames: dict[Frame, int] = {}
+        profiles: dict[str, dict] = {}
+        for (thread, stack), count in self.samples.items():
+            profile = profiles.setdefault(
+                thread,
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": [],
+                    "weights": [],
+                },
+            )
+            profile["samples"].append([frames.setdefault(frame, len(frames)) for frame in stack])
+            profile["weights"].append(count * self.interval)
+        return {
+            "$schema": _SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "users-ms",
+            "shared": {
+                "frames": [{"name": n, "file": f, "line": line} for n, f, line in frames]
+            },
+            "profiles": list(profiles.values()),
+        }
+
+
+class SamplingProfiler:
+    """One profile at a time per process; `run` raises `ProfilerBusy` otherwise."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def _sample(self, interval: float, stop: threading.Event, samples: Counter) -> None:
+        me = threading.get_ident()
+        while not stop.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    samples[(names.get(ident, str(ident)), _stack(frame))] += 1
+
+    async def run(self, seconds: float, interval: float = 0.01) -> Profile:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running on this pod")
+        try:
+            samples: Counter = Counter()
+            stop = threading.Event()
+            thread = threading.Thread(
+                target=self._sample, args=(interval, stop, samples), name="profiler", daemon=True
+            )
+            start = time.perf_counter()
+            thread.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(thread.join)
+            return Profile(samples, interval, time.perf_counter() - start)
+        finally:
+            self._lock.release()
+
+
+profiler = SamplingProfiler()
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        threshold_ms: float = LOOP_LAG_THRESHOLD_MS,
+        interval: float = LOOP_LAG_INTERVAL,
+    ) -> None:
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.lag = WaitHistogram()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._due: float | None = None  # monotonic time the heartbeat should wake up
+        self._reported: float | None = None  # `_due` of the stall already logged
+        self._loop_thread: int | None = None
+
+    def _watch(self, stop: threading.Event) -> None:
+        while not stop.wait(self.threshold / 2):
+            self.check()
+
+    def check(self) -> None:
+        """Watchdog step: log the loop thread's stack once per stall."""
+        due = self._due
+        if due is None or due == self._reported:
+            return
+        late = time.monotonic() - due
+        if late < self.threshold:
+            return
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        self._reported = due
+        stack = "".join(traceback.format_stack(frame))
+        logger.warning("Event loop blocked for {:.0f}ms so far, in:\n{}", late * 1000, stack)
+
+    async def run(self) -> None:
+        self._loop_thread = threading.get_ident()
+        stop = threading.Event()
+        watchdog = threading.Thread(
+            target=self._watch, args=(stop,), name="loop-watchdog", daemon=True
+        )
+        watchdog.start()
+        try:
+            while True:
+                self._due = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                self.observe(max(time.monotonic() - self._due, 0.0))
+        finally:
+            stop.set()
+
+    def observe(self, lag: float) -> None:
+        self.lag.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self.stalls += 1
+            logger.warning("Event loop was blocked for {:.0f}ms", lag * 1000)
+
+    def snapshot(self) -> dict:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "lag_seconds": self.lag.snapshot(),
+        }
+
+
+loop_monitor = LoopMonitor()
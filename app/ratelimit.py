@@ -0,0 +1,180 @@
+"""
+Rate limits for expensive endpoints (bcrypt logins, registration, Google
+token checks, contact email).
+
+Each rule is "`limit` requests per `period` seconds" enforced as GCRA — a
+token bucket that refills continuously — in one Lua call: the key holds the
+bucket's theoretical arrival time and is written with its expiry in the same
+SET, so no key can be left without a TTL.
+
+An in-process twin of every bucket sits in front of Redis. It only records
+requests Redis admitted, so it never runs ahead of the shared bucket: when it
+refuses, Redis would have too, and the round trip is skipped. When Redis is
+unavailable the local bucket decides alone (per pod) instead of failing open.
+
+Routes opt in with dependencies:
+
+    @router.post("/token", dependencies=[by_ip("login:ip"), by_username("login:user")])
+"""
+
+import math
+import time
+from typing import Annotated, NamedTuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from loguru import logger
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+
+from app.breaker import CircuitOpen
+from app.cache import get_redis, redis_breaker
+from app.settings import (
+    CONTACT_RATE_LIMIT,
+    CONTACT_RATE_WINDOW,
+    RATE_LIMIT_GOOGLE_IP,
+    RATE_LIMIT_LOGIN_IP,
+    RATE_LIMIT_LOGIN_USER,
+    RATE_LIMIT_REGISTER_IP,
+    TRUSTED_PROXY_HOPS,
+)
+from app.timing import timer
+
+_LOCAL_PRUNE_AT = 10_000
+
+# KEYS[1] bucket; ARGV: period ms, limit. Returns {allowed, retry after ms}.
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local period = tonumber(ARGV[1])
+local interval = period / tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local wait = tat - now + interval - period
+if wait > 0 then
+    return {0, math.ceil(wait)}
+end
+redis.call('SET', KEYS[1], math.floor(tat + interval + 0.5), 'PX', math.ceil(tat - now + interval))
+return {1, 0}
+"""
+
+
+_gcra: tuple[Redis, AsyncScript] | None = None
+
+
+def _gcra_script() -> AsyncScript:
+    """EVALSHA with a transparent EVAL fallback on NOSCRIPT, built once per client."""
+    global _gcra
+    client = get_redis()
+    if _gcra is None or _gcra[0] is not client:
+        _gcra = (client, client.register_script(_GCRA_LUA))
+    return _gcra[1]
+
+
+class RateRule(NamedTuple):
+    limit: int
+    period: float  # seconds
+
+
+def parse_rule(spec: str) -> RateRule:
+    """`"<limit>/<seconds>"`, e.g. `"10/60"`."""
+    limit, _, period = spec.partition("/")
+    return RateRule(int(limit), float(period))
+
+
+RULES: dict[str, RateRule] = {
+    "login:ip": parse_rule(RATE_LIMIT_LOGIN_IP),
+    "login:user": parse_rule(RATE_LIMIT_LOGIN_USER),
+    "google:ip": parse_rule(RATE_LIMIT_GOOGLE_IP),
+    "register:ip": parse_rule(RATE_LIMIT_REGISTER_IP),
+    "contact:ip": RateRule(CONTACT_RATE_LIMIT, CONTACT_RATE_WINDOW),
+}
+
+_local: dict[str, float] = {}  # bucket key -> theoretical arrival time (monotonic s)
+
+
+def _local_retry_after(key: str, rule: RateRule, now: float) -> float:
+    tat = max(_local.get(key, now), now)
+    return max(0.0, tat - now + rule.period / rule.limit - rule.period)
+
+
+def _local_commit(key: str, rule: RateRule, now: float) -> None:
+    _local[key] = max(_local.get(key, now), now) + rule.period / rule.limit
+    if len(_local) > _LOCAL_PRUNE_AT:
+        for stale in [k for k, tat in _local.items() if tat <= now]:
+            del _local[stale]
+
+
+def reset_local() -> None:
+    _local.clear()
+
+
+async def hit(rule_name: str, key: str) -> float:
+    """Count one request; 0 if allowed, else seconds until the next one would be."""
+    rule = RULES[rule_name]
+    bucket = f"rl:{rule_name}:{key}"
+    now = time.monotonic()
+    if retry_after := _local_retry_after(bucket, rule, now):
+        return retry_after
+    try:
+        with timer("redis"):
+            async with redis_breaker:
+                allowed, retry_ms = await _gcra_script()(
+                    keys=[bucket], args=[int(rule.period * 1000), rule.limit]
+                )
+    except CircuitOpen:
+        pass
+    except Exception:
+        logger.warning("Redis rate-limit check failed — using local limit", exc_info=True)
+    else:
+        if not allowed:
+            return retry_ms / 1000
+    _local_commit(bucket, rule, now)
+    return 0.0
+
+
+async def enforce(rule_name: str, key: str) -> None:
+    if retry_after := await hit(rule_name, key):
+        logger.info("Rate limited: rule={} key={}", rule_name, key)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def client_ip(request: Request, trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """
+    Entries left of what our own proxies appended are whatever the client
+    sent, so only the one `trusted_hops` from the right is believed.
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and trusted_hops > 0:
+        entries = [entry.strip() for entry in forwarded.split(",")]
+        if len(entries) >= trusted_hops:
+            return entries[-trusted_hops]
+    return request.client.host if request.client else "unknown"
+
+
+def by_ip(rule_name: str):
+    async def dependency(request: Request) -> None:
+        await enforce(rule_name, client_ip(request))
+
+    return Depends(dependency)
+
+
+def by_username(rule_name: str):
+    """
+    Keyed by the OAuth2 form's username (parsed once, shared with the route)
+    and the client IP: a username-only bucket would let anyone lock its
+    owner out by failing logins under that name.
+    """
+
+    async def dependency(
+        request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+    ) -> None:
+        await enforce(rule_name, f"{form_data.username.strip().lower()}:{client_ip(request)}")
+
+    return Depends(dependency)
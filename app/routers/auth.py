@@ -3,14 +3,12 @@ from urllib.parse import quote
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-import urllib3
-from google.auth.transport import urllib3 as google_urllib3
 from google.oauth2 import id_token as google_id_token
 from loguru import logger
 from pydantic import BaseModel
 
 from app.auth import authenticate_user, create_access_token
-from app.cache import get_verify_cache, set_verify_cache
+from app.cache import get_verify_cache, invalidate_user_cache, set_verify_cache
 from app.crud import (
     create_user,
     get_user_by_email,
@@ -19,21 +17,42 @@ from app.crud import (
     get_user_by_verification_token,
 )
 from app.deps import resolve_user
+from app.events import publish_user_change
+from app.identity import verify_payload
+from app.ratelimit import by_ip, by_username
 from app.schemas import Token
 from app.scopes import DEFAULT_USER_SCOPES
-from app.settings import GOOGLE_CLIENT_ID
+from app.settings import GOOGLE_CLIENT_ID, SCOPE_ENCODING
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-_http = urllib3.PoolManager()
-_google_request = google_urllib3.Request(_http)
+_google_request = None
+
+
+def google_request():
+    """
+    Transport for fetching Google's signing certs, built on first use: its
+    imports (urllib3, google.auth's crypto) are a large share of import time.
+    The lifespan warm-up builds it before the pod reports ready.
+    """
+    global _google_request
+    if _google_request is None:
+        import urllib3
+        from google.auth.transport import urllib3 as google_urllib3
+
+        _google_request = google_urllib3.Request(urllib3.PoolManager())
+    return _google_request
 
 
 class GoogleTokenRequest(BaseModel):
     credential: str
 
 
-@router.post("/token", response_model=Token)
+@router.post(
+    "/token",
+    response_model=Token,
+    dependencies=[by_ip("login:ip"), by_username("login:user")],
+)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
@@ -65,35 +84,35 @@ async def verify_token(request: Request):
         )
     token = auth_header[7:]
 
-    cached = await get_verify_cache(token)
+    cached, stamp = await get_verify_cache(token)
     if cached:
         logger.debug("Cache hit for verify: username={}", cached["username"])
-        return Response(
-            status_code=200,
-            headers={
-                "X-User-Id": cached["user_id"],
-                "X-User-Scopes": cached["scopes"],
-                "X-Username": quote(cached["username"]),
-            },
-        )
+        return Response(status_code=200, headers=_identity_headers(cached))
 
     user = await resolve_user(token)
     logger.debug("Cache miss for verify: username={}", user.username)
-    payload = {
-        "user_id": str(user.id),
-        "username": user.username,
-        "scopes": " ".join(user.scopes or []),
+    payload = verify_payload(user)
+    await set_verify_cache(token, str(user.id), payload, stamp)
+
+    return Response(status_code=200, headers=_identity_headers(payload))
+
+
+def _identity_headers(payload: dict, encoding: str = SCOPE_ENCODING) -> dict[str, str]:
+    """
+    forwardAuth headers. X-User-Scope-Bits carries the compact form (decode
+    with GET /scopes/table); X-User-Scopes stays unless encoding is "compact"
+    and every scope could be encoded.
+    """
+    headers = {
+        "X-User-Id": payload["user_id"],
+        "X-Username": quote(payload["username"]),
     }
-    await set_verify_cache(token, str(user.id), payload)
-
-    return Response(
-        status_code=200,
-        headers={
-            "X-User-Id": payload["user_id"],
-            "X-User-Scopes": payload["scopes"],
-            "X-Username": quote(payload["username"]),
-        },
-    )
+    bits = payload.get("scope_bits") if encoding != "names" else None
+    if bits:
+        headers["X-User-Scope-Bits"] = bits
+    if not bits or encoding != "compact":
+        headers["X-User-Scopes"] = payload["scopes"]
+    return headers
 
 
 @router.get("/verify-email")
@@ -112,16 +131,18 @@ async def verify_email(token: str = Query(..., min_length=1)):
     user.is_active = True
     user.email_verification_token = None
     await user.save()
+    await invalidate_user_cache(str(user.id))
+    await publish_user_change(user.id, user.version, ["is_active"])
     logger.info("Email verified for user: username={}", user.username)
     return {"message": "Email verified successfully"}
 
 
-@router.post("/google", response_model=Token)
+@router.post("/google", response_model=Token, dependencies=[by_ip("google:ip")])
 async def login_with_google(body: GoogleTokenRequest) -> Token:
     """Exchange a Google ID token for a platform JWT."""
     try:
         claims = google_id_token.verify_oauth2_token(
-            body.credential, _google_request, GOOGLE_CLIENT_ID
+            body.credential, google_request(), GOOGLE_CLIENT_ID
         )
     except Exception as exc:
         logger.warning("Google token verification failed: {}", exc)
@@ -143,6 +164,8 @@ async def login_with_google(body: GoogleTokenRequest) -> Token:
         if user is not None:
             user.google_id = google_sub
             await user.save()
+            await invalidate_user_cache(str(user.id))
+            await publish_user_change(user.id, user.version, ["google_id"])
             logger.info("Linked Google account to existing user: username={}", user.username)
 
     if user is None:
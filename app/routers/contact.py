@@ -1,17 +1,16 @@
 from email.message import EmailMessage
 
-import aiosmtplib
 import httpx
 from fastapi import APIRouter, HTTPException, Request, status
 from loguru import logger
 from pydantic import BaseModel, EmailStr
 
-from app.cache import check_contact_rate_limit
+from app.mail import enqueue_email, send_now
+from app.metrics import outbound
+from app.ratelimit import by_ip, client_ip
 from app.settings import (
     CONTACT_EMAIL,
-    SMTP_HOST,
     SMTP_PASSWORD,
-    SMTP_PORT,
     SMTP_USER,
     TURNSTILE_SECRET_KEY,
 )
@@ -29,24 +28,18 @@ class ContactRequest(BaseModel):
     turnstile_token: str
 
 
-def _get_client_ip(request: Request) -> str:
-    forwarded = request.headers.get("x-forwarded-for")
-    if forwarded:
-        return forwarded.split(",")[0].strip()
-    return request.client.host if request.client else "unknown"
-
-
 async def _verify_turnstile(token: str, ip: str) -> bool:
     if not TURNSTILE_SECRET_KEY:
         logger.warning("TURNSTILE_SECRET_KEY not set — skipping captcha verification")
         return True
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        resp = await client.post(
-            TURNSTILE_VERIFY_URL,
-            data={"secret": TURNSTILE_SECRET_KEY, "response": token, "remoteip": ip},
-        )
-        result = resp.json()
+    with outbound("turnstile"):
+        async with httpx.AsyncClient(timeout=10) as client:
+            resp = await client.post(
+                TURNSTILE_VERIFY_URL,
+                data={"secret": TURNSTILE_SECRET_KEY, "response": token, "remoteip": ip},
+            )
+            result = resp.json()
 
     if not result.get("success"):
         logger.warning("Turnstile verification failed: {}", result)
@@ -54,20 +47,15 @@ async def _verify_turnstile(token: str, ip: str) -> bool:
     return True
 
 
-@router.post("/contact", status_code=status.HTTP_204_NO_CONTENT)
+@router.post(
+    "/contact",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[by_ip("contact:ip")],
+)
 async def send_contact_message(body: ContactRequest, request: Request):
-    client_ip = _get_client_ip(request)
-
-    # Rate limit
-    if not await check_contact_rate_limit(client_ip):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Too many requests. Please try again later.",
-        )
-
     # Turnstile CAPTCHA
     try:
-        if not await _verify_turnstile(body.turnstile_token, client_ip):
+        if not await _verify_turnstile(body.turnstile_token, client_ip(request)):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="CAPTCHA verification failed",
@@ -100,15 +88,11 @@ async def send_contact_message(body: ContactRequest, request: Request):
         f"{body.message}"
     )
 
+    if await enqueue_email(msg):
+        logger.info("Contact email queued from={} subject={}", body.email, body.subject)
+        return
     try:
-        await aiosmtplib.send(
-            msg,
-            hostname=SMTP_HOST,
-            port=SMTP_PORT,
-            username=SMTP_USER,
-            password=SMTP_PASSWORD,
-            start_tls=True,
-        )
+        await send_now(msg)
         logger.info("Contact email sent from={} subject={}", body.email, body.subject)
     except Exception as exc:
         logger.error("Failed to send contact email: {}", exc)
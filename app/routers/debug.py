@@ -0,0 +1,49 @@
+import json
+import socket
+import time
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Response, Security, status
+
+from app.deps import get_current_admin_user
+from app.profiler import ProfilerBusy, loop_monitor, profiler
+from app.settings import PROFILE_MAX_SECONDS
+
+router = APIRouter(prefix="/debug", tags=["admin"])
+
+
+@router.get("/profile", response_class=Response)
+async def profile(
+    seconds: float = Query(default=10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+    fmt: Literal["collapsed", "speedscope"] = Query(default="collapsed", alias="format"),
+    _=Security(get_current_admin_user),
+) -> Response:
+    """
+    Sample every thread of this pod for `seconds` and return the stacks as a
+    download: collapsed (`flamegraph.pl`, speedscope) or a speedscope file.
+    One profile runs at a time per pod; the Service picks the pod, so call it
+    through `kubectl port-forward` to profile a particular one.
+    """
+    try:
+        result = await profiler.run(seconds, interval_ms / 1000)
+    except ProfilerBusy as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    name = f"{socket.gethostname()}-{time.strftime('%Y%m%dT%H%M%S')}"
+    if fmt == "speedscope":
+        content = json.dumps(result.speedscope(name)).encode()
+        media_type, filename = "application/json", f"{name}.speedscope.json"
+    else:
+        content = result.collapsed().encode()
+        media_type, filename = "text/plain; charset=utf-8", f"{name}.folded"
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/loop")
+async def event_loop(_=Security(get_current_admin_user)) -> dict:
+    """Event-loop lag seen by the heartbeat since start, and stalls over the threshold."""
+    return loop_monitor.snapshot()
@@ -1,5 +1,12 @@
-from fastapi import APIRouter, Response
-from tortoise import Tortoise
+from fastapi import APIRouter, Response, Security
+
+from app.cache import redis_breaker, verify_local
+from app.db import replica_state
+from app.deps import get_current_admin_user
+from app.health import health_monitor
+from app.lifespan import is_warm, warmup_state
+from app.mail import mailer
+from app.pool import pool_state
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -11,13 +18,28 @@ async def liveness():
 
 @router.get("/ready")
 async def readiness():
-    try:
-        conn = Tortoise.get_connection("default")
-        await conn.execute_query("SELECT 1")
-        return {"status": "ok"}
-    except Exception as exc:
+    """Cached result of the background checks (see `app.health`); no I/O here."""
+    if not is_warm():
         return Response(
-            content=f'{{"status": "error", "detail": "{exc}"}}',
-            status_code=503,
-            media_type="application/json",
+            content='{"status": "starting"}', status_code=503, media_type="application/json"
         )
+    status_code, body = health_monitor.readiness()
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+@router.get("/dependencies")
+async def dependencies(_=Security(get_current_admin_user)):
+    """
+    Runtime state of every dependency. Only the `HEALTH_CRITICAL` checks
+    fail readiness; the rest degrade the service. Admin only: it names
+    internal hosts and carries raw error text.
+    """
+    return {
+        "redis": redis_breaker.snapshot(),
+        "verify_local_cache": verify_local.snapshot(),
+        "replica": replica_state(),
+        "db_pool": pool_state(),
+        "mailer": mailer.snapshot(),
+        "warmup": warmup_state(),
+        "checks": health_monitor.snapshot(),
+    }
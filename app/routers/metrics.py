@@ -0,0 +1,130 @@
+from fastapi import APIRouter, Response
+
+from app.cache import redis_breaker, verify_local
+from app.db import replica_state
+from app.health import health_monitor
+from app.mail import mailer
+from app.metrics import Counter, Gauge, Histogram, Metric, render
+from app.pool import WAIT_BUCKETS, metered_pools
+from app.profiler import loop_monitor
+
+router = APIRouter(tags=["metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _pool_metrics() -> list[Metric]:
+    connections = Gauge(
+        "db_pool_connections", "Pool connections by state.", ("connection", "state"), registry=None
+    )
+    max_size = Gauge("db_pool_max_size", "Pool size limit.", ("connection",), registry=None)
+    waiting = Gauge(
+        "db_pool_waiting", "Tasks waiting for a connection.", ("connection",), registry=None
+    )
+    timeouts = Counter(
+        "db_pool_acquire_timeouts_total",
+        "Acquires that gave up after DB_POOL_ACQUIRE_TIMEOUT.",
+        ("connection",),
+        registry=None,
+    )
+    wait = Histogram(
+        "db_pool_acquire_wait_seconds",
+        "Time to acquire a pool connection.",
+        ("connection",),
+        buckets=WAIT_BUCKETS,
+        registry=None,
+    )
+    for alias, pool in metered_pools().items():
+        snapshot = pool.snapshot()
+        connections.set(snapshot["in_use"], alias, "in_use")
+        connections.set(snapshot["idle"], alias, "idle")
+        max_size.set(snapshot["max_size"], alias)
+        waiting.set(snapshot["waiting"], alias)
+        timeouts.inc(alias, amount=snapshot["timeouts"])
+        wait.attach(pool.wait, alias)
+    replica = replica_state()
+    healthy = Gauge(
+        "db_replica_healthy", "1 while the read replica is in rotation.", registry=None
+    )
+    lag = Gauge("db_replica_lag_seconds", "Replay lag seen by the last probe.", registry=None)
+    if replica["enabled"]:
+        healthy.set(int(replica["healthy"]))
+        if replica["lag_seconds"] is not None:
+            lag.set(replica["lag_seconds"])
+    return [connections, max_size, waiting, timeouts, wait, healthy, lag]
+
+
+def _redis_metrics() -> list[Metric]:
+    breaker = redis_breaker.snapshot()
+    state = Gauge(
+        "redis_breaker_state", "1 for the Redis circuit breaker's state.", ("state",), registry=None
+    )
+    state.set(1, breaker["state"])
+    trips = Counter("redis_breaker_trips_total", "Times the breaker opened.", registry=None)
+    trips.inc(amount=breaker["trips"])
+    rejected = Counter(
+        "redis_breaker_rejected_total", "Calls skipped while the breaker was open.", registry=None
+    )
+    rejected.inc(amount=breaker["rejected"])
+    entries = Gauge(
+        "verify_local_cache_entries", "Entries in the in-process verify cache.", registry=None
+    )
+    entries.set(verify_local.snapshot()["entries"])
+    return [state, trips, rejected, entries]
+
+
+def _mailer_metrics() -> list[Metric]:
+    snapshot = mailer.snapshot()
+    messages = Counter(
+        "mailer_messages_total", "Outbox messages by result.", ("result",), registry=None
+    )
+    for result in ("sent", "retried", "dead"):
+        messages.inc(result, amount=snapshot[result])
+    connects = Counter("mailer_smtp_connects_total", "SMTP logins.", registry=None)
+    connects.inc(amount=snapshot["connects"])
+    return [messages, connects]
+
+
+def _health_metrics() -> list[Metric]:
+    up = Gauge(
+        "health_check_up",
+        "1 if the dependency passed its last background check.",
+        ("dependency", "critical"),
+        registry=None,
+    )
+    latency = Histogram(
+        "health_check_duration_seconds",
+        "Background check latency.",
+        ("dependency",),
+        buckets=WAIT_BUCKETS,
+        registry=None,
+    )
+    for dep in health_monitor.dependencies:
+        if dep.ok is not None:
+            up.set(int(dep.ok), dep.name, str(dep.critical).lower())
+            latency.attach(dep.latencies, dep.name)
+    return [up, latency]
+
+
+def _loop_metrics() -> list[Metric]:
+    lag = Histogram(
+        "event_loop_lag_seconds",
+        "How late the event-loop heartbeat woke up.",
+        buckets=WAIT_BUCKETS,
+        registry=None,
+    )
+    lag.attach(loop_monitor.lag)
+    return [lag]
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus scrape target: hot-path metrics plus the state other modules keep."""
+    scraped = [
+        *_pool_metrics(),
+        *_redis_metrics(),
+        *_mailer_metrics(),
+        *_health_metrics(),
+        *_loop_metrics(),
+    ]
+    return Response(content=render(scraped), media_type=CONTENT_TYPE)
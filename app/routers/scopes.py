@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Security
 
 from app.deps import get_current_admin_user
-from app.scopes import SCOPE_DESCS
+from app.scopes import SCOPE_DESCS, scope_table
 
 router = APIRouter(prefix="/scopes", tags=["scopes"])
 
@@ -16,3 +16,12 @@ async def list_all_scopes(_=Security(get_current_admin_user)) -> list[str]:
     - admin scopes management scope
     """
     return sorted(SCOPE_DESCS.keys())
+
+
+@router.get("/table")
+async def get_scope_table() -> dict:
+    """
+    Public decoding table for compact scopes (JWT "scp" claim and the
+    X-User-Scope-Bits header): bit i of the hex mask stands for scopes[i].
+    """
+    return scope_table()
@@ -2,32 +2,80 @@ import secrets
 from uuid import UUID
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, Security, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Response,
+    Security,
+    status,
+)
 from loguru import logger
 
 from app import Schema, user_crud
 from app.auth import get_password_hash
 from app.cache import invalidate_user_cache
 from app.crud import (
+    SearchTimeout,
     create_user,
     get_user_by_email,
     get_user_by_id,
     get_user_by_username,
-    get_users_by_ids,
+    get_user_rows,
+    get_user_rows_by_ids,
+    get_user_version,
+    search_users,
+    update_user_fields,
     update_user_scopes,
 )
 from app.deps import (
+    CurrentUser,
     get_current_active_user,
     get_current_admin_user,
     require_scopes,
 )
-from app.models import User
-from app.schemas import UserCreate, UserPublic, UserScopesUpdate, UserUpdate
-from app.scopes import DEFAULT_USER_SCOPES, UserScope
+from app.etag import etag_matches, not_modified, set_etag, user_etag
+from app.events import publish_user_change
+from app.jobs import (
+    DefaultScopesJob,
+    JobConflict,
+    JobNotFound,
+    KeysetJob,
+    ScopeBatchJob,
+    load_state,
+    start_job,
+)
+from app.metrics import outbound
+from app.ratelimit import by_ip
+from app.schemas import (
+    DefaultScopesRequest,
+    JobState,
+    ScopeBatchRequest,
+    UserCreate,
+    UserPublic,
+    UserScopesUpdate,
+    UserSearchHit,
+    UserUpdate,
+)
+from app.scopes import (
+    DEFAULT_USER_SCOPES,
+    UserScope,
+    granted_mask,
+    has_scopes,
+    required_mask,
+    unknown_scopes,
+)
+from app.serializers import READ_FIELDS, rows_response
 from app.settings import FRONTEND_BASE_URL, NOTIFICATIONS_MS_URL
+from app.tracing import trace_headers
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+_ADMIN_MASK = required_mask([UserScope.ADMIN])
+
 
 async def _send_verification_email(email: str, token: str, locale: str = "bg") -> None:
     """Fire-and-forget call to notifications-ms to send the verification email."""
@@ -44,29 +92,36 @@ async def _send_verification_email(email: str, token: str, locale: str = "bg") -
         f"If you didn't create an account, ignore this email.</p>"
     )
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{NOTIFICATIONS_MS_URL}/notifications/send",
-                json={
-                    "to": email,
-                    "subject": "Потвърдете имейла си | Verify your email",
-                    "html": html,
-                    "template": "email_verification",
-                    "triggered_by": "users-ms",
-                },
-                headers={
-                    "X-User-Id": "00000000-0000-0000-0000-000000000000",
-                    "X-Username": "system",
-                    "X-User-Scopes": "admin:notifications:write",
-                },
-                timeout=10.0,
-            )
-            resp.raise_for_status()
+        with outbound("notifications"):
+            async with httpx.AsyncClient() as client:
+                resp = await client.post(
+                    f"{NOTIFICATIONS_MS_URL}/notifications/send",
+                    json={
+                        "to": email,
+                        "subject": "Потвърдете имейла си | Verify your email",
+                        "html": html,
+                        "template": "email_verification",
+                        "triggered_by": "users-ms",
+                    },
+                    headers={
+                        "X-User-Id": "00000000-0000-0000-0000-000000000000",
+                        "X-Username": "system",
+                        "X-User-Scopes": "admin:notifications:write",
+                        **trace_headers(),
+                    },
+                    timeout=10.0,
+                )
+                resp.raise_for_status()
     except Exception as exc:
         logger.error("Failed to send verification email to {}: {}", email, exc)
 
 
-@router.post("/", response_model=UserPublic, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=UserPublic,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[by_ip("register:ip")],
+)
 async def register_user(payload: UserCreate, locale: str = Query(default="bg")) -> UserPublic:
     existing_username = await get_user_by_username(payload.username)
     if existing_username:
@@ -105,45 +160,87 @@ async def register_user(payload: UserCreate, locale: str = Query(default="bg"))
 
 @router.get("/", response_model=list[Schema])
 async def list_users(
+    scope: list[str] | None = Query(
+        default=None, description="Only users holding every given scope."
+    ),
     _=Depends(require_scopes("users:read")),
-) -> list[Schema]:
-    return await user_crud.get_all()
+) -> Response:
+    return rows_response(await get_user_rows(*READ_FIELDS, scopes=scope))
 
 
 @router.get("/bulk", response_model=list[Schema])
 async def get_users_bulk(
     ids: list[UUID] = Query(...),
-) -> list[Schema]:
+) -> Response:
     """Internal bulk lookup by ID — called by peer services on the Docker network."""
-    users = await get_users_by_ids(ids)
-    return [Schema.model_validate(u, from_attributes=True) for u in users]
+    return rows_response(await get_user_rows_by_ids(ids, *READ_FIELDS))
+
+
+@router.get("/search", response_model=list[UserSearchHit], tags=["admin"])
+async def find_users(
+    q: str = Query(..., min_length=2, max_length=128),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    _=Security(get_current_admin_user),
+) -> list[UserSearchHit]:
+    """Ranked admin search over username, full name and email."""
+    try:
+        rows = await search_users(q, limit, offset)
+    except SearchTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Search exceeded its time budget — try a more specific query",
+        )
+    return [UserSearchHit.model_validate(row) for row in rows]
+
+
+async def _unchanged(user_id: UUID, if_none_match: str | None) -> str | None:
+    """ETag to answer 304 with when the client's copy is current, else None."""
+    if not if_none_match:
+        return None
+    version = await get_user_version(user_id)
+    if version is None:
+        return None
+    etag = user_etag(user_id, version)
+    return etag if etag_matches(if_none_match, etag) else None
 
 
 @router.get("/{user_id}", response_model=Schema)
 async def get_user(
-    _=Security(get_current_active_user), user_id: UUID = Path()
-) -> Schema | None:
-    return await user_crud.get_by_id(user_id)
+    response: Response,
+    _=Security(get_current_active_user),
+    user_id: UUID = Path(),
+    if_none_match: str | None = Header(default=None),
+) -> Schema | Response | None:
+    if etag := await _unchanged(user_id, if_none_match):
+        return not_modified(etag)
+    user = await user_crud.get_by_id(user_id)
+    if user is not None:
+        set_etag(response, user_etag(user_id, user.version))
+    return user
 
 
 @router.patch("/{user_id}", response_model=UserPublic)
 async def update_user(
     payload: UserUpdate,
     user_id: UUID = Path(),
-    current_user: User = Security(get_current_active_user),
+    current_user: CurrentUser = Security(get_current_active_user),
 ) -> UserPublic:
-    if current_user.id != user_id and (UserScope.ADMIN not in current_user.scopes):
+    if current_user.id != user_id and not has_scopes(
+        granted_mask(current_user.scopes), _ADMIN_MASK
+    ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to update this user",
         )
 
     update_data = payload.model_dump(exclude_unset=True)
+    changed_fields = sorted(update_data)
 
     if "password" in update_data:
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
 
-    updated_user = await user_crud.update_by(update_data, id=user_id)
+    updated_user = await update_user_fields(user_id, update_data)
 
     if not updated_user:
         raise HTTPException(
@@ -151,6 +248,7 @@ async def update_user(
         )
 
     await invalidate_user_cache(str(user_id))
+    await publish_user_change(user_id, updated_user.version, changed_fields)
     logger.info("User updated and cache invalidated: user_id={}", user_id)
     return UserPublic.model_validate(updated_user)
 
@@ -160,25 +258,42 @@ async def delete_user(
     _=Security(get_current_admin_user), user_id: UUID = Path()
 ) -> None:
     await user_crud.delete_by(id=user_id)
+    await invalidate_user_cache(str(user_id))
+    await publish_user_change(user_id, None, op="delete")
+    logger.info("User deleted and cache invalidated: user_id={}", user_id)
 
 
 @router.get("/@me/get", response_model=UserPublic)
 async def read_users_me(
-    current_user: User = Security(get_current_active_user),
-) -> UserPublic:
-    return UserPublic.model_validate(current_user)
+    response: Response,
+    current_user: CurrentUser = Security(get_current_active_user),
+    if_none_match: str | None = Header(default=None),
+) -> UserPublic | Response:
+    # The identity's version is current (writes invalidate it), so a
+    # revalidation is answered without reading the row.
+    etag = user_etag(current_user.id, current_user.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    user = await current_user.load()
+    set_etag(response, etag)
+    return UserPublic.model_validate(user)
 
 
 @router.get("/{user_id}/scopes", response_model=UserScopesUpdate, tags=["admin"])
 async def get_user_scopes(
+    response: Response,
     user_id: UUID = Path(),
     _=Security(get_current_admin_user),
-) -> UserScopesUpdate:
+    if_none_match: str | None = Header(default=None),
+) -> UserScopesUpdate | Response:
+    if etag := await _unchanged(user_id, if_none_match):
+        return not_modified(etag)
     user = await get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
+    set_etag(response, user_etag(user_id, user.version))
     return UserScopesUpdate(scopes=user.scopes or [])
 
 
@@ -188,11 +303,90 @@ async def set_user_scopes(
     payload: UserScopesUpdate,
     _=Security(get_current_admin_user),
 ) -> UserScopesUpdate:
+    if unknown := unknown_scopes(payload.scopes):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"Unknown scopes: {', '.join(unknown)}",
+        )
     user = await update_user_scopes(user_id, payload.scopes)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
     await invalidate_user_cache(str(user_id))
+    await publish_user_change(user_id, user.version, ["scopes"])
     logger.info("Scopes updated and cache invalidated: user_id={}", user_id)
     return UserScopesUpdate(scopes=user.scopes or [])
+
+
+@router.post(
+    "/scopes/batch",
+    response_model=JobState,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["admin"],
+)
+async def batch_update_scopes(
+    payload: ScopeBatchRequest,
+    _=Security(get_current_admin_user),
+) -> JobState:
+    """
+    Grant/revoke scopes for `user_ids` or every user matching the filter.
+    Runs in the background in keyset-ordered chunks; poll the returned job.
+    """
+    if unknown := unknown_scopes(payload.add):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"Unknown scopes: {', '.join(unknown)}",
+        )
+    state = await start_job(ScopeBatchJob.from_request(payload))
+    logger.info("Scope batch job started: job_id={}", state.job_id)
+    return state
+
+
+@router.post(
+    "/scopes/defaults",
+    response_model=JobState,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["admin"],
+)
+async def migrate_default_scopes(
+    payload: DefaultScopesRequest,
+    _=Security(get_current_admin_user),
+) -> JobState:
+    """
+    Backfill the current default scopes onto existing users (and strip
+    `retire`d ones). Use `dry_run` first: the job's `stats` count users per
+    scope that would gain or lose it. Poll via `GET /users/scopes/batch/{job_id}`.
+    """
+    state = await start_job(DefaultScopesJob.from_request(payload))
+    logger.info("Default scopes job started: job_id={} dry_run={}", state.job_id, state.dry_run)
+    return state
+
+
+@router.get("/scopes/batch/{job_id}", response_model=JobState, tags=["admin"])
+async def get_scope_batch(
+    job_id: str,
+    _=Security(get_current_admin_user),
+) -> JobState:
+    try:
+        return await load_state(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+
+@router.post(
+    "/scopes/batch/{job_id}/resume",
+    response_model=JobState,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["admin"],
+)
+async def resume_scope_batch(
+    job_id: str,
+    _=Security(get_current_admin_user),
+) -> JobState:
+    try:
+        return await start_job(KeysetJob.from_state(await load_state(job_id)))
+    except JobNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    except JobConflict as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
@@ -1,10 +1,13 @@
+from datetime import datetime
+from typing import Literal
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
 from tortoise import Tortoise
 from tortoise.contrib.pydantic import pydantic_model_creator
 
 from app.models import User
+from app.scopes import DEFAULT_OWNER_SCOPES, DEFAULT_USER_SCOPES
 
 Tortoise.init_models(["app.models"], "models")
 
@@ -30,6 +33,10 @@ class UserPublic(UserBase):
     id: UUID
 
 
+class UserSearchHit(UserPublic):
+    rank: float
+
+
 class UserUpdate(BaseModel):
     username: str | None = None
     full_name: str | None = None
@@ -50,3 +57,71 @@ class TokenData(BaseModel):
 
 class UserScopesUpdate(BaseModel):
     scopes: list[str]
+
+
+class JobOptions(BaseModel):
+    """How a keyset job walks the table; shared by every job request."""
+
+    chunk_size: int = Field(default=1000, ge=1, le=10_000)
+    concurrency: int = Field(default=1, ge=1, le=8)
+    pause_ms: int = Field(default=0, ge=0, le=60_000)
+    dry_run: bool = False
+
+
+class ScopeBatchRequest(JobOptions):
+    """Grant/revoke scopes for an explicit id list or every user matching a filter."""
+
+    add: list[str] = []
+    remove: list[str] = []
+    user_ids: list[UUID] | None = None
+    has_scopes: list[str] = []
+    is_active: bool | None = None
+
+    @model_validator(mode="after")
+    def _check(self) -> "ScopeBatchRequest":
+        if not self.add and not self.remove:
+            raise ValueError("Nothing to do: provide add and/or remove")
+        if set(self.add) & set(self.remove):
+            raise ValueError("A scope cannot be both added and removed")
+        if self.user_ids is not None and (self.has_scopes or self.is_active is not None):
+            raise ValueError("Filter by user_ids or by has_scopes/is_active, not both")
+        return self
+
+
+class DefaultScopesRequest(JobOptions):
+    """
+    Bring existing users up to the current DEFAULT_USER_SCOPES /
+    DEFAULT_OWNER_SCOPES and strip `retire`d scopes.
+    """
+
+    retire: list[str] = []
+    include_admins: bool = False
+    is_active: bool | None = None
+
+    @model_validator(mode="after")
+    def _check(self) -> "DefaultScopesRequest":
+        if clash := set(self.retire) & {*DEFAULT_USER_SCOPES, *DEFAULT_OWNER_SCOPES}:
+            raise ValueError(f"Cannot retire default scopes: {', '.join(sorted(clash))}")
+        return self
+
+
+JobStatus = Literal["pending", "running", "completed", "failed", "interrupted"]
+
+
+class JobState(BaseModel):
+    job_id: str
+    kind: str
+    status: JobStatus = "pending"
+    params: dict
+    chunk_size: int
+    concurrency: int = 1
+    pause_ms: int = 0
+    dry_run: bool = False
+    last_id: UUID | None = None
+    scanned: int = 0
+    updated: int = 0
+    chunks: int = 0
+    stats: dict[str, int] = {}
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
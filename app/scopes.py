@@ -1,4 +1,6 @@
 from enum import StrEnum
+from functools import lru_cache
+from typing import Iterable
 
 
 class UserScope(StrEnum):
@@ -130,3 +132,158 @@ DEFAULT_ADMIN_SCOPES = [
     PaymentScope.ADMIN,
     NotificationScope.ADMIN,
 ]
+
+
+# ---------------------------------------------------------------------------
+# Compiled scope registry
+# ---------------------------------------------------------------------------
+# Every scope gets one bit; a scope's mask also carries the bits of everything
+# it implies. A scope implies all registered scopes nested under it
+# ("admin:venues" => "admin:venues:read") plus the explicit SCOPE_IMPLIES
+# edges, closed transitively. Checks are then `granted & required == required`.
+
+# Bit positions double as the compact wire format (JWT "scp" claim and the
+# X-User-Scope-Bits header), so the registry is append-only: add new members
+# at the end of the last enum or new enums at the end of SCOPE_ENUMS, and bump
+# SCOPE_TABLE_VERSION whenever a scope is added.
+SCOPE_TABLE_VERSION = 1
+
+SCOPE_ENUMS: tuple[type[StrEnum], ...] = (
+    UserScope,
+    VenueScope,
+    BookingScope,
+    PaymentScope,
+    NotificationScope,
+)
+
+SCOPE_IMPLIES: dict[str, tuple[str, ...]] = {
+    UserScope.ADMIN: (UserScope.READ, UserScope.ME),
+}
+
+
+class UnknownScopeError(ValueError):
+    def __init__(self, scopes: Iterable[str]) -> None:
+        self.scopes = list(scopes)
+        super().__init__(f"Unknown scopes: {', '.join(self.scopes)}")
+
+
+class ScopeRegistry:
+    __slots__ = ("names", "bits", "closure")
+
+    def __init__(
+        self,
+        enums: Iterable[type[StrEnum]],
+        implies: dict[str, tuple[str, ...]],
+    ) -> None:
+        names = list(dict.fromkeys(str(member) for enum in enums for member in enum))
+        self.names: tuple[str, ...] = tuple(names)
+        self.bits: dict[str, int] = {name: 1 << i for i, name in enumerate(names)}
+
+        edges = {
+            name: {other for other in names if other.startswith(f"{name}:")}
+            | {str(s) for s in implies.get(name, ())}
+            for name in names
+        }
+        closure = dict.fromkeys(names, 0)
+        for name in names:
+            seen, stack = {name}, [name]
+            while stack:
+                for implied in edges[stack.pop()]:
+                    if implied not in seen:
+                        seen.add(implied)
+                        stack.append(implied)
+            for scope in seen:
+                closure[name] |= self.bits[scope]
+        self.closure: dict[str, int] = closure
+
+    def unknown(self, scopes: Iterable[str]) -> list[str]:
+        return [s for s in scopes if s not in self.bits]
+
+    def granted(self, scopes: Iterable[str]) -> int:
+        """Mask of everything `scopes` grants, implications included. Unknown scopes grant nothing."""
+        mask = 0
+        closure = self.closure
+        for scope in scopes:
+            mask |= closure.get(scope, 0)
+        return mask
+
+    def required(self, scopes: Iterable[str]) -> int:
+        """Mask that must be covered; only the scopes themselves, not what they imply."""
+        scopes = list(scopes)
+        if unknown := self.unknown(scopes):
+            raise UnknownScopeError(unknown)
+        mask = 0
+        for scope in scopes:
+            mask |= self.bits[scope]
+        return mask
+
+    def names_of(self, mask: int) -> list[str]:
+        return [name for name, bit in self.bits.items() if mask & bit]
+
+
+SCOPES = ScopeRegistry(SCOPE_ENUMS, SCOPE_IMPLIES)
+
+
+@lru_cache(maxsize=4096)
+def _granted_mask(scopes: tuple[str, ...]) -> int:
+    return SCOPES.granted(scopes)
+
+
+@lru_cache(maxsize=256)
+def _required_mask(scopes: tuple[str, ...]) -> int:
+    return SCOPES.required(scopes)
+
+
+def granted_mask(scopes: Iterable[str]) -> int:
+    return _granted_mask(tuple(scopes))
+
+
+def required_mask(scopes: Iterable[str]) -> int:
+    return _required_mask(tuple(scopes))
+
+
+def has_scopes(granted: int, required: int) -> bool:
+    return granted & required == required
+
+
+def missing_scopes(granted: int, required: int) -> list[str]:
+    return SCOPES.names_of(required & ~granted)
+
+
+def unknown_scopes(scopes: Iterable[str]) -> list[str]:
+    return SCOPES.unknown(scopes)
+
+
+def encode_scopes(scopes: Iterable[str]) -> str | None:
+    """
+    Compact `<table version>.<hex mask>` form of `scopes`, or None when some
+    scope isn't in the registry (the caller then keeps the names).
+    """
+    scopes = list(scopes)
+    if SCOPES.unknown(scopes):
+        return None
+    return f"{SCOPE_TABLE_VERSION}.{SCOPES.required(scopes):x}"
+
+
+def decode_scopes(value: str) -> list[str]:
+    """
+    Inverse of `encode_scopes`. Older table versions decode with the current
+    table because it is append-only; newer ones are rejected.
+    """
+    version, sep, bits = value.partition(".")
+    try:
+        table_version, mask = int(version), int(bits, 16)
+    except ValueError:
+        raise ValueError(f"Malformed compact scopes: {value!r}") from None
+    if not sep or table_version > SCOPE_TABLE_VERSION or mask >> len(SCOPES.names):
+        raise ValueError(f"Unsupported compact scopes: {value!r}")
+    return SCOPES.names_of(mask)
+
+
+def scope_table() -> dict:
+    """Decoding table published to peer services."""
+    return {
+        "version": SCOPE_TABLE_VERSION,
+        "format": "<version>.<hex mask>; bit i set => scopes[i]",
+        "scopes": list(SCOPES.names),
+    }
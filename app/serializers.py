@@ -0,0 +1,40 @@
+"""
+Precompiled JSON encoders for user list responses.
+
+`list_users` and `/users/bulk` return raw row dicts (straight from
+`QuerySet.values()` or read off model instances with a prebuilt getter) and
+dump them with a cached pydantic-core serializer. Returning a `Response`
+directly makes FastAPI skip its `response_model` re-validation, so each row
+is touched exactly once on the way out.
+"""
+
+from operator import attrgetter
+from typing import Any, Iterable
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.schemas import Schema
+
+READ_FIELDS: tuple[str, ...] = tuple(Schema.model_fields)
+
+_read_row = attrgetter(*READ_FIELDS)
+_rows_adapter = TypeAdapter(list[dict[str, Any]])
+
+
+def user_row(user: Any) -> dict[str, Any]:
+    """Row dict for a `User`-like object, shaped like `Schema`."""
+    return dict(zip(READ_FIELDS, _read_row(user)))
+
+
+def rows_response(rows: Iterable[dict[str, Any]], status_code: int = 200) -> Response:
+    """Encode already-shaped rows without another validation pass."""
+    return Response(
+        content=_rows_adapter.dump_json(list(rows)),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def users_response(users: Iterable[Any], status_code: int = 200) -> Response:
+    return rows_response((user_row(u) for u in users), status_code)
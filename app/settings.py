@@ -2,19 +2,56 @@ import os
 from datetime import timedelta
 
 db_url = os.environ.get("DB_URL", "sqlite://:memory:")
+# Postgres pool (primary and replica each get one); see app/pool.py
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", "5"))  # 0 = wait forever
+DB_STATEMENT_TIMEOUT = float(os.environ.get("DB_STATEMENT_TIMEOUT", "30"))  # seconds, 0 = off
+# asyncpg prepared-statement cache per connection; 0 behind PgBouncer (transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# Optional read replica for read-only user queries (empty = primary only)
+DB_REPLICA_URL = os.environ.get("DB_REPLICA_URL", "")
+# Reads for a user stay on the primary this long after that user's own write
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", "5"))
+# Replica is bypassed when replay lag exceeds this or a probe/query fails
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", "2"))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "5"))
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "")
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Redis is optional (cache, rate limits, events): fail fast, then stop trying
+# for a cooldown once the breaker trips.
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "0.25"))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", "0.25"))
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_BREAKER_FAILURES = int(os.environ.get("REDIS_BREAKER_FAILURES", "5"))
+REDIS_BREAKER_COOLDOWN = float(os.environ.get("REDIS_BREAKER_COOLDOWN", "10"))
+# Opt-in in-process verify cache kept coherent by Redis CLIENT TRACKING pushes
+REDIS_CLIENT_TRACKING = os.environ.get("REDIS_CLIENT_TRACKING", "").lower() in ("1", "true", "yes")
+VERIFY_LOCAL_CACHE_SIZE = int(os.environ.get("VERIFY_LOCAL_CACHE_SIZE", "10000"))
+VERIFY_LOCAL_TTL = float(os.environ.get("VERIFY_LOCAL_TTL", "60"))
 
 # Basic auth/JWT settings following FastAPI security guide
 SECRET_KEY = os.environ.get("SECRET_KEY", "change-me-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Scope encoding in issued JWTs and the forwardAuth response headers:
+#   names   — "scopes" claim / X-User-Scopes (space separated)
+#   both    — names plus the compact "scp" claim / X-User-Scope-Bits (migration)
+#   compact — compact form only; see GET /scopes/table for decoding
+SCOPE_ENCODING = os.environ.get("SCOPE_ENCODING", "names")
+
 # SMTP settings for contact form (Gmail: use App Password, not account password)
 SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
 SMTP_USER = os.environ.get("SMTP_USER", "")
 SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+# Contact mail is queued on a Redis Stream and sent by a background worker
+MAIL_OUTBOX_STREAM = os.environ.get("MAIL_OUTBOX_STREAM", "mail:outbox")
+MAIL_BATCH_SIZE = int(os.environ.get("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", "8"))
+MAIL_SMTP_IDLE_CLOSE = float(os.environ.get("MAIL_SMTP_IDLE_CLOSE", "60"))  # seconds
 CONTACT_EMAIL = os.environ.get("CONTACT_EMAIL", "contact@ploshtadka.bg")
 
 # Cloudflare Turnstile
@@ -23,6 +60,66 @@ TURNSTILE_SECRET_KEY = os.environ.get("TURNSTILE_SECRET_KEY", "")
 # Contact form rate limit (requests per IP per window)
 CONTACT_RATE_LIMIT = int(os.environ.get("CONTACT_RATE_LIMIT", "5"))
 CONTACT_RATE_WINDOW = int(os.environ.get("CONTACT_RATE_WINDOW", "3600"))  # seconds
+# "<limit>/<seconds>" per client IP or per username
+RATE_LIMIT_LOGIN_IP = os.environ.get("RATE_LIMIT_LOGIN_IP", "30/60")
+RATE_LIMIT_LOGIN_USER = os.environ.get("RATE_LIMIT_LOGIN_USER", "10/300")
+RATE_LIMIT_GOOGLE_IP = os.environ.get("RATE_LIMIT_GOOGLE_IP", "30/60")
+RATE_LIMIT_REGISTER_IP = os.environ.get("RATE_LIMIT_REGISTER_IP", "10/3600")
+# Proxies in front of the service that append to X-Forwarded-For (Traefik = 1);
+# the client IP is the entry the outermost of them appended. 0 = use the peer address
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "1"))
+
+# Startup: each warm-up step (DB pool, Redis, Google transport) gives up after this
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "10"))  # seconds
+
+# Background dependency checks served by /health/ready; see app/health.py
+HEALTH_CHECK_INTERVAL = float(os.environ.get("HEALTH_CHECK_INTERVAL", "5"))  # seconds
+HEALTH_CHECK_TIMEOUT = float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))  # seconds
+# Dependencies whose failure fails readiness (postgres, redis, notifications)
+HEALTH_CRITICAL = frozenset(
+    name.strip()
+    for name in os.environ.get("HEALTH_CRITICAL", "postgres").split(",")
+    if name.strip()
+)
+# e.g. http://notifications-ms:8004/health/live; empty = not checked
+HEALTH_NOTIFICATIONS_URL = os.environ.get("HEALTH_NOTIFICATIONS_URL", "")
+
+# Per-request time breakdown (Redis, DB, JWT, bcrypt, outbound); see app/timing.py
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+# When set, only requests sending it as X-Server-Timing-Token get the header
+SERVER_TIMING_TOKEN = os.environ.get("SERVER_TIMING_TOKEN", "")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))  # 0 = no slow-request log
+
+# Logging: "text" (colorized) or "json" lines; see app/logging.py
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# Lines buffered for the background writer thread; 0 = write from the caller
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Share of uvicorn access lines kept per path ("/x/*" = prefix); 5xx always kept
+LOG_ACCESS_SAMPLE = os.environ.get(
+    "LOG_ACCESS_SAMPLE", "/auth/verify=0.01,/health/*=0,/metrics=0"
+)
+LOG_RATE_LIMIT = int(os.environ.get("LOG_RATE_LIMIT", "50"))  # per call site per second, 0 = off
+
+# Tracing (app/tracing.py): share of new traces sampled, 0 = off
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+# OTLP/HTTP collector, e.g. http://otel-collector:4318; empty = spans logged at DEBUG
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "users-ms")
+TRACE_EXPORT_INTERVAL = float(os.environ.get("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_QUEUE_SIZE = int(os.environ.get("TRACE_QUEUE_SIZE", "2048"))  # spans kept between exports
+
+# Profiling (app/profiler.py): longest GET /debug/profile run, event-loop stall logging
+PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+LOOP_LAG_THRESHOLD_MS = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", "100"))  # 0 = off
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.25"))  # heartbeat, seconds
+
+# Admin user search: server-side budget per query and SQLite fallback scan cap
+USER_SEARCH_TIMEOUT_MS = int(os.environ.get("USER_SEARCH_TIMEOUT_MS", "250"))
+USER_SEARCH_SCAN_LIMIT = int(os.environ.get("USER_SEARCH_SCAN_LIMIT", "1000"))
+
+# User change events for peer caches (Redis Stream, approximate trim length)
+USER_EVENTS_STREAM = os.environ.get("USER_EVENTS_STREAM", "users:changes")
+USER_EVENTS_MAXLEN = int(os.environ.get("USER_EVENTS_MAXLEN", "100000"))
 
 
 NOTIFICATIONS_MS_URL = os.environ.get(
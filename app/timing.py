@@ -0,0 +1,115 @@
+"""
+Per-request time breakdown: a `Server-Timing` header and slow-request logs.
+
+`ServerTimingMiddleware` gives each request a dict in a context variable.
+`record`/`timer` add to it from Redis helpers (`redis`), DB helpers (`db`,
+via `app.metrics.db_helper`), JWT encode/decode (`jwt`), bcrypt (`bcrypt`)
+and outbound calls (`notifications`, `turnstile`, `smtp`). Outside a request
+they are a context-variable read and nothing else.
+
+- `SERVER_TIMING=1` adds the header, e.g.
+  `redis;dur=0.42;desc="1 call", jwt;dur=0.05;desc="1 call", total;dur=1.10`.
+  With `SERVER_TIMING_TOKEN` set, only requests carrying it in
+  `X-Server-Timing-Token` get the header (it reveals internals).
+- Requests slower than `SLOW_REQUEST_MS` are logged with the same breakdown.
+"""
+
+import time
+from contextvars import ContextVar
+
+from loguru import logger
+
+from app.settings import SERVER_TIMING, SERVER_TIMING_TOKEN, SLOW_REQUEST_MS
+
+_timings: ContextVar[dict[str, list] | None] = ContextVar("server_timings", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is None:
+        return
+    entry = timings.get(name)
+    if entry is None:
+        timings[name] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+
+class timer:
+    """`with timer("redis"): ...` records the block's duration under that name."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        record(self.name, time.perf_counter() - self.start)
+
+
+def header_value(timings: dict[str, list], total: float) -> str:
+    parts = [
+        f'{name};dur={seconds * 1000:.2f};desc="{count} call{"s" if count > 1 else ""}"'
+        for name, (seconds, count) in timings.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    def __init__(
+        self,
+        app,
+        header: bool = SERVER_TIMING,
+        token: str = SERVER_TIMING_TOKEN,
+        slow_ms: float = SLOW_REQUEST_MS,
+    ) -> None:
+        self.app = app
+        self.header = header
+        self.token = token.encode()
+        self.slow_ms = slow_ms
+
+    def _expose(self, scope) -> bool:
+        if not self.header:
+            return False
+        if not self.token:
+            return True
+        return any(
+            name == b"x-server-timing-token" and value == self.token
+            for name, value in scope["headers"]
+        )
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not (self.header or self.slow_ms):
+            await self.app(scope, receive, send)
+            return
+        timings: dict[str, list] = {}
+        expose = self._expose(scope)
+        start = time.perf_counter()
+
+        async def send_with_timing(message) -> None:
+            if expose and message["type"] == "http.response.start":
+                value = header_value(timings, time.perf_counter() - start)
+                headers = [*message.get("headers", ()), (b"server-timing", value.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        reset = _timings.set(timings)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(reset)
+            elapsed = time.perf_counter() - start
+            if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+                logger.warning(
+                    "Slow request: {} {} took {:.1f}ms ({})",
+                    scope["method"],
+                    scope["path"],
+                    elapsed * 1000,
+                    header_value(timings, elapsed),
+                )
@@ -0,0 +1,344 @@
+"""
+Distributed tracing with W3C `traceparent` propagation and OTLP export, kept
+in process (no OpenTelemetry SDK).
+
+`TracingMiddleware` opens a server span per request, continuing the trace of
+an incoming `traceparent` header (Traefik, other services) or starting one.
+Inside it, `span()` opens child spans: DB helpers (`app.metrics.db_helper`),
+outbound calls (`app.metrics.outbound`), verify-cache operations and bcrypt.
+`trace_headers()` returns the `traceparent` to send along, e.g. to
+notifications-ms.
+
+Sampling is decided once per trace: a sampled parent is followed, otherwise
+`TRACE_SAMPLE_RATE` of new traces are kept. With the rate at 0 no trace is
+started here, and a request without a `traceparent` passes straight through;
+in an unsampled request `span()` is a context-variable read returning a
+shared no-op.
+
+Finished spans go to `exporter`: OTLP/HTTP JSON batches to
+`OTEL_EXPORTER_OTLP_ENDPOINT` when it is set (sent by the lifespan's
+`trace-exporter` task), otherwise one DEBUG log line per span. Tests swap in
+`InMemoryExporter`.
+"""
+
+import asyncio
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from loguru import logger
+
+from app.settings import (
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+    OTEL_SERVICE_NAME,
+    TRACE_EXPORT_INTERVAL,
+    TRACE_QUEUE_SIZE,
+    TRACE_SAMPLE_RATE,
+)
+
+INTERNAL, SERVER, CLIENT = "internal", "server", "client"
+_OTLP_KINDS = {INTERNAL: 1, SERVER: 2, CLIENT: 3}
+
+_current: ContextVar["Span | None"] = ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "kind",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "sampled",
+        "attributes",
+        "start",
+        "end",
+        "error",
+        "_reset",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        sampled: bool = True,
+        kind: str = INTERNAL,
+        attributes: dict | None = None,
+    ) -> None:
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes) if attributes else {}
+        self.start = self.end = 0  # unix ns
+        self.error: str | None = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def __enter__(self) -> "Span":
+        self.start = time.time_ns()
+        self._reset = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = time.time_ns()
+        _current.reset(self._reset)
+        if exc_type is not None and self.error is None:
+            self.error = str(exc) or exc_type.__name__
+        if self.sampled:
+            exporter.export(self)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, kind: str = INTERNAL, attributes: dict | None = None) -> Span | _NoopSpan:
+    """Child of the current span, or a no-op outside a sampled trace."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return _NOOP
+    return Span(name, parent.trace_id, parent.span_id, True, kind, attributes)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def trace_headers() -> dict[str, str]:
+    """`traceparent` for an outgoing request, sampled or not; empty outside a trace."""
+    current = _current.get()
+    return {"traceparent": current.traceparent} if current is not None else {}
+
+
+def parse_traceparent(value: str) -> tuple[str, str, bool] | None:
+    """`00-<trace id>-<parent id>-<flags>` -> (trace id, parent id, sampled)."""
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if version == "00" and len(parts) != 4:
+        return None
+    if len(trace_id) != 32 or len(parent_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        sampled = int(flags, 16) & 1 == 1
+        if int(trace_id, 16) == 0 or int(parent_id, 16) == 0:
+            return None
+    except ValueError:
+        return None
+    return trace_id.lower(), parent_id.lower(), sampled
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def otlp_span(span: Span) -> dict:
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": _OTLP_KINDS[span.kind],
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(span.end),
+        "attributes": [_attribute(key, value) for key, value in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+def otlp_body(spans: list[Span], service: str = OTEL_SERVICE_NAME) -> dict:
+    """OTLP/HTTP JSON `ExportTraceServiceRequest`."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [_attribute("service.name", service)]},
+                "scopeSpans": [
+                    {"scope": {"name": "app.tracing"}, "spans": [otlp_span(s) for s in spans]}
+                ],
+            }
+        ]
+    }
+
+
+class InMemoryExporter:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class LogExporter:
+    def export(self, span: Span) -> None:
+        logger.debug(
+            "Span {} {:.2f}ms trace={} span={} parent={} {}",
+            span.name,
+            (span.end - span.start) / 1e6,
+            span.trace_id,
+            span.span_id,
+            span.parent_id,
+            span.error or span.attributes,
+        )
+
+
+class OtlpExporter:
+    """Buffers spans; `run()` posts them to the collector every `interval` seconds."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        interval: float = TRACE_EXPORT_INTERVAL,
+        max_queue: int = TRACE_QUEUE_SIZE,
+    ) -> None:
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.interval = interval
+        self.max_queue = max_queue
+        self._queue: list[Span] = []
+        self.dropped = 0
+
+    def export(self, span: Span) -> None:
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+
+    async def flush(self, client) -> None:
+        if not self._queue:
+            return
+        spans, self._queue = self._queue, []
+        try:
+            resp = await client.post(self.url, json=otlp_body(spans))
+            resp.raise_for_status()
+        except Exception as exc:
+            logger.warning("Trace export of {} span(s) failed: {}", len(spans), exc)
+
+    async def run(self) -> None:
+        import httpx
+
+        async with httpx.AsyncClient(timeout=self.interval) as client:
+            try:
+                while True:
+                    await asyncio.sleep(self.interval)
+                    await self.flush(client)
+            finally:
+                await self.flush(client)  # what is left at shutdown
+
+
+exporter: InMemoryExporter | LogExporter | OtlpExporter = (
+    OtlpExporter(OTEL_EXPORTER_OTLP_ENDPOINT) if OTEL_EXPORTER_OTLP_ENDPOINT else LogExporter()
+)
+
+
+def set_exporter(new):
+    """Install `new` and return the previous exporter."""
+    global exporter
+    previous, exporter = exporter, new
+    return previous
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+_route_paths: dict[Callable, str] = {}
+
+
+def route_template(scope: dict) -> str:
+    """Route path (`/users/{user_id}`) of the endpoint that served `scope`."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in scope["app"].routes:
+            if hasattr(route, "endpoint"):
+                _route_paths.setdefault(route.endpoint, route.path)
+        path = _route_paths.setdefault(endpoint, getattr(endpoint, "__name__", "unknown"))
+    return path
+
+
+class TracingMiddleware:
+    def __init__(self, app, rate: float = TRACE_SAMPLE_RATE) -> None:
+        self.app = app
+        self.rate = rate
+
+    def _start(self, scope) -> Span | None:
+        """Server span continuing the incoming trace; None at rate 0 without one."""
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                if parent is not None:
+                    trace_id, parent_id, sampled = parent
+                    return Span("", trace_id, parent_id, sampled, SERVER)
+                break
+        if self.rate <= 0:
+            return None
+        sampled = random.random() < self.rate
+        return Span("", os.urandom(16).hex(), None, sampled, SERVER)
+
+    async def __call__(self, scope, receive, send) -> None:
+        server = self._start(scope) if scope["type"] == "http" else None
+        if server is None:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with server:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                if server.sampled:
+                    route = route_template(scope)
+                    server.name = f"{scope['method']} {route}"
+                    server.attributes.update(
+                        {
+                            "http.request.method": scope["method"],
+                            "http.route": route,
+                            "url.path": scope["path"],
+                            "http.response.status_code": status,
+                        }
+                    )
+                    if status >= 500 and server.error is None:
+                        server.error = f"HTTP {status}"
@@ -0,0 +1,160 @@
+"""
+Server-assisted client-side caching for verify lookups (Redis CLIENT TRACKING).
+
+With `REDIS_CLIENT_TRACKING=1`, verify results are also kept in a small
+in-process cache and Redis tells us when to drop them:
+
+- a listener connection subscribes to `__redis__:invalidate`;
+- an anchor connection runs `CLIENT TRACKING ON REDIRECT <listener id> BCAST
+  PREFIX auth:verify:v2: PREFIX auth:user_floor:`, so every write to a verify
+  entry or a user's invalidation floor (`invalidate_user_cache`), including
+  expiry, is pushed to the listener, whoever made it.
+
+This is the RESP2-compatible redirect mode; redis-py's built-in client-side
+cache is sync-only. Reads that raced an invalidation are not stored (see
+`begin`/`put`). While the listener is down or the server refuses tracking,
+the local cache is bypassed and cleared, so reads fall back to Redis.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+from loguru import logger
+from redis.asyncio.connection import ConnectionPool
+from redis.exceptions import ResponseError
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+_PING_EVERY = 15.0  # seconds of silence before checking the listener is alive
+_RETRY_AFTER = 5.0
+
+
+class TrackedCache:
+    """Bounded LRU of positive verify results, dropped on Redis pushes."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = False
+        self.hits = 0
+        self._entries: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+        self._by_user: dict[str, set[str]] = {}
+        self._generation = 0
+
+    def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, _, payload = entry
+        if expires <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def begin(self) -> int:
+        """Call before reading Redis; pass the result to `put`."""
+        return self._generation
+
+    def put(self, key: str, user_id: str, payload: dict, generation: int) -> None:
+        """Store unless any invalidation arrived since `begin` (it may concern this read)."""
+        if not self.enabled or generation != self._generation:
+            return
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, user_id, payload)
+        self._by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, keys: list[str] | None, floor_prefix: str) -> None:
+        """Apply a push: `None` means the server flushed everything."""
+        self._generation += 1
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            if key.startswith(floor_prefix):
+                for token_key in self._by_user.pop(key[len(floor_prefix):], ()):
+                    self._entries.pop(token_key, None)
+            else:
+                self._drop(key)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[1]]
+
+    def snapshot(self) -> dict:
+        return {"enabled": self.enabled, "entries": len(self._entries), "hits": self.hits}
+
+
+async def _command(conn, *args):
+    await conn.send_command(*args)
+    return await conn.read_response()
+
+
+async def track(cache: TrackedCache, url: str, prefixes: list[str], floor_prefix: str) -> None:
+    """Keep `cache` coherent with Redis for as long as this task runs."""
+    pool = ConnectionPool.from_url(url, decode_responses=True)
+    while True:
+        listener = pool.make_connection()
+        anchor = pool.make_connection()
+        try:
+            await listener.connect()
+            await anchor.connect()
+            listener_id = await _command(listener, "CLIENT", "ID")
+            await _command(listener, "SUBSCRIBE", INVALIDATE_CHANNEL)
+            args = ["CLIENT", "TRACKING", "ON", "REDIRECT", listener_id, "BCAST"]
+            for prefix in prefixes:
+                args += ["PREFIX", prefix]
+            await _command(anchor, *args)
+            cache.clear()
+            cache.enabled = True
+            logger.info("Redis client tracking on: prefixes={}", prefixes)
+            await _listen(cache, listener, floor_prefix)
+        except ResponseError as exc:
+            logger.warning("Redis refused client tracking; local verify cache off: {}", exc)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Redis tracking listener lost; retrying", exc_info=True)
+        finally:
+            cache.enabled = False
+            cache.clear()
+            for conn in (listener, anchor):
+                await conn.disconnect()
+        await asyncio.sleep(_RETRY_AFTER)
+
+
+async def _listen(cache: TrackedCache, listener, floor_prefix: str) -> None:
+    awaiting_pong = False
+    while True:
+        message = await listener.read_response(timeout=_PING_EVERY)
+        if message is None:  # quiet for a while: make sure the connection is alive
+            if awaiting_pong:
+                raise ConnectionError("Redis tracking listener stopped answering")
+            await listener.send_command("PING")
+            awaiting_pong = True
+            continue
+        awaiting_pong = False
+        handle_push(cache, message, floor_prefix)
+
+
+def handle_push(cache: TrackedCache, message, floor_prefix: str) -> None:
+    """`["message", "__redis__:invalidate", [keys] | None]`; anything else is ignored."""
+    if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+        if message[1] == INVALIDATE_CHANNEL:
+            cache.invalidate(message[2], floor_prefix)
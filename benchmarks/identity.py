@@ -0,0 +1,88 @@
+"""
+Per-lookup cost of identity reads: the ORM path (`User.get_or_none`, a full
+model instance) against `app.identity.get_identity` (one prepared statement,
+an `Identity` tuple).
+
+Runs on in-memory SQLite by default. Point `BENCH_DB_URL` at a scratch
+Postgres database to measure the asyncpg prepared-statement path (the
+`user` table is created if missing and the rows are removed afterwards).
+
+    uv run python -m benchmarks.identity
+    BENCH_DB_URL=postgres://u:p@localhost/bench uv run python -m benchmarks.identity
+"""
+
+import asyncio
+import os
+import time
+import tracemalloc
+
+from tortoise import Tortoise
+
+from app.identity import get_identity
+from app.models import User
+from app.pool import db_connection
+from app.scopes import DEFAULT_USER_SCOPES
+
+USERS = 1_000
+LOOKUPS = 5_000
+
+
+async def orm(username: str):
+    return await User.get_or_none(username=username)
+
+
+async def lean(username: str):
+    return await get_identity(username)
+
+
+async def _time(lookup, names: list[str]) -> float:
+    start = time.perf_counter()
+    for name in names:
+        await lookup(name)
+    return (time.perf_counter() - start) / len(names) * 1e6
+
+
+async def _peak_alloc(lookup, name: str, rounds: int = 200) -> float:
+    """Mean peak bytes allocated while one lookup is in flight."""
+    total = 0
+    tracemalloc.start()
+    for _ in range(rounds):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await lookup(name)
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total / rounds
+
+
+async def main() -> None:
+    url = os.environ.get("BENCH_DB_URL", "sqlite://:memory:")
+    await Tortoise.init(
+        config={
+            "connections": {"default": db_connection(url)},
+            "apps": {"models": {"models": ["app.models"], "default_connection": "default"}},
+        }
+    )
+    await Tortoise.generate_schemas(safe=True)
+    prefix = f"bench-{os.getpid()}-"
+    await User.bulk_create(
+        User(username=f"{prefix}{i}", scopes=[str(s) for s in DEFAULT_USER_SCOPES])
+        for i in range(USERS)
+    )
+    names = [f"{prefix}{i % USERS}" for i in range(LOOKUPS)]
+    try:
+        for lookup in (orm, lean):  # warm up connections and statement caches
+            await _time(lookup, names[:USERS])
+        print(f"{url.split('://')[0]}: {LOOKUPS} lookups over {USERS} users")
+        print(f"{'path':>5} | {'µs/lookup':>10} | {'peak B/lookup':>13}")
+        for lookup in (orm, lean):
+            micros = min([await _time(lookup, names) for _ in range(3)])
+            peak = await _peak_alloc(lookup, names[0])
+            print(f"{lookup.__name__:>5} | {micros:>10.1f} | {peak:>13.0f}")
+    finally:
+        await User.filter(username__startswith=prefix).delete()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""
+Cost of the metrics instrumentation on the `/auth/verify` hot path.
+
+Drives the ASGI app directly (no HTTP server, no test client) with a
+forwardAuth request that the in-process verify cache answers, once without
+and once with `MetricsMiddleware`. The difference is what instrumentation
+adds per verify: the middleware plus the cache lookup counter, which runs in
+both. Also prints the cost of each recording primitive on its own, and of a
+tracing span outside a sampled trace (what every instrumented call pays while
+`TRACE_SAMPLE_RATE` is 0).
+
+    uv run python -m benchmarks.metrics
+"""
+
+import asyncio
+import statistics
+import time
+import timeit
+
+from fastapi import FastAPI
+
+from app.cache import _token_key, verify_local
+from app.logging import setup_logging
+from app.metrics import Counter, Histogram, MetricsMiddleware
+from app.routers.auth import router as auth_router
+from app.tracing import span
+
+TOKEN = "bench-token"
+REQUESTS = 5_000
+ROUNDS = 15
+NUMBER = 500_000
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/auth/verify",
+    "raw_path": b"/auth/verify",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"authorization", f"Bearer {TOKEN}".encode())],
+    "client": ("127.0.0.1", 50000),
+    "server": ("127.0.0.1", 8000),
+}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    if message["type"] == "http.response.start":
+        assert message["status"] == 200, message
+
+
+async def _per_request(app, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), _receive, _send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def _app(instrumented: bool):
+    app = FastAPI()
+    app.include_router(auth_router)
+    return MetricsMiddleware(app) if instrumented else app
+
+
+async def main() -> None:
+    setup_logging("INFO")  # production level: the cache-hit debug line is skipped
+    verify_local.enabled = True
+    verify_local.put(
+        _token_key(TOKEN),
+        "00000000-0000-0000-0000-000000000001",
+        {
+            "user_id": "00000000-0000-0000-0000-000000000001",
+            "username": "bench",
+            "scopes": "users:me",
+            "scope_bits": None,
+            "version": 1,
+        },
+        verify_local.begin(),
+    )
+    apps = {"plain": _app(False), "metrics": _app(True)}
+    for app in apps.values():  # warm up route and dependency caches
+        await _per_request(app, 1000)
+    samples: dict[str, list[float]] = {name: [] for name in apps}
+    for _ in range(ROUNDS):  # interleaved, so drift hits both alike
+        for name, app in apps.items():
+            samples[name].append(await _per_request(app, REQUESTS))
+    results = {name: statistics.median(values) for name, values in samples.items()}
+    print(f"/auth/verify (local cache hit), {ROUNDS} x {REQUESTS} requests, median")
+    for name, micros in results.items():
+        print(f"{name:>8}: {micros:7.2f} µs/request")
+    overhead = results["metrics"] - results["plain"]
+    print(f"overhead: {overhead:7.2f} µs ({overhead / results['plain']:.1%})")
+
+    counter = Counter("bench_total", "Bench.", ("result",), registry=None)
+    histogram = Histogram("bench_seconds", "Bench.", ("route",), registry=None)
+
+    def unsampled_span():
+        with span("bench"):
+            pass
+
+    for label, stmt in (
+        ("Counter.inc", lambda: counter.inc("hit")),
+        ("Histogram.observe", lambda: histogram.observe(0.0042, "/auth/verify")),
+        ("span (unsampled)", unsampled_span),
+    ):
+        seconds = min(timeit.repeat(stmt, number=NUMBER, repeat=5))
+        print(f"{label:>18}: {seconds / NUMBER * 1e9:6.0f} ns")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
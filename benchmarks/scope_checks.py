@@ -0,0 +1,47 @@
+"""
+Per-check cost of scope enforcement.
+
+Compares the previous linear `in` test over the token's scope list with the
+compiled bitmask check from `app.scopes`.
+
+    uv run python -m benchmarks.scope_checks
+"""
+
+import timeit
+
+from app.scopes import (
+    DEFAULT_OWNER_SCOPES,
+    BookingScope,
+    VenueScope,
+    granted_mask,
+    has_scopes,
+    required_mask,
+)
+
+TOKEN_SCOPES = [str(s) for s in DEFAULT_OWNER_SCOPES]
+REQUIRED = [str(VenueScope.WRITE), str(BookingScope.MANAGE)]
+NUMBER = 200_000
+
+
+def linear() -> bool:
+    return all(scope in TOKEN_SCOPES for scope in REQUIRED)
+
+
+def compiled() -> bool:
+    return has_scopes(granted_mask(TOKEN_SCOPES), required_mask(REQUIRED))
+
+
+def main() -> None:
+    granted, required = granted_mask(TOKEN_SCOPES), required_mask(REQUIRED)
+    cases = {
+        "linear list scan": linear,
+        "compiled (mask lookup + AND)": compiled,
+        "precompiled AND only": lambda: has_scopes(granted, required),
+    }
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=NUMBER, repeat=5))
+        print(f"{name:<30} {best / NUMBER * 1e9:8.1f} ns/check")
+
+
+if __name__ == "__main__":
+    main()
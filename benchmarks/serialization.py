@@ -0,0 +1,73 @@
+"""
+Per-row cost of the user list serializers.
+
+Compares the previous path (`Schema.model_validate(..., from_attributes=True)`
+per row, FastAPI's `response_model` re-validation + stdlib JSON) with the
+precompiled row encoder in `app.serializers`.
+
+    uv run python -m benchmarks.serialization
+"""
+
+import json
+import timeit
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+from pydantic import TypeAdapter
+
+from app.schemas import Schema
+from app.scopes import DEFAULT_USER_SCOPES
+from app.serializers import READ_FIELDS, users_response
+
+SIZES = (1, 100, 10_000)
+
+_response_field = TypeAdapter(list[Schema])
+
+
+def _make_users(n: int) -> list[SimpleNamespace]:
+    now = datetime.now(timezone.utc)
+    users = []
+    for i in range(n):
+        row = {field: None for field in READ_FIELDS}
+        row.update(
+            id=uuid4(),
+            created_at=now,
+            username=f"user{i}",
+            full_name=f"User {i}",
+            email=f"user{i}@example.com",
+            is_active=True,
+            scopes=[str(s) for s in DEFAULT_USER_SCOPES],
+        )
+        users.append(SimpleNamespace(**row))
+    return users
+
+
+def legacy(users: list[SimpleNamespace]) -> bytes:
+    models = [Schema.model_validate(u, from_attributes=True) for u in users]
+    validated = _response_field.validate_python(models, from_attributes=True)
+    content = _response_field.dump_python(validated, mode="json")
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+def fast(users: list[SimpleNamespace]) -> bytes:
+    return users_response(users).body
+
+
+def main() -> None:
+    print(f"{'rows':>7} | {'legacy µs/row':>14} | {'fast µs/row':>12} | speedup")
+    for n in SIZES:
+        users = _make_users(n)
+        number = max(1, 20_000 // n)
+        t_legacy = min(timeit.repeat(lambda: legacy(users), number=number, repeat=5))
+        t_fast = min(timeit.repeat(lambda: fast(users), number=number, repeat=5))
+        per_legacy = t_legacy / number / n * 1e6
+        per_fast = t_fast / number / n * 1e6
+        print(
+            f"{n:>7} | {per_legacy:>14.2f} | {per_fast:>12.2f} | "
+            f"{per_legacy / per_fast:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
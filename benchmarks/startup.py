@@ -0,0 +1,106 @@
+"""
+Cold-start profile against a tracked budget: a fresh interpreter imports
+`main` under `-X importtime`, then runs the application lifespan until the
+warm-up (see `app.lifespan`) has finished.
+
+Prints import time split by top-level package (self time, so nothing is
+counted twice), the time to enter the lifespan and each warm-up step, and
+exits with status 1 when import or startup is over budget. Lower the budgets
+below when a change makes startup cheaper; raise them only deliberately.
+
+Uses the usual settings, so point `DB_URL`/`REDIS_URL` at local services to
+include real connection handshakes (SQLite in memory and an absent Redis by
+default).
+
+    uv run python -m benchmarks.startup
+"""
+
+import json
+import re
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+IMPORT_BUDGET_MS = 1500  # `import main`
+STARTUP_BUDGET_MS = 1000  # lifespan entered and warm-up done
+TOP = 15
+
+_CHILD = """
+import asyncio, json, time
+
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+from app.lifespan import is_warm, warmup_state
+
+
+async def boot():
+    app = main.application
+    async with app.router.lifespan_context(app):
+        entered = time.perf_counter()
+        while not is_warm():
+            await asyncio.sleep(0.001)
+        return entered, time.perf_counter(), warmup_state()
+
+
+entered, warm, state = asyncio.run(boot())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": (entered - imported) * 1000,
+    "startup_ms": (warm - imported) * 1000,
+    "warmup": state["seconds"],
+}))
+"""
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)")
+
+
+def by_package(importtime: str) -> Counter:
+    """Self time (µs) per top-level package."""
+    totals: Counter = Counter()
+    for match in _IMPORTTIME.finditer(importtime):
+        totals[match[2].split(".")[0]] += int(match[1])
+    return totals
+
+
+def main() -> int:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        sys.stderr.write(proc.stderr[-4000:])
+        return proc.returncode
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{'package':<24} | {'self ms':>8}")
+    for package, micros in by_package(proc.stderr).most_common(TOP):
+        print(f"{package:<24} | {micros / 1000:>8.1f}")
+    print()
+    print(f"import main      {result['import_ms']:>8.1f} ms  (budget {IMPORT_BUDGET_MS})")
+    print(f"lifespan entered {result['lifespan_ms']:>8.1f} ms")
+    print(f"warm-up done     {result['startup_ms']:>8.1f} ms  (budget {STARTUP_BUDGET_MS})")
+    for step, seconds in result["warmup"].items():
+        shown = "failed" if seconds is None else f"{seconds * 1000:.1f} ms"
+        print(f"  {step:<14} {shown:>10}")
+
+    over = [
+        f"{name} {value:.0f} ms > {budget} ms"
+        for name, value, budget in (
+            ("import", result["import_ms"], IMPORT_BUDGET_MS),
+            ("startup", result["startup_ms"], STARTUP_BUDGET_MS),
+        )
+        if value > budget
+    ]
+    if over:
+        print("Over budget: " + "; ".join(over), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,8 +5,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from ms_core import setup_app
 
+from app.lifespan import install_lifespan
 from app.logging import setup_logging
+from app.metrics import MetricsMiddleware
+from app.pool import db_connection
 from app.settings import db_url
+from app.timing import ServerTimingMiddleware
+from app.tracing import TracingMiddleware
 
 setup_logging()
 
@@ -19,5 +24,9 @@ application.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+application.add_middleware(MetricsMiddleware)
+application.add_middleware(ServerTimingMiddleware)
+application.add_middleware(TracingMiddleware)
 
-tortoise_conf = setup_app(application, db_url, Path("app") / "routers", ["app.models"])
+tortoise_conf = setup_app(application, db_connection(db_url), Path("app") / "routers", ["app.models"])
+install_lifespan(application)
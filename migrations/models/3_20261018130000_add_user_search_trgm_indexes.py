@@ -0,0 +1,58 @@
+from tortoise import BaseDBAsyncClient
+
+# CREATE INDEX CONCURRENTLY cannot run in a transaction, and a multi-statement
+# script is one implicit transaction, so each statement is sent on its own.
+RUN_IN_TRANSACTION = False
+
+# Its own step: it needs CREATE on the database (pg_trgm is a trusted
+# extension). Where the app role lacks it, a DBA runs this first and the
+# IF NOT EXISTS makes it a no-op here.
+EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm;"
+
+INDEXES = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_user_username_trgm" '
+    'ON "user" USING GIN ("username" gin_trgm_ops);',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_user_full_name_trgm" '
+    'ON "user" USING GIN ("full_name" gin_trgm_ops);',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_user_email_trgm" '
+    'ON "user" USING GIN ("email" gin_trgm_ops);',
+)
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    await db.execute_script(EXTENSION)
+    for statement in INDEXES[:-1]:
+        await db.execute_script(statement)
+    return INDEXES[-1]
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_user_email_trgm";
+        DROP INDEX IF EXISTS "idx_user_full_name_trgm";
+        DROP INDEX IF EXISTS "idx_user_username_trgm";"""
+
+
+MODELS_STATE = (
+    "eJztmG1v2zYQgP8KoU8pkGaJm6RBMQywEwf10MRFam9Dl0GgKUomIpGqSNU1svz33dGSZc"
+    "mSFzuxgwD9Ylj3wpfnTqcj751IeTzUB0PNE+cDuXckjTj8Kcn3iUPjuJCiwNBRaA3T3GKk"
+    "TUKZAZlPQ81B5HHNEhEboSRadqgWjKA9seMQXyWEpmbMpRGMohmh0iPnN8OLAxzSUwzGFD"
+    "JY2/tW3spLFYZqoglYEBgmZSZNOPETFVnRJdWm/blnR/wFxyFBKmDFH27lW5JK8S3lVodA"
+    "yB6jkow4YWMqA+4RowiPqAhJSA1P3qDLmOoxaGKq9UQlHkypEngWklx0UC+0C3TEd1hCSA"
+    "O7eq18QzxuxXYDaPedJxr3MkqjGPzhHwfRlEwSYWAh3QEN9D6JOXBglMFGmBrzhEvG3yCz"
+    "2cpdowIOu8SY/v0PiIX0+A+u88f4zvUFD71SyIWHA1i5a6axlQ2HvYtLa4nxGLlMhWkkC+"
+    "t4asZKzs1TQHiAPqgLuOQJ8PEWUkKmYZhlTi6arRgEECM+X6pXCDzu0zTExHJ+9VPJbKjt"
+    "TPhz/JuzlGo4SyV/MhFTEtNUSIMs7h9muyr2bKUOTnX+sX2z9+7UQo2VNkFilZaI82Adqa"
+    "EzV8u1AMkSjtt2qVkGegEaIyJeD7XsWYHrZa4H+Z9NIOeCgnLxtuaYc3ybMXVgD15fhtMs"
+    "gisYD3pX3S+D9tVn3Emk9bfQImoPuqhpWem0It2bhURBrZkVoPkg5M/e4CPBR/K1f92tBm"
+    "5uN/jq4JrgnVeuVBOXegvJlktzMGBZBDavB8thPR/TpD6kiz6VgAK17bwnTwxgRH+4IZeB"
+    "GcPjUetsRQT/aN/YFwWsKmG5zlStme6hBNKHid11SZacNkKZgdrly1Bi2To5fQRLsGpkaX"
+    "VllvZDtA7HucOzMNxtNm6F4OzT7eaf7nVY1rj+zMyca6BUEHK3rq9oJlpyeoUZupV6OW8e"
+    "l0l2lAo5lQ1N2qJfBeYIHLfVQcwJP3dX1un3P5WahU5vUOE4vOp0AbDFC0bQNaO4dz2oq5"
+    "su9NbCz84P0DXfcbl2KW0Y41XWga1kr2YKR1ni+vuX/nU918Kj2gMLZsi/JBTabCt3Fw4Z"
+    "o1SERkh9gPNt6ZyBEEoZnaPcu2r/VaV8/qnfqfa1OECnQjw7RC4j70lTT3zBo4Ic9rAt1E"
+    "dPSNsAJ3nbOjp+f3z27vT4DEzsQuaS9yugL1eDNPY2PLOVPX+e2V70zGYXjzcc/t3C0RwF"
+    "I8ruJjTx3CWNaqkm22VV1IqqEippYKOCbHGV2d1ZGz4LbOzU3Kplmv1V92q0sPm/m7XmMD"
+    "/zbVBj9ajt1moKRxawFz3dPkvhaL78aSy9zV1Ec+3d8IZg96eHk0edHk5WnB5Oql0Dvhpr"
+    "QMzMXyfAo8PDx7Rdh4fNbRfqygBhRsNlzfesue9acNl94/U0oLtosV70w/LwH0eiQC0="
+)
@@ -8,7 +8,9 @@ import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
+from app.cache import redis_breaker
 from app.deps import get_current_active_user, get_current_admin_user
+from app.ratelimit import reset_local
 from app.routers.auth import router as auth_router
 from app.routers.scopes import router as scopes_router
 from app.routers.users import router as users_router
@@ -39,6 +41,22 @@ def build_app(active_user, admin_user=None) -> FastAPI:
     return app
 
 
+@pytest.fixture(autouse=True)
+def _closed_redis_breaker():
+    """Tests that reach for an absent Redis must not trip the breaker for the next one."""
+    redis_breaker.reset()
+    yield
+    redis_breaker.reset()
+
+
+@pytest.fixture(autouse=True)
+def _empty_rate_limits():
+    """Local rate-limit buckets would otherwise carry over between tests."""
+    reset_local()
+    yield
+    reset_local()
+
+
 # ---------------------------------------------------------------------------
 # Client fixtures
 # ---------------------------------------------------------------------------
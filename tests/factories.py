@@ -5,6 +5,8 @@ Import from here in every test file — never define dummy data inline.
 
 from __future__ import annotations
 
+import math
+from datetime import datetime, timezone
 from uuid import UUID, uuid4
 
 from app.scopes import DEFAULT_ADMIN_SCOPES, DEFAULT_USER_SCOPES
@@ -33,6 +35,7 @@ class DummyUser:
         is_active: bool = True,
         scopes: list | None = None,
         email_verification_token: str | None = None,
+        version: int = 1,
     ) -> None:
         self.id = user_id or uuid4()
         self.username = username
@@ -41,10 +44,15 @@ class DummyUser:
         self.is_active = is_active
         self.scopes = list(scopes) if scopes is not None else []
         self.email_verification_token = email_verification_token
+        self.version = version
 
     async def save(self) -> None:
         """No-op for tests — allows verify-email endpoint to call user.save()."""
 
+    async def load(self) -> "DummyUser":
+        """Also stands in for `app.deps.CurrentUser`, whose row is itself."""
+        return self
+
 
 # ---------------------------------------------------------------------------
 # User factories
@@ -89,3 +97,311 @@ def user_response(**overrides) -> dict:
         scopes=list(DEFAULT_USER_SCOPES),
     )
     return {**base, **overrides}
+
+
+def user_row(**overrides) -> dict:
+    """Row dict as returned by `QuerySet.values(*READ_FIELDS)`."""
+    base = dict(
+        id=USER_ID,
+        created_at=datetime.now(timezone.utc),
+        username=f"user_{USER_ID}",
+        full_name=None,
+        email=f"user_{USER_ID}@example.com",
+        google_id=None,
+        is_active=True,
+        email_verification_token=None,
+        scopes=list(DEFAULT_USER_SCOPES),
+        version=1,
+        updated_at=datetime.now(timezone.utc),
+    )
+    return {**base, **overrides}
+
+
+# ---------------------------------------------------------------------------
+# FakeRedis — in-memory stand-in for the Redis features app/ uses
+# ---------------------------------------------------------------------------
+
+
+class _FakePipeline:
+    def __init__(self, redis: "FakeRedis") -> None:
+        self._redis = redis
+        self._calls: list = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._calls.append((getattr(self._redis, name), args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> list:
+        self._redis._fault()
+        return [await fn(*args, **kwargs) for fn, args, kwargs in self._calls]
+
+
+class FakeRedis:
+    """
+    Python twins of the Lua scripts in `app.cache` and `app.ratelimit` plus
+    streams and consumer groups.
+    Each script runs without yielding to the event loop, so it is atomic like
+    the real thing. TIME is a counter that ticks on every call; expiry and
+    consumer idle time are not modelled, stream trimming is exact.
+
+    Set `down = True` to make every command raise `ConnectionError`, the way
+    an unreachable server does; `calls` counts commands that reached it.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, object] = {}
+        self.streams: dict[str, list[tuple[str, dict]]] = {}
+        # (stream, group) -> {"last": seq delivered, "pending": {entry id: consumer}}
+        self.groups: dict[tuple[str, str], dict] = {}
+        self.script_calls: list[tuple[list[str], list]] = []
+        self.down = False
+        self.calls = 0
+        self._clock = 1_700_000_000_000_000
+        self._stream_seq = 0
+
+    def _fault(self) -> None:
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        self.calls += 1
+        if self.down:
+            raise RedisConnectionError("Connection refused (injected)")
+
+    async def ping(self):
+        self._fault()
+        return True
+
+    async def get(self, key):
+        self._fault()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._fault()
+        self.data[key] = value
+        return True
+
+    def pipeline(self, transaction: bool = True) -> _FakePipeline:
+        return _FakePipeline(self)
+
+    async def xadd(self, name, fields, maxlen=None, approximate=True):
+        self._stream_seq += 1
+        entry_id = f"{self._stream_seq}-0"
+        stream = self.streams.setdefault(name, [])
+        stream.append((entry_id, {k: str(v) for k, v in fields.items()}))
+        if maxlen is not None:
+            del stream[:-maxlen]
+        return entry_id
+
+    async def xrange(self, name, min="-", max="+", count=None):
+        exclusive = min.startswith("(")
+        low = -1 if min == "-" else int(min.lstrip("(").split("-")[0])
+        entries = [
+            e
+            for e in self.streams.get(name, [])
+            if (int(e[0].split("-")[0]) > low if exclusive else int(e[0].split("-")[0]) >= low)
+        ]
+        return entries[:count] if count else entries
+
+    async def xread(self, streams, count=None, block=None):
+        reply = []
+        for name, after in streams.items():
+            if after == "$":
+                after = f"{self._stream_seq}-0"
+            if entries := await self.xrange(name, min=f"({after}", count=count):
+                reply.append([name, entries])
+        return reply
+
+    async def xgroup_create(self, name, groupname, id="$", mkstream=False):
+        from redis.exceptions import ResponseError
+
+        if (name, groupname) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(name, [])
+        last = self._stream_seq if id == "$" else int(id.split("-")[0])
+        self.groups[(name, groupname)] = {"last": last, "pending": {}}
+        return True
+
+    async def xreadgroup(self, groupname, consumername, streams, count=None, block=None):
+        self._fault()
+        reply = []
+        for name, after in streams.items():
+            group = self.groups[(name, groupname)]
+            if after == ">":
+                entries = await self.xrange(name, min=f"({group['last']}-0", count=count)
+                for entry_id, _ in entries:
+                    group["pending"][entry_id] = consumername
+                if entries:
+                    group["last"] = int(entries[-1][0].split("-")[0])
+            else:
+                by_id = dict(self.streams.get(name, []))
+                entries = [
+                    (entry_id, by_id.get(entry_id))
+                    for entry_id, owner in group["pending"].items()
+                    if owner == consumername
+                ][:count]
+            if entries:
+                reply.append([name, entries])
+        return reply
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, count=None):
+        group = self.groups[(name, groupname)]
+        by_id = dict(self.streams.get(name, []))
+        claimed = [i for i, owner in group["pending"].items() if owner != consumername][:count]
+        for entry_id in claimed:
+            group["pending"][entry_id] = consumername
+        return ["0-0", [(i, by_id[i]) for i in claimed if i in by_id], []]
+
+    async def xack(self, name, groupname, *ids):
+        pending = self.groups[(name, groupname)]["pending"]
+        return sum(pending.pop(entry_id, None) is not None for entry_id in ids)
+
+    async def xdel(self, name, *ids):
+        before = len(self.streams.get(name, []))
+        self.streams[name] = [e for e in self.streams.get(name, []) if e[0] not in ids]
+        return before - len(self.streams[name])
+
+    def _now(self) -> str:
+        self._clock += 1
+        return str(self._clock)
+
+    def register_script(self, source: str):
+        from app import cache, ratelimit
+
+        impl = {
+            cache._READ_LUA: self._read,
+            cache._SET_LUA: self._set,
+            cache._INVALIDATE_LUA: self._invalidate,
+            ratelimit._GCRA_LUA: self._gcra,
+        }[source]
+
+        async def run(keys=(), args=(), client=None):
+            self._fault()
+            self.script_calls.append((list(keys), list(args)))
+            return impl(list(keys), list(args))
+
+        return run
+
+    def _read(self, keys, args):
+        now = self._now()
+        entry = self.data.get(keys[0])
+        if entry:
+            floor = self.data.get(args[0] + entry["uid"])
+            if floor is None or int(entry["at"]) > int(floor):
+                return [now, entry["payload"]]
+        return [now]
+
+    def _set(self, keys, args):
+        now = self._now()
+        floor = self.data.get(keys[1])
+        if floor is not None and int(args[1]) <= int(floor):
+            return 0
+        if int(now) - int(args[1]) > int(args[4]):
+            return 0
+        self.data[keys[0]] = {"uid": args[0], "at": args[1], "payload": args[2]}
+        return 1
+
+    def _invalidate(self, keys, args):
+        now = self._now()
+        for key in keys:
+            floor = self.data.get(key)
+            self.data[key] = max(int(floor or 0), int(now))
+        return now
+
+    def _gcra(self, keys, args):
+        now = int(self._now()) // 1000  # ms
+        period, interval = int(args[0]), int(args[0]) / int(args[1])
+        tat = max(int(self.data.get(keys[0], now)), now)
+        wait = tat - now + interval - period
+        if wait > 0:
+            return [0, math.ceil(wait)]
+        self.data[keys[0]] = math.floor(tat + interval + 0.5)
+        return [1, 0]
+
+
+class FakeTrackingConnection:
+    """
+    Scripted stand-in for a raw `redis.asyncio` connection, as used by
+    `app.tracking.track`. `replies` maps a command name to its reply (or an
+    exception to raise); `pushes` is what `read_response` yields once the
+    connection is subscribed, followed by `end` (raised).
+    """
+
+    def __init__(self, replies: dict, pushes: list | None = None, end=None) -> None:
+        self.replies = replies
+        self.pushes = list(pushes or [])
+        self.end = end or ConnectionError("listener closed")
+        self.sent: list[tuple] = []
+        self.connected = False
+        self._pending: list = []
+
+    async def connect(self) -> None:
+        self.connected = True
+
+    async def disconnect(self) -> None:
+        self.connected = False
+
+    async def send_command(self, *args) -> None:
+        self.sent.append(args)
+        name = " ".join(map(str, args[:2]))
+        self._pending.append(self.replies.get(name, self.replies.get(args[0])))
+
+    async def read_response(self, timeout=None):
+        if self._pending:
+            reply = self._pending.pop(0)
+        elif self.pushes:
+            reply = self.pushes.pop(0)
+        else:
+            raise self.end
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+# ---------------------------------------------------------------------------
+# FakeSMTPServer — hands out aiosmtplib.SMTP look-alikes for app/mail.py
+# ---------------------------------------------------------------------------
+
+
+class FakeSMTPServer:
+    """
+    `client()` is a drop-in for `app.mail.smtp_client`. Exceptions queued on
+    `connect_errors` / `send_errors` are raised by the next connect / send
+    (`None` in `send_errors` lets that send through).
+    """
+
+    def __init__(self) -> None:
+        self.delivered: list = []
+        self.connects = 0
+        self.quits = 0
+        self.connect_errors: list[Exception] = []
+        self.send_errors: list[Exception | None] = []
+
+    def client(self) -> "_FakeSMTPClient":
+        return _FakeSMTPClient(self)
+
+
+class _FakeSMTPClient:
+    def __init__(self, server: FakeSMTPServer) -> None:
+        self._server = server
+        self.is_connected = False
+
+    async def connect(self) -> None:
+        if self._server.connect_errors:
+            raise self._server.connect_errors.pop(0)
+        self._server.connects += 1
+        self.is_connected = True
+
+    async def send_message(self, msg) -> None:
+        assert self.is_connected
+        if self._server.send_errors and (error := self._server.send_errors.pop(0)):
+            raise error
+        self._server.delivered.append(msg)
+
+    async def quit(self) -> None:
+        self._server.quits += 1
+        self.is_connected = False
+
+    def close(self) -> None:
+        self.is_connected = False
@@ -0,0 +1,169 @@
+"""
+Tests for app/breaker.py and the Redis helpers' behaviour behind it, using
+FakeRedis with injected faults and a manual clock.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ResponseError
+
+from app.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from app.cache import get_verify_cache
+from app.deps import get_current_admin_user
+from app.ratelimit import hit
+from app.routers.health import router as health_router
+
+from .factories import FakeRedis, make_admin
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: Clock) -> CircuitBreaker:
+    return CircuitBreaker(
+        "test",
+        failure_threshold=3,
+        cooldown=10,
+        failures=(RedisConnectionError,),
+        clock=clock,
+    )
+
+
+async def _call(breaker: CircuitBreaker, exc: BaseException | None = None) -> None:
+    async with breaker:
+        if exc is not None:
+            raise exc
+
+
+class TestCircuitBreaker:
+    def test_trips_after_threshold_and_half_opens(self):
+        clock = Clock()
+        breaker = _breaker(clock)
+
+        async def scenario():
+            for _ in range(3):
+                with pytest.raises(RedisConnectionError):
+                    await _call(breaker, RedisConnectionError())
+            assert breaker.state == OPEN
+            with pytest.raises(CircuitOpen):
+                await _call(breaker)
+
+            clock.now = 10
+            assert breaker.state == HALF_OPEN
+            assert breaker.allow() is True  # the probe
+            assert breaker.allow() is False  # everyone else waits for it
+            breaker.record_success()
+            assert breaker.state == CLOSED
+
+        asyncio.run(scenario())
+        assert breaker.snapshot()["trips"] == 1
+        assert breaker.snapshot()["rejected"] == 2
+
+    def test_failed_probe_reopens(self):
+        clock = Clock()
+        breaker = _breaker(clock)
+
+        async def scenario():
+            for _ in range(3):
+                with pytest.raises(RedisConnectionError):
+                    await _call(breaker, RedisConnectionError())
+            clock.now = 10
+            with pytest.raises(RedisConnectionError):
+                await _call(breaker, RedisConnectionError())
+            assert breaker.state == OPEN
+            clock.now = 15
+            assert breaker.state == OPEN
+            clock.now = 20
+            assert breaker.state == HALF_OPEN
+
+        asyncio.run(scenario())
+
+    def test_other_errors_do_not_count(self):
+        breaker = _breaker(Clock())
+
+        async def scenario():
+            for _ in range(5):
+                with pytest.raises(ResponseError):
+                    await _call(breaker, ResponseError("WRONGTYPE"))
+
+        asyncio.run(scenario())
+        assert breaker.state == CLOSED
+
+    def test_success_resets_the_count(self):
+        breaker = _breaker(Clock())
+
+        async def scenario():
+            for _ in range(2):
+                with pytest.raises(RedisConnectionError):
+                    await _call(breaker, RedisConnectionError())
+            await _call(breaker)
+            for _ in range(2):
+                with pytest.raises(RedisConnectionError):
+                    await _call(breaker, RedisConnectionError())
+
+        asyncio.run(scenario())
+        assert breaker.state == CLOSED
+
+
+class TestRedisHelpersBehindBreaker:
+    def test_dead_redis_is_skipped_until_cooldown(self):
+        clock, redis = Clock(), FakeRedis()
+        redis.down = True
+        breaker = _breaker(clock)
+
+        async def scenario():
+            with (
+                patch("app.cache.get_redis", return_value=redis),
+                patch("app.cache.redis_breaker", breaker),
+                patch("app.ratelimit.get_redis", return_value=redis),
+                patch("app.ratelimit.redis_breaker", breaker),
+            ):
+                for _ in range(3):
+                    assert (await get_verify_cache("t")).payload is None
+                assert redis.calls == 3
+                for _ in range(10):
+                    assert (await get_verify_cache("t")).payload is None
+                    assert await hit("login:ip", "1.2.3.4") == 0
+                assert redis.calls == 3  # never touched while open
+
+                clock.now = 10
+                redis.down = False
+                assert await hit("login:ip", "1.2.3.4") == 0
+                assert redis.calls == 4  # one script call per check
+                assert breaker.state == CLOSED
+
+        asyncio.run(scenario())
+
+
+class TestDependenciesEndpoint:
+    def test_reports_breaker_state(self):
+        app = FastAPI()
+        app.include_router(health_router)
+        app.dependency_overrides[get_current_admin_user] = lambda: make_admin()
+        breaker = _breaker(Clock())
+        breaker.record_failure()
+        with patch("app.routers.health.redis_breaker", breaker):
+            resp = TestClient(app).get("/health/dependencies")
+        assert resp.status_code == 200
+        assert resp.json()["redis"]["state"] == CLOSED
+        assert resp.json()["redis"]["consecutive_failures"] == 1
+        assert resp.json()["replica"]["enabled"] is False
+
+    def test_admin_only(self):
+        app = FastAPI()
+        app.include_router(health_router)
+        client = TestClient(app)
+        assert client.get("/health/dependencies").status_code == 401
+        assert client.get("/health/live").status_code == 200
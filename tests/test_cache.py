@@ -0,0 +1,149 @@
+"""
+Tests for the verify cache in app/cache.py, run against FakeRedis.
+
+The interleaving tests model the verify path (stamp, read the user, cache)
+racing user writes (bump the version, invalidate) and check that no entry
+built from a stale read survives its invalidation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from unittest.mock import patch
+
+from app.cache import (
+    get_verify_cache,
+    invalidate_user_cache,
+    invalidate_users_cache,
+    set_verify_cache,
+)
+
+from .factories import USER_ID, FakeRedis
+
+UID = str(USER_ID)
+
+
+def _run(scenario):
+    redis = FakeRedis()
+
+    async def _wrapped():
+        with patch("app.cache.get_redis", return_value=redis):
+            return await scenario(redis)
+
+    return asyncio.run(_wrapped())
+
+
+class TestVerifyCache:
+    def test_miss_then_hit(self):
+        async def scenario(redis):
+            payload, stamp = await get_verify_cache("t")
+            assert payload is None
+            await set_verify_cache("t", UID, {"version": 1}, stamp)
+            assert (await get_verify_cache("t")).payload == {"version": 1}
+
+        _run(scenario)
+
+    def test_invalidate_drops_entry(self):
+        async def scenario(redis):
+            _, stamp = await get_verify_cache("t")
+            await set_verify_cache("t", UID, {"version": 1}, stamp)
+            await invalidate_user_cache(UID)
+            assert (await get_verify_cache("t")).payload is None
+
+        _run(scenario)
+
+    def test_set_after_racing_invalidation_is_refused(self):
+        async def scenario(redis):
+            _, stamp = await get_verify_cache("t")  # miss, then the DB read...
+            await invalidate_user_cache(UID)  # ...races a write
+            await set_verify_cache("t", UID, {"version": 1}, stamp)
+            payload, stamp = await get_verify_cache("t")
+            assert payload is None
+            await set_verify_cache("t", UID, {"version": 2}, stamp)
+            assert (await get_verify_cache("t")).payload == {"version": 2}
+
+        _run(scenario)
+
+    def test_no_stamp_skips_cache(self):
+        async def scenario(redis):
+            await set_verify_cache("t", UID, {"version": 1}, None)
+            assert redis.script_calls == []
+
+        _run(scenario)
+
+    def test_invalidation_cost_is_independent_of_token_count(self):
+        async def scenario(redis):
+            for i in range(500):
+                _, stamp = await get_verify_cache(f"t{i}")
+                await set_verify_cache(f"t{i}", UID, {"version": 1}, stamp)
+            redis.script_calls.clear()
+            await invalidate_users_cache([UID, "other"])
+            assert len(redis.script_calls) == 1
+            assert redis.script_calls[0][0] == [
+                f"auth:user_floor:{UID}",
+                "auth:user_floor:other",
+            ]
+            for i in range(500):
+                assert (await get_verify_cache(f"t{i}")).payload is None
+
+        _run(scenario)
+
+
+    def test_scripts_are_registered_once(self):
+        async def scenario(redis):
+            with patch.object(redis, "register_script", wraps=redis.register_script) as spy:
+                for _ in range(3):
+                    _, stamp = await get_verify_cache("t")
+                    await set_verify_cache("t", UID, {"version": 1}, stamp)
+                    await invalidate_user_cache(UID)
+            assert spy.call_count == 3  # read, set, invalidate
+
+        _run(scenario)
+
+
+class TestConcurrentInterleavings:
+    @staticmethod
+    async def _yield(rng: random.Random) -> None:
+        for _ in range(rng.randint(0, 3)):
+            await asyncio.sleep(0)
+
+    def _scenario(self, seed: int):
+        rng = random.Random(seed)
+        db = {uid: 1 for uid in ("u1", "u2")}
+
+        async def reader(token: str, uid: str):
+            cached, stamp = await get_verify_cache(token)
+            if cached:
+                return
+            await self._yield(rng)
+            version = db[uid]  # the DB read
+            await self._yield(rng)
+            await set_verify_cache(token, uid, {"version": version}, stamp)
+
+        async def writer(uid: str):
+            await self._yield(rng)
+            db[uid] += 1
+            await self._yield(rng)
+            await invalidate_user_cache(uid)
+
+        async def scenario(redis):
+            tasks = []
+            for i in range(40):
+                uid = rng.choice(list(db))
+                tasks.append(reader(f"{uid}:t{i % 5}", uid))
+                if rng.random() < 0.3:
+                    tasks.append(writer(uid))
+            rng.shuffle(tasks)
+            await asyncio.gather(*tasks)
+
+            for uid in db:
+                for i in range(5):
+                    payload = (await get_verify_cache(f"{uid}:t{i}")).payload
+                    assert payload is None or payload["version"] == db[uid]
+
+        _run(scenario)
+
+    def test_no_stale_entry_survives(self):
+        for seed in range(200):
+            self._scenario(seed)
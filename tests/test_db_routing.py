@@ -0,0 +1,74 @@
+"""
+Replica routing against two in-memory SQLite databases.
+
+The same user id is stored with a different username on each side, so the
+returned row tells which connection served the read.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from uuid import uuid4
+
+from tortoise import Tortoise, connections
+from tortoise.utils import get_schema_sql
+
+from app import db
+from app.crud import get_user_by_id
+
+CONFIG = {
+    "connections": {"default": "sqlite://:memory:", "replica": "sqlite://:memory:"},
+    "apps": {"models": {"models": ["app.models"], "default_connection": "default"}},
+}
+
+
+def _run(scenario) -> None:
+    async def _wrapped():
+        await Tortoise.init(config=CONFIG)
+        await Tortoise.generate_schemas()
+        primary, replica = connections.get("default"), connections.get("replica")
+        await replica.execute_script(get_schema_sql(primary, safe=True))
+
+        from app.models import User
+
+        user_id = uuid4()
+        await User.create(id=user_id, username="on-primary", scopes=[])
+        await User.create(id=user_id, username="on-replica", scopes=[], using_db=replica)
+
+        db.register_replica("sqlite://:memory:")
+        await db.probe_replica()
+        try:
+            await scenario(user_id)
+        finally:
+            db.reset_replica()
+            await Tortoise.close_connections()
+
+    asyncio.run(_wrapped())
+
+
+class TestReplicaRouting:
+    def test_reads_go_to_healthy_replica(self):
+        async def scenario(user_id):
+            assert db.replica_state()["healthy"] is True
+            user = await get_user_by_id(user_id)
+            assert user.username == "on-replica"
+
+        _run(scenario)
+
+    def test_own_write_sticks_to_primary(self):
+        async def scenario(user_id):
+            db.mark_written(user_id)
+            user = await get_user_by_id(user_id)
+            assert user.username == "on-primary"
+            assert (await get_user_by_id(uuid4())) is None
+
+        _run(scenario)
+
+    def test_failed_replica_falls_back_to_primary(self):
+        async def scenario(user_id):
+            await connections.get("replica").execute_script('DROP TABLE "user"')
+            user = await get_user_by_id(user_id)
+            assert user.username == "on-primary"
+            assert db.replica_state()["healthy"] is False
+
+        _run(scenario)
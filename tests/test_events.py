@@ -0,0 +1,160 @@
+"""
+Tests for the user change stream in app/events.py, run against FakeRedis.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.events import (
+    LATEST,
+    START,
+    ReplayGap,
+    UserChange,
+    follow_user_changes,
+    publish_user_change,
+    publish_user_changes,
+    read_user_changes,
+)
+from app.scopes import UserScope
+
+from .factories import OTHER_USER_ID, USER_ID, DummyUser, FakeRedis
+
+USERS_ROUTER_PATH = "app.routers.users"
+AUTH_ROUTER_PATH = "app.routers.auth"
+
+
+def _run(scenario, redis: FakeRedis | None = None):
+    redis = redis or FakeRedis()
+
+    async def _wrapped():
+        with (
+            patch("app.events.get_redis", return_value=redis),
+            patch("app.events.get_blocking_redis", return_value=redis),
+        ):
+            return await scenario(redis)
+
+    return asyncio.run(_wrapped())
+
+
+class TestUserChangeStream:
+    def test_publish_and_replay(self):
+        async def scenario(redis):
+            await publish_user_change(USER_ID, 3, ["scopes"])
+            await publish_user_changes(
+                [
+                    UserChange(OTHER_USER_ID, 7, ("full_name", "email")),
+                    UserChange(USER_ID, None, op="delete"),
+                ]
+            )
+            events = await read_user_changes(START)
+            assert [(e.user_id, e.version, e.fields, e.op) for e in events] == [
+                (str(USER_ID), 3, ("scopes",), "update"),
+                (str(OTHER_USER_ID), 7, ("full_name", "email"), "update"),
+                (str(USER_ID), None, (), "delete"),
+            ]
+            rest = await read_user_changes(events[0].offset)
+            assert [e.offset for e in rest] == [e.offset for e in events[1:]]
+
+        _run(scenario)
+
+    def test_trimmed_offset_is_a_gap(self):
+        async def scenario(redis):
+            with patch("app.events.USER_EVENTS_MAXLEN", 2):
+                for version in range(1, 5):
+                    await publish_user_change(USER_ID, version, ["scopes"])
+            with pytest.raises(ReplayGap):
+                await read_user_changes("1-0")
+            assert [e.version for e in await read_user_changes("3-0")] == [4]
+
+        _run(scenario)
+
+    def test_nothing_is_after_latest(self):
+        async def scenario(redis):
+            await publish_user_change(USER_ID, 1, ["scopes"])
+            assert await read_user_changes(LATEST) == []
+
+        _run(scenario)
+
+    def test_follow_replays_then_tails(self):
+        async def scenario(redis):
+            await publish_user_change(USER_ID, 1, ["scopes"])
+            await publish_user_change(USER_ID, 2, ["scopes"])
+            seen = []
+            stream = follow_user_changes(START, block_ms=0)
+            seen.append(await anext(stream))
+            seen.append(await anext(stream))
+            await publish_user_change(USER_ID, 3, ["is_active"])
+            seen.append(await anext(stream))
+            await stream.aclose()
+            assert [e.version for e in seen] == [1, 2, 3]
+
+        _run(scenario)
+
+    def test_publish_failure_is_swallowed(self):
+        async def scenario(redis):
+            with patch("app.events.get_redis", side_effect=ConnectionError("down")):
+                await publish_user_change(USER_ID, 1, ["scopes"])
+
+        _run(scenario)
+
+
+class TestRoutesPublish:
+    def test_put_user_scopes(self, admin_client: TestClient):
+        stored = DummyUser(user_id=OTHER_USER_ID, scopes=[UserScope.READ], version=4)
+        publish = AsyncMock()
+        with (
+            patch(f"{USERS_ROUTER_PATH}.update_user_scopes", new=AsyncMock(return_value=stored)),
+            patch(f"{USERS_ROUTER_PATH}.publish_user_change", new=publish),
+        ):
+            resp = admin_client.put(
+                f"/users/{OTHER_USER_ID}/scopes", json={"scopes": [UserScope.READ]}
+            )
+        assert resp.status_code == 200
+        publish.assert_awaited_once_with(OTHER_USER_ID, 4, ["scopes"])
+
+    def test_update_user(self, admin_client: TestClient):
+        stored = DummyUser(user_id=OTHER_USER_ID, full_name="New", version=2)
+        publish = AsyncMock()
+        with (
+            patch(f"{USERS_ROUTER_PATH}.update_user_fields", new=AsyncMock(return_value=stored)),
+            patch(f"{USERS_ROUTER_PATH}.publish_user_change", new=publish),
+        ):
+            resp = admin_client.patch(
+                f"/users/{OTHER_USER_ID}", json={"full_name": "New", "password": "s3cret!!"}
+            )
+        assert resp.status_code == 200
+        publish.assert_awaited_once_with(OTHER_USER_ID, 2, ["full_name", "password"])
+
+    def test_delete_user_invalidates_and_publishes(self, admin_client: TestClient):
+        user_id = uuid4()
+        invalidate, publish = AsyncMock(), AsyncMock()
+        with (
+            patch(f"{USERS_ROUTER_PATH}.user_crud.delete_by", new=AsyncMock()),
+            patch(f"{USERS_ROUTER_PATH}.invalidate_user_cache", new=invalidate),
+            patch(f"{USERS_ROUTER_PATH}.publish_user_change", new=publish),
+        ):
+            resp = admin_client.delete(f"/users/{user_id}")
+        assert resp.status_code == 204
+        invalidate.assert_awaited_once_with(str(user_id))
+        publish.assert_awaited_once_with(user_id, None, op="delete")
+
+    def test_verify_email(self, user_client: TestClient):
+        pending = DummyUser(user_id=uuid4(), is_active=False, email_verification_token="tok")
+        publish = AsyncMock()
+        with (
+            patch(
+                f"{AUTH_ROUTER_PATH}.get_user_by_verification_token",
+                new=AsyncMock(return_value=pending),
+            ),
+            patch(f"{AUTH_ROUTER_PATH}.invalidate_user_cache", new=AsyncMock()),
+            patch(f"{AUTH_ROUTER_PATH}.publish_user_change", new=publish),
+        ):
+            resp = user_client.get("/auth/verify-email?token=tok")
+        assert resp.status_code == 200
+        publish.assert_awaited_once_with(pending.id, 1, ["is_active"])
@@ -56,13 +56,18 @@ class TestGoogleLogin:
         mock_user = MagicMock()
         mock_user.username = existing.username
         mock_user.scopes = existing.scopes
+        mock_user.id = existing.id
+        mock_user.version = 2
         mock_user.google_id = None
         mock_user.save = AsyncMock()
+        invalidate, publish = AsyncMock(), AsyncMock()
 
         with (
             patch(f"{AUTH_ROUTER_PATH}.google_id_token.verify_oauth2_token", return_value=GOOGLE_CLAIMS),
             patch(f"{AUTH_ROUTER_PATH}.get_user_by_google_id", new=AsyncMock(return_value=None)),
             patch(f"{AUTH_ROUTER_PATH}.get_user_by_email", new=AsyncMock(return_value=mock_user)),
+            patch(f"{AUTH_ROUTER_PATH}.invalidate_user_cache", new=invalidate),
+            patch(f"{AUTH_ROUTER_PATH}.publish_user_change", new=publish),
         ):
             resp = user_client.post("/auth/google", json={"credential": "fake-id-token"})
 
@@ -70,6 +75,8 @@ class TestGoogleLogin:
         assert "access_token" in resp.json()
         mock_user.save.assert_awaited_once()
         assert mock_user.google_id == GOOGLE_CLAIMS["sub"]
+        invalidate.assert_awaited_once_with(str(existing.id))
+        publish.assert_awaited_once_with(existing.id, 2, ["google_id"])
 
     def test_new_user_created_on_first_google_login(self, user_client: TestClient):
         """No existing user — a new account is created with default scopes."""
@@ -0,0 +1,133 @@
+"""
+Tests for the background health monitor (app/health.py) and the readiness
+endpoint that serves its cached result.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.health import Dependency, HealthMonitor, check_redis, default_dependencies
+from app.routers.health import router as health_router
+
+from .factories import FakeRedis
+
+
+def _monitor(redis_probe=None, *, redis_critical: bool = False) -> HealthMonitor:
+    return HealthMonitor(
+        [
+            Dependency("postgres", AsyncMock(), critical=True),
+            Dependency("redis", redis_probe or AsyncMock(), critical=redis_critical),
+        ],
+        interval=5,
+        timeout=0.05,
+    )
+
+
+def _round(monitor: HealthMonitor) -> tuple[int, dict]:
+    asyncio.run(monitor.check_all())
+    status_code, body = monitor.readiness()
+    return status_code, json.loads(body)
+
+
+class TestHealthMonitor:
+    def test_all_healthy(self):
+        status_code, body = _round(_monitor())
+        assert status_code == 200
+        assert body["status"] == "ok"
+        assert body["dependencies"]["postgres"]["ok"] is True
+        assert body["dependencies"]["redis"]["latency_ms"] >= 0
+
+    def test_optional_dependency_failure_is_reported_but_ready(self):
+        probe = AsyncMock(side_effect=RedisConnectionError("Connection refused"))
+        status_code, body = _round(_monitor(probe))
+        assert status_code == 200
+        assert body["dependencies"]["redis"] == {
+            "ok": False,
+            "critical": False,
+            "latency_ms": body["dependencies"]["redis"]["latency_ms"],
+            "error": "Connection refused",
+        }
+
+    def test_critical_dependency_failure_fails_readiness(self):
+        probe = AsyncMock(side_effect=RedisConnectionError("Connection refused"))
+        status_code, body = _round(_monitor(probe, redis_critical=True))
+        assert status_code == 503
+        assert body["status"] == "error"
+
+    def test_slow_probe_times_out(self):
+        async def hang():
+            await asyncio.sleep(1)
+
+        monitor = _monitor(hang, redis_critical=True)
+        status_code, body = _round(monitor)
+        assert status_code == 503
+        assert body["dependencies"]["redis"]["error"] == "TimeoutError"
+        assert monitor.snapshot()["redis"]["consecutive_failures"] == 1
+
+    def test_recovers_on_next_round(self):
+        probe = AsyncMock(side_effect=[RedisConnectionError("down"), None])
+        monitor = _monitor(probe, redis_critical=True)
+        assert _round(monitor)[0] == 503
+        assert _round(monitor)[0] == 200
+        assert monitor.snapshot()["redis"]["consecutive_failures"] == 0
+        assert monitor.snapshot()["redis"]["latency_seconds"]["count"] == 2
+
+    def test_starting_until_first_round_and_stale_when_stuck(self):
+        monitor = _monitor()
+        assert monitor.readiness()[0] == 503
+        assert json.loads(monitor.readiness()[1]) == {"status": "starting"}
+
+        asyncio.run(monitor.check_all())
+        monitor.checked_at = time.monotonic() - 60
+        status_code, body = monitor.readiness()
+        assert status_code == 503
+        assert json.loads(body)["status"] == "stale"
+
+    def test_default_dependencies_follow_settings(self):
+        with (
+            patch("app.health.HEALTH_CRITICAL", frozenset({"postgres", "redis"})),
+            patch("app.health.HEALTH_NOTIFICATIONS_URL", "http://notifications/health/live"),
+        ):
+            deps = {dep.name: dep.critical for dep in default_dependencies()}
+        assert deps == {"postgres": True, "redis": True, "notifications": False}
+
+    def test_redis_probe_pings(self):
+        redis = FakeRedis()
+        with patch("app.health.get_redis", return_value=redis):
+            asyncio.run(check_redis())
+        assert redis.calls == 1
+
+
+class TestReadinessEndpoint:
+    def _client(self) -> TestClient:
+        app = FastAPI()
+        app.include_router(health_router)
+        return TestClient(app)
+
+    def test_not_ready_until_warm(self):
+        with patch("app.routers.health.is_warm", return_value=False):
+            resp = self._client().get("/health/ready")
+        assert resp.status_code == 503
+        assert resp.json() == {"status": "starting"}
+
+    def test_serves_cached_result_without_probing(self):
+        monitor = _monitor()
+        asyncio.run(monitor.check_all())
+        postgres = monitor.dependencies[0].probe
+        with (
+            patch("app.routers.health.is_warm", return_value=True),
+            patch("app.routers.health.health_monitor", monitor),
+        ):
+            client = self._client()
+            responses = [client.get("/health/ready") for _ in range(20)]
+        assert {resp.status_code for resp in responses} == {200}
+        assert responses[0].json()["status"] == "ok"
+        assert postgres.await_count == 1
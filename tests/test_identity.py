@@ -0,0 +1,187 @@
+"""
+Tests for app/identity.py and the auth paths built on it: lookups against
+in-memory SQLite (the Postgres branch shares `_identity` for row decoding),
+and `get_current_user`'s cache-first, per-request identity resolution.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from uuid import uuid4
+
+from unittest.mock import AsyncMock, patch
+
+from fastapi import Depends, FastAPI, Security
+from fastapi.testclient import TestClient
+from tortoise import Tortoise
+
+from app.auth import authenticate_user, create_access_token, get_password_hash
+from app.cache import VerifyLookup
+from app.deps import get_current_active_user, get_current_admin_user, require_scopes
+from app.identity import (
+    Identity,
+    _identity,
+    get_identity,
+    get_login_identity,
+    verify_payload,
+)
+from app.routers.users import router as users_router
+from app.scopes import UserScope
+
+from .factories import make_admin
+
+
+def _run(scenario) -> None:
+    async def _wrapped():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+        from app.models import User
+
+        await User.create(
+            id=uuid4(),
+            username="ann",
+            scopes=["users:me"],
+            hashed_password=get_password_hash("secret"),
+        )
+        await User.create(id=uuid4(), username="off", scopes=[], is_active=False)
+        try:
+            await scenario()
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(_wrapped())
+
+
+class TestUserVersion:
+    def test_concurrent_writers_get_distinct_versions(self):
+        async def scenario():
+            from app.models import User
+
+            first = await User.get(username="ann")
+            second = await User.get(username="ann")
+            first.full_name = "Ann A."
+            await first.save()
+            second.full_name = "Ann B."
+            await second.save(update_fields=["full_name"])
+            assert (first.version, second.version) == (2, 3)
+            assert (await get_identity("ann")).version == 3
+
+        _run(scenario)
+
+
+class TestIdentityLookups:
+    def test_identity_has_only_identity_fields(self):
+        async def scenario():
+            identity = await get_identity("ann")
+            assert isinstance(identity, Identity)
+            assert identity.username == "ann"
+            assert identity.scopes == ["users:me"]
+            assert identity.is_active is True
+            assert identity.version == 1
+            assert identity.hashed_password is None
+            assert await get_identity("ann", replica=True) == identity
+
+        _run(scenario)
+
+    def test_missing_user(self):
+        async def scenario():
+            assert await get_identity("nobody") is None
+            assert await get_login_identity("nobody") is None
+
+        _run(scenario)
+
+    def test_login_identity_carries_password_hash(self):
+        async def scenario():
+            identity = await get_login_identity("ann")
+            assert identity.hashed_password.startswith("$2")
+
+        _run(scenario)
+
+    def test_authenticate_user(self):
+        async def scenario():
+            assert (await authenticate_user("ann", "secret")).username == "ann"
+            assert await authenticate_user("ann", "wrong") is None
+            assert await authenticate_user("off", "secret") is None
+
+        _run(scenario)
+
+    def test_postgres_row_with_jsonb_text(self):
+        user_id = uuid4()
+        row = (user_id, "ann", '["users:me"]', True, 3)
+        assert _identity(row) == Identity(user_id, "ann", ["users:me"], True, 3)
+
+
+ADMIN = make_admin()
+ADMIN.version = 4
+ADMIN_IDENTITY = Identity(ADMIN.id, ADMIN.username, list(ADMIN.scopes), True, 4)
+TOKEN = create_access_token(data={"sub": ADMIN.username}, scopes=ADMIN.scopes)
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/probe")
+    async def probe(
+        admin=Security(get_current_admin_user),
+        reader=Depends(require_scopes(UserScope.READ)),
+        active=Security(get_current_active_user),
+    ):
+        assert admin is reader is active
+        first, second = await active.load(), await active.load()
+        assert first is second
+        return {"id": str(active.id), "version": active.version}
+
+    app.include_router(users_router)
+    return app
+
+
+def _mocks(cached: dict | None = None) -> dict:
+    lookup = VerifyLookup(cached, None if cached else "1700000000000000")
+    return {
+        "get_verify_cache": AsyncMock(return_value=lookup),
+        "set_verify_cache": AsyncMock(),
+        "get_identity": AsyncMock(return_value=ADMIN_IDENTITY),
+        "get_user_by_id": AsyncMock(return_value=ADMIN),
+    }
+
+
+class TestCurrentUser:
+    def test_cache_hit_skips_the_database(self):
+        mocks = _mocks(verify_payload(ADMIN_IDENTITY))
+        with patch.multiple("app.deps", **mocks):
+            resp = TestClient(_app()).get("/probe", headers=AUTH)
+        assert resp.status_code == 200
+        assert resp.json() == {"id": str(ADMIN.id), "version": 4}
+        mocks["get_verify_cache"].assert_awaited_once()  # one resolution, three dependencies
+        mocks["get_identity"].assert_not_called()
+        mocks["get_user_by_id"].assert_awaited_once()  # load() is memoised too
+
+    def test_miss_reads_identity_and_fills_the_cache(self):
+        mocks = _mocks()
+        with patch.multiple("app.deps", **mocks):
+            resp = TestClient(_app()).get("/probe", headers=AUTH)
+        assert resp.status_code == 200
+        mocks["get_identity"].assert_awaited_once_with(ADMIN.username)
+        mocks["set_verify_cache"].assert_awaited_once_with(
+            TOKEN, str(ADMIN.id), verify_payload(ADMIN_IDENTITY), "1700000000000000"
+        )
+
+    def test_me_revalidation_needs_no_row(self):
+        mocks = _mocks(verify_payload(ADMIN_IDENTITY))
+        with patch.multiple("app.deps", **mocks):
+            resp = TestClient(_app()).get(
+                "/users/@me/get", headers={**AUTH, "If-None-Match": f'"{ADMIN.id}-4"'}
+            )
+        assert resp.status_code == 304
+        mocks["get_user_by_id"].assert_not_called()
+
+    def test_me_rereads_a_lagging_replica_from_the_primary(self):
+        stale = make_admin()
+        mocks = _mocks(verify_payload(ADMIN_IDENTITY))
+        mocks["get_user_by_id"].side_effect = [stale, ADMIN]
+        with patch.multiple("app.deps", **mocks):
+            resp = TestClient(_app()).get("/users/@me/get", headers=AUTH)
+        assert resp.status_code == 200
+        assert resp.headers["etag"] == f'"{ADMIN.id}-4"'
+        mocks["get_user_by_id"].assert_awaited_with(ADMIN.id, replica=False)
@@ -0,0 +1,311 @@
+"""
+Tests for the keyset-batched user jobs in app/jobs.
+
+Jobs run against an in-memory SQLite database; Redis (checkpoints and cache
+invalidation) is replaced with AsyncMocks.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from tortoise import Tortoise
+
+from app.jobs import DefaultScopesJob, ScopeBatchJob
+from app.jobs.__main__ import _main, _parser
+from app.jobs.base import Chunk
+from app.jobs.scope_diff import ScopeDiffJob, apply_scope_change
+from app.schemas import DefaultScopesRequest, ScopeBatchRequest
+from app.scopes import (
+    DEFAULT_OWNER_SCOPES,
+    DEFAULT_USER_SCOPES,
+    BookingScope,
+    UserScope,
+    VenueScope,
+)
+
+USERS_ROUTER_PATH = "app.routers.users"
+
+
+def _run_with_db(scenario):
+    async def _wrapped():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+        redis = MagicMock(set=AsyncMock(), get=AsyncMock(return_value=None))
+        invalidate = AsyncMock()
+        try:
+            with (
+                patch("app.jobs.base.get_redis", return_value=redis),
+                patch("app.jobs.base.invalidate_users_cache", new=invalidate),
+                patch("app.jobs.base.publish_user_changes", new=AsyncMock()),
+            ):
+                return await scenario(invalidate)
+        finally:
+            await Tortoise.close_connections()
+
+    return asyncio.run(_wrapped())
+
+
+class TestApplyScopeChange:
+    def test_add_keeps_order_and_dedupes(self):
+        assert apply_scope_change(["a", "b"], ["b", "c"], []) == ["a", "b", "c"]
+
+    def test_remove_wins(self):
+        assert apply_scope_change(["a", "b", "c"], [], ["b"]) == ["a", "c"]
+
+
+class TestIncompleteJob:
+    def test_missing_hook_fails_at_instantiation(self):
+        class NoTarget(ScopeDiffJob):
+            async def select_chunk(self, after):
+                return Chunk([], 0, None)
+
+        with pytest.raises(TypeError, match="target"):
+            NoTarget(MagicMock())
+
+
+class TestScopeBatchJob:
+    def test_filter_in_chunks(self):
+        async def scenario(invalidate):
+            from app.models import User
+
+            owners = [
+                await User.create(
+                    id=uuid4(), username=f"owner{i}", scopes=[VenueScope.ME, BookingScope.READ]
+                )
+                for i in range(5)
+            ]
+            customer = await User.create(id=uuid4(), username="customer", scopes=[UserScope.ME])
+
+            job = ScopeBatchJob.from_request(
+                ScopeBatchRequest(
+                    add=[BookingScope.MANAGE],
+                    remove=[BookingScope.READ],
+                    has_scopes=[VenueScope.ME],
+                    chunk_size=2,
+                )
+            )
+            state = await job.run()
+
+            assert state.status == "completed"
+            assert state.updated == 5
+            assert state.scanned == 6
+            for owner in owners:
+                await owner.refresh_from_db()
+                assert owner.scopes == [VenueScope.ME, BookingScope.MANAGE]
+                assert owner.version == 2
+            await customer.refresh_from_db()
+            assert customer.scopes == [UserScope.ME]
+            invalidated = [uid for call in invalidate.await_args_list for uid in call.args[0]]
+            assert sorted(invalidated) == sorted(str(o.id) for o in owners)
+
+        _run_with_db(scenario)
+
+    def test_resume_from_checkpoint(self):
+        async def scenario(invalidate):
+            from app.models import User
+
+            users = [
+                await User.create(id=uuid4(), username=f"u{i}", scopes=[]) for i in range(4)
+            ]
+            ids = sorted(u.id for u in users)
+            job = ScopeBatchJob.from_request(
+                ScopeBatchRequest(add=[UserScope.ME], user_ids=ids, chunk_size=1)
+            )
+            job.state.last_id = ids[1]
+            job.state.status = "interrupted"
+            state = await job.run()
+
+            assert state.updated == 2
+            touched = {u.id for u in await User.all() if u.scopes}
+            assert touched == set(ids[2:])
+
+        _run_with_db(scenario)
+
+
+class TestDefaultScopesJob:
+    @staticmethod
+    async def _seed():
+        from app.models import User
+
+        return {
+            "user": await User.create(id=uuid4(), username="u", scopes=[UserScope.ME, "legacy:x"]),
+            "owner": await User.create(id=uuid4(), username="o", scopes=[VenueScope.ME]),
+            "admin": await User.create(id=uuid4(), username="a", scopes=[UserScope.ADMIN]),
+            "done": await User.create(
+                id=uuid4(), username="d", scopes=[str(s) for s in DEFAULT_USER_SCOPES]
+            ),
+        }
+
+    def test_dry_run_counts_without_writing(self):
+        async def scenario(invalidate):
+            users = await self._seed()
+            job = DefaultScopesJob.from_request(
+                DefaultScopesRequest(retire=["legacy:x"], dry_run=True, chunk_size=1)
+            )
+            state = await job.run()
+
+            assert state.status == "completed"
+            assert (state.scanned, state.updated) == (4, 2)
+            assert state.stats["users"] == 2
+            assert state.stats["owners"] == 1
+            assert state.stats["skipped_admins"] == 1
+            assert state.stats["removed:legacy:x"] == 1
+            assert state.stats[f"added:{VenueScope.WRITE}"] == 1
+            assert state.stats[f"added:{BookingScope.READ}"] == 2
+            for user in users.values():
+                version = user.version
+                await user.refresh_from_db()
+                assert user.version == version
+            invalidate.assert_not_awaited()
+
+        _run_with_db(scenario)
+
+    def test_concurrent_waves_apply_defaults(self):
+        async def scenario(invalidate):
+            users = await self._seed()
+            job = DefaultScopesJob.from_request(
+                DefaultScopesRequest(retire=["legacy:x"], chunk_size=1, concurrency=3)
+            )
+            state = await job.run()
+
+            assert state.status == "completed"
+            assert state.updated == 2
+            assert state.chunks == 4
+            await users["user"].refresh_from_db()
+            assert users["user"].scopes == list(dict.fromkeys(DEFAULT_USER_SCOPES))
+            await users["owner"].refresh_from_db()
+            assert users["owner"].scopes == [
+                VenueScope.ME,
+                *(s for s in dict.fromkeys(DEFAULT_OWNER_SCOPES) if s != VenueScope.ME),
+            ]
+            await users["admin"].refresh_from_db()
+            assert users["admin"].scopes == [UserScope.ADMIN]
+            assert users["admin"].version == 1
+
+            rerun = await DefaultScopesJob.from_request(DefaultScopesRequest()).run()
+            assert rerun.updated == 0
+
+        _run_with_db(scenario)
+
+    def test_failed_chunk_still_propagates_committed_siblings(self):
+        async def scenario(invalidate):
+            users = await self._seed()
+            failing = sorted(u.id for u in users.values())[0]
+            job = DefaultScopesJob.from_request(
+                DefaultScopesRequest(retire=["legacy:x"], chunk_size=1, concurrency=4)
+            )
+            apply_chunk = job.apply_chunk
+
+            async def flaky(ids, stats):
+                if failing in ids:
+                    raise RuntimeError("deadlock")
+                return await apply_chunk(ids, stats)
+
+            with patch.object(job, "apply_chunk", new=flaky):
+                state = await job.run()
+
+            assert state.status == "failed"
+            assert state.last_id is None  # the wave is retried on resume
+            committed = [
+                str(u.id) for u in users.values()
+                if u.id != failing and u.username in ("u", "o")
+            ]
+            invalidated = [uid for call in invalidate.await_args_list for uid in call.args[0]]
+            assert sorted(invalidated) == sorted(committed)
+
+        _run_with_db(scenario)
+
+    def test_heartbeat_during_a_slow_wave(self):
+        async def scenario(invalidate):
+            await self._seed()
+            job = DefaultScopesJob.from_request(DefaultScopesRequest(concurrency=4))
+            apply_chunk = job.apply_chunk
+
+            async def slow(ids, stats):
+                await asyncio.sleep(0.1)
+                return await apply_chunk(ids, stats)
+
+            save = AsyncMock()
+            with (
+                patch.object(job, "apply_chunk", new=slow),
+                patch("app.jobs.base.save_state", new=save),
+                patch("app.jobs.base.HEARTBEAT_SECONDS", 0.02),
+            ):
+                state = await job.run()
+
+            assert state.status == "completed"
+            assert save.await_count > 3  # start, wave and finish, plus heartbeats
+
+        _run_with_db(scenario)
+
+    def test_cannot_retire_a_default(self):
+        with pytest.raises(ValidationError):
+            DefaultScopesRequest(retire=[UserScope.ME])
+
+
+class TestCli:
+    def test_resume_refuses_a_completed_job(self, capsys):
+        state = ScopeBatchJob.from_request(ScopeBatchRequest(add=[UserScope.ME])).state
+        state.status = "completed"
+        run = AsyncMock()
+        tortoise = MagicMock(init=AsyncMock(), close_connections=AsyncMock())
+        with (
+            patch("app.jobs.__main__.Tortoise", new=tortoise),
+            patch("app.jobs.__main__.load_state", new=AsyncMock(return_value=state)),
+            patch.object(ScopeBatchJob, "run", new=run),
+        ):
+            code = asyncio.run(_main(_parser().parse_args(["resume", state.job_id])))
+        assert code == 2
+        assert f"Job {state.job_id} is completed" in capsys.readouterr().err
+        run.assert_not_awaited()
+
+
+class TestScopeBatchRoutes:
+    def test_start(self, admin_client: TestClient):
+        start = AsyncMock(side_effect=lambda job: job.state)
+        with patch(f"{USERS_ROUTER_PATH}.start_job", new=start):
+            resp = admin_client.post(
+                "/users/scopes/batch",
+                json={"add": [VenueScope.IMAGES], "has_scopes": [VenueScope.ME]},
+            )
+        assert resp.status_code == 202
+        assert resp.json()["status"] == "pending"
+        assert resp.json()["params"]["add"] == [VenueScope.IMAGES]
+        start.assert_awaited_once()
+
+    def test_unknown_scope(self, admin_client: TestClient):
+        resp = admin_client.post("/users/scopes/batch", json={"add": ["nope:nope"]})
+        assert resp.status_code == 422
+
+    def test_user_ids_exclude_filters(self, admin_client: TestClient):
+        resp = admin_client.post(
+            "/users/scopes/batch",
+            json={"add": [UserScope.ME], "user_ids": [str(uuid4())], "is_active": True},
+        )
+        assert resp.status_code == 422
+
+    def test_nothing_to_do(self, admin_client: TestClient):
+        resp = admin_client.post("/users/scopes/batch", json={"user_ids": [str(uuid4())]})
+        assert resp.status_code == 422
+
+    def test_start_default_scopes_dry_run(self, admin_client: TestClient):
+        start = AsyncMock(side_effect=lambda job: job.state)
+        with patch(f"{USERS_ROUTER_PATH}.start_job", new=start):
+            resp = admin_client.post(
+                "/users/scopes/defaults", json={"dry_run": True, "concurrency": 2}
+            )
+        assert resp.status_code == 202
+        body = resp.json()
+        assert body["kind"] == "default_scopes"
+        assert body["dry_run"] is True
+        assert body["concurrency"] == 2
+
+    def test_concurrency_is_bounded(self, admin_client: TestClient):
+        resp = admin_client.post("/users/scopes/defaults", json={"concurrency": 100})
+        assert resp.status_code == 422
@@ -0,0 +1,61 @@
+"""
+Tests for the startup warm-up in app/lifespan.py.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from tortoise import Tortoise
+
+from app import lifespan
+from app.routers.auth import google_request
+
+from .factories import FakeRedis
+
+CONFIG = {
+    "connections": {"default": "sqlite://:memory:"},
+    "apps": {"models": {"models": ["app.models"], "default_connection": "default"}},
+}
+
+
+def _warm_up(redis: FakeRedis, **settings) -> dict:
+    async def scenario():
+        await Tortoise.init(config=CONFIG)
+        try:
+            await lifespan.warm_up()
+        finally:
+            await Tortoise.close_connections()
+        return lifespan.warmup_state()
+
+    with (
+        patch("app.lifespan._warm", False),
+        patch.dict("app.lifespan._warmup", clear=True),
+        patch("app.lifespan.get_redis", return_value=redis),
+        patch("app.lifespan.GOOGLE_CLIENT_ID", settings.get("google_client_id", "")),
+    ):
+        return asyncio.run(scenario())
+
+
+class TestWarmUp:
+    def test_opens_db_and_redis_and_records_timings(self):
+        redis = FakeRedis()
+        state = _warm_up(redis)
+        assert state["done"] is True
+        assert set(state["seconds"]) == {"db", "redis"}
+        assert all(seconds >= 0 for seconds in state["seconds"].values())
+        assert redis.calls == 1
+
+    def test_failed_step_does_not_hold_readiness_back(self):
+        redis = FakeRedis()
+        redis.down = True
+        state = _warm_up(redis)
+        assert state["done"] is True
+        assert state["seconds"]["redis"] is None
+        assert state["seconds"]["db"] is not None
+
+    def test_builds_google_transport_when_configured(self):
+        state = _warm_up(FakeRedis(), google_client_id="client-id")
+        assert state["seconds"]["google"] is not None
+        assert google_request() is google_request()
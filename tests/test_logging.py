@@ -0,0 +1,190 @@
+"""
+Tests for the log setup in app/logging.py: JSON lines, the queued writer,
+access-log sampling and the per-call-site rate limit.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import queue
+import sys
+from unittest.mock import patch
+
+import pytest
+from loguru import logger
+
+from app.logging import (
+    AccessSampler,
+    CallSiteLimiter,
+    QueuedWriter,
+    json_line,
+    parse_sample,
+    setup_logging,
+)
+
+
+@pytest.fixture
+def restore_logging():
+    yield
+    logger.remove()
+    logger.add(sys.stderr)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access", "fastapi", "tortoise"):
+        log = logging.getLogger(name)
+        log.handlers, log.filters, log.propagate = [], [], True
+
+
+def _access(path: str, status: int) -> logging.LogRecord:
+    args = ("127.0.0.1:5000", "GET", path, "1.1", status)
+    return logging.LogRecord(
+        "uvicorn.access", logging.INFO, __file__, 1, '%s - "%s %s HTTP/%s" %d', args, None
+    )
+
+
+class TestAccessSampler:
+    def test_parse_sample(self):
+        assert parse_sample(" /auth/verify=0.01, /health/*=0 ,") == [
+            ("/auth/verify", False, 0.01),
+            ("/health/", True, 0.0),
+        ]
+
+    def test_rates_by_path(self):
+        sampler = AccessSampler(parse_sample("/auth/verify=0.5,/health/*=0"))
+        assert sampler.rate("/auth/verify") == 0.5
+        assert sampler.rate("/health/ready") == 0
+        assert sampler.rate("/auth/verify/extra") == 1.0
+        assert sampler.rate("/users/me") == 1.0
+
+    def test_drops_and_samples(self):
+        sampler = AccessSampler(parse_sample("/auth/verify=0.5,/health/*=0"))
+        assert not sampler.filter(_access("/health/live", 200))
+        assert sampler.filter(_access("/users/me?x=1", 200))
+        with patch("app.logging.random.random", return_value=0.4):
+            assert sampler.filter(_access("/auth/verify?rd=1", 401))
+        with patch("app.logging.random.random", return_value=0.6):
+            assert not sampler.filter(_access("/auth/verify", 200))
+
+    def test_server_errors_always_kept(self):
+        sampler = AccessSampler(parse_sample("/health/*=0"))
+        assert sampler.filter(_access("/health/ready", 503))
+
+    def test_other_records_pass(self):
+        record = logging.LogRecord("uvicorn.access", logging.INFO, __file__, 1, "hi", (), None)
+        assert AccessSampler(parse_sample("/=0")).filter(record)
+
+
+class TestCallSiteLimiter:
+    def _log(self, limiter, times: int, level: str = "INFO") -> list[dict]:
+        kept = []
+        logger.remove()
+        logger.add(lambda message: kept.append(message.record), filter=limiter)
+        try:
+            for _ in range(times):
+                logger.log(level, "again")
+        finally:
+            logger.remove()
+            logger.add(sys.stderr)
+        return kept
+
+    def test_limits_per_second_and_reports_suppressed(self):
+        now = [0.0]
+        limiter = CallSiteLimiter(3, clock=lambda: now[0])
+        assert len(self._log(limiter, 10)) == 3
+        now[0] = 1.5
+        kept = self._log(limiter, 1)
+        assert kept[0]["extra"]["suppressed"] == 7
+
+    def test_errors_never_limited(self):
+        limiter = CallSiteLimiter(1, clock=lambda: 0.0)
+        assert len(self._log(limiter, 5, "ERROR")) == 5
+
+
+class TestJsonLines:
+    def test_record_fields_extra_and_exception(self):
+        lines: list[str] = []
+        logger.remove()
+        logger.add(lambda message: lines.append(json_line(message)))
+        try:
+            logger.bind(user_id="u1").info("Hello {}", "ann")
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Failed")
+        finally:
+            logger.remove()
+            logger.add(sys.stderr)
+        hello, failed = (json.loads(line) for line in lines)
+        assert hello["message"] == "Hello ann"
+        assert hello["level"] == "INFO"
+        assert hello["logger"] == __name__
+        assert hello["function"] == "test_record_fields_extra_and_exception"
+        assert hello["user_id"] == "u1"
+        assert "exception" not in hello
+        assert failed["level"] == "ERROR"
+        assert "ValueError: boom" in failed["exception"]
+
+
+class TestQueuedWriter:
+    def test_writes_in_background_and_drains_on_stop(self):
+        stream = io.StringIO()
+        writer = QueuedWriter(stream, str, maxsize=100)
+        for n in range(20):
+            writer.write(f"line {n}\n")
+        writer.stop()
+        assert stream.getvalue().splitlines() == [f"line {n}" for n in range(20)]
+        assert not writer._thread.is_alive()
+        writer.stop()  # idempotent
+
+    def test_full_queue_drops_and_reports(self):
+        stream = io.StringIO()
+        writer = QueuedWriter(stream, str, maxsize=1)
+        with patch.object(writer._queue, "put_nowait", side_effect=queue.Full):
+            writer.write("lost\n")
+            writer.write("lost\n")
+        assert writer.dropped == 2
+        writer.write("kept\n")
+        writer.stop()
+        assert "kept" in stream.getvalue()
+        assert "2 line(s) dropped" in stream.getvalue()
+
+
+class TestSetupLogging:
+    def test_json_through_queue(self, restore_logging):
+        stream = io.StringIO()
+        setup_logging("INFO", fmt="json", queue_size=100, stream=stream)
+        logger.debug("hidden")
+        logger.info("shown")
+        logging.getLogger("uvicorn.error").warning("from uvicorn")
+        logger.remove()  # stops the writer, draining the queue
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [entry["message"] for entry in entries] == ["shown", "from uvicorn"]
+        assert entries[1]["level"] == "WARNING"
+        assert entries[1]["function"] == "test_json_through_queue"
+
+    def test_access_lines_sampled(self, restore_logging):
+        stream = io.StringIO()
+        setup_logging("INFO", fmt="json", queue_size=0, stream=stream)
+        access = logging.getLogger("uvicorn.access")
+        for path, status in (("/health/live", 200), ("/metrics", 200), ("/users/me", 200)):
+            access.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:1", "GET", path, "1.1", status)
+        access.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:1", "GET", "/health/ready", "1.1", 503)
+        messages = [json.loads(line)["message"] for line in stream.getvalue().splitlines()]
+        assert len(messages) == 2
+        assert "/users/me" in messages[0]
+        assert "/health/ready" in messages[1]
+        setup_logging("INFO", fmt="json", queue_size=0, stream=stream)
+        assert sum(isinstance(f, AccessSampler) for f in access.filters) == 1
+
+    def test_rate_limit_spares_access_lines(self, restore_logging):
+        stream = io.StringIO()
+        with patch("app.logging.LOG_RATE_LIMIT", 50):
+            setup_logging("INFO", fmt="json", queue_size=0, stream=stream)
+        access = logging.getLogger("uvicorn.access")
+        for _ in range(200):
+            access.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:1", "GET", "/users/me", "1.1", 500)
+        for _ in range(200):
+            logging.getLogger("tortoise").info("chatty")
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert sum(entry.get("access") is True for entry in entries) == 200
+        assert sum(entry["message"] == "chatty" for entry in entries) == 50
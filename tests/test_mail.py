@@ -0,0 +1,188 @@
+"""
+Tests for app/mail.py (outbox + mailer) against FakeRedis consumer groups and
+FakeSMTPServer, and for the contact endpoint that feeds it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from email.message import EmailMessage
+from unittest.mock import AsyncMock, patch
+
+import aiosmtplib
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.mail import GROUP, Mailer, enqueue_email
+from app.routers.contact import router as contact_router
+from app.settings import MAIL_OUTBOX_STREAM
+
+from .factories import FakeRedis, FakeSMTPServer
+
+DEAD_STREAM = f"{MAIL_OUTBOX_STREAM}:dead"
+
+
+def _message(subject: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = "site@example.com"
+    msg["To"] = "team@example.com"
+    msg.set_content("hello")
+    return msg
+
+
+def _queue(redis: FakeRedis, *subjects: str) -> None:
+    async def scenario():
+        with patch("app.mail.get_redis", return_value=redis):
+            for subject in subjects:
+                assert await enqueue_email(_message(subject)) is True
+
+    asyncio.run(scenario())
+
+
+def _mailer(server: FakeSMTPServer, **overrides) -> Mailer:
+    return Mailer(connect=server.client, **{"consumer": "pod-a", **overrides})
+
+
+def _subjects(server: FakeSMTPServer) -> list[str]:
+    return [msg["Subject"] for msg in server.delivered]
+
+
+class TestMailer:
+    def test_batch_is_sent_on_one_connection_and_removed(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a", "b", "c")
+        mailer = _mailer(server)
+
+        assert asyncio.run(mailer.step(redis)) == 3
+        _queue(redis, "d")
+        assert asyncio.run(mailer.step(redis)) == 1
+
+        assert _subjects(server) == ["a", "b", "c", "d"]
+        assert server.connects == 1  # kept open between rounds
+        assert redis.streams[MAIL_OUTBOX_STREAM] == []
+        assert redis.groups[(MAIL_OUTBOX_STREAM, GROUP)]["pending"] == {}
+
+    def test_idle_connection_is_closed(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a")
+        mailer = _mailer(server, idle_close=0)
+
+        asyncio.run(mailer.step(redis))
+        assert asyncio.run(mailer.step(redis)) == 0
+
+        assert server.quits == 1
+        assert mailer.snapshot()["connected"] is False
+
+    def test_transient_failure_keeps_entry_pending_and_reconnects(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a", "b")
+        server.send_errors = [None, aiosmtplib.SMTPServerDisconnected("gone")]
+        mailer = _mailer(server)
+
+        with pytest.raises(aiosmtplib.SMTPServerDisconnected):
+            asyncio.run(mailer.step(redis))
+        assert _subjects(server) == ["a"]
+        assert len(redis.streams[MAIL_OUTBOX_STREAM]) == 1  # "a" acked and deleted
+
+        assert asyncio.run(mailer.step(redis)) == 1
+        assert _subjects(server) == ["a", "b"]
+        assert server.connects == 2
+        assert mailer.snapshot()["retried"] == 1
+
+    def test_login_failure_is_not_blamed_on_the_message(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a")
+        server.connect_errors = [aiosmtplib.SMTPAuthenticationError(535, "bad credentials")]
+        mailer = _mailer(server, max_attempts=1)
+
+        with pytest.raises(aiosmtplib.SMTPAuthenticationError):
+            asyncio.run(mailer.step(redis))
+        assert asyncio.run(mailer.step(redis)) == 1
+        assert DEAD_STREAM not in redis.streams
+
+    def test_permanent_refusal_goes_to_dead_letters(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a", "b")
+        server.send_errors = [aiosmtplib.SMTPResponseException(550, "no such user")]
+        mailer = _mailer(server)
+
+        assert asyncio.run(mailer.step(redis)) == 1
+
+        assert _subjects(server) == ["b"]
+        assert server.connects == 1  # a refusal doesn't drop the connection
+        [(_, dead)] = redis.streams[DEAD_STREAM]
+        assert "Subject: a" in dead["msg"]
+        assert "550" in dead["error"]
+        assert redis.streams[MAIL_OUTBOX_STREAM] == []
+
+    def test_gives_up_after_max_attempts(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a")
+        server.send_errors = [aiosmtplib.SMTPResponseException(451, "try later")] * 2
+        mailer = _mailer(server, max_attempts=2)
+
+        with pytest.raises(aiosmtplib.SMTPResponseException):
+            asyncio.run(mailer.step(redis))
+        assert asyncio.run(mailer.step(redis)) == 0
+
+        assert len(redis.streams[DEAD_STREAM]) == 1
+        assert mailer.snapshot()["dead"] == 1
+
+    def test_reclaims_messages_abandoned_by_another_pod(self):
+        redis, server = FakeRedis(), FakeSMTPServer()
+        _queue(redis, "a")
+        crashed = _mailer(FakeSMTPServer(), consumer="pod-dead")
+        asyncio.run(crashed._ensure_group(redis))
+        asyncio.run(redis.xreadgroup(GROUP, "pod-dead", {MAIL_OUTBOX_STREAM: ">"}))
+
+        assert asyncio.run(_mailer(server).step(redis)) == 1
+        assert _subjects(server) == ["a"]
+
+
+class TestContactEndpoint:
+    BODY = {
+        "name": "Ann",
+        "email": "ann@example.com",
+        "subject": "Hi",
+        "message": "Hello there",
+        "turnstile_token": "t",
+    }
+
+    @pytest.fixture()
+    def client(self):
+        app = FastAPI()
+        app.include_router(contact_router)
+        with (
+            patch("app.routers.contact.SMTP_USER", "site@example.com"),
+            patch("app.routers.contact.SMTP_PASSWORD", "secret"),
+        ):
+            yield TestClient(app)
+
+    def test_returns_once_queued(self, client):
+        redis = FakeRedis()
+        send_now = AsyncMock()
+        with (
+            patch("app.mail.get_redis", return_value=redis),
+            patch("app.ratelimit.get_redis", return_value=redis),
+            patch("app.routers.contact.send_now", new=send_now),
+        ):
+            resp = client.post("/auth/contact", json=self.BODY)
+        assert resp.status_code == 204
+        assert len(redis.streams[MAIL_OUTBOX_STREAM]) == 1
+        send_now.assert_not_called()
+
+    def test_sends_inline_when_outbox_unavailable(self, client):
+        redis = FakeRedis()
+        redis.xadd = AsyncMock(side_effect=RedisConnectionError("Connection refused"))
+        send_now = AsyncMock()
+        with (
+            patch("app.mail.get_redis", return_value=redis),
+            patch("app.ratelimit.get_redis", return_value=redis),
+            patch("app.routers.contact.send_now", new=send_now),
+        ):
+            resp = client.post("/auth/contact", json=self.BODY)
+        assert resp.status_code == 204
+        send_now.assert_awaited_once()
@@ -0,0 +1,171 @@
+"""
+Tests for app/metrics.py (metric types, exposition, middleware, helpers) and
+the /metrics endpoint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.auth import get_password_hash, verify_password
+from app.cache import get_verify_cache, set_verify_cache
+from app.metrics import (
+    DB_QUERY_ERRORS,
+    DB_QUERY_SECONDS,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_SECONDS,
+    OUTBOUND_SECONDS,
+    PASSWORD_HASH_SECONDS,
+    VERIFY_CACHE_LOOKUPS,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsMiddleware,
+    db_helper,
+    outbound,
+)
+from app.routers.metrics import CONTENT_TYPE
+from app.routers.metrics import router as metrics_router
+
+from .factories import USER_ID, FakeRedis
+
+
+def _count(histogram: Histogram, *labels) -> int:
+    series = histogram._series.get(labels)
+    return series.count if series is not None else 0
+
+
+def _value(metric, *labels) -> float:
+    return metric._series.get(labels, 0)
+
+
+class TestExposition:
+    def test_counter_and_gauge(self):
+        counter = Counter("hits_total", "Hits.", ("result",), registry=None)
+        counter.inc("hit")
+        counter.inc("hit", amount=2)
+        gauge = Gauge("depth", "Depth.", registry=None)
+        gauge.inc()
+        gauge.dec(amount=3)
+        assert list(counter.render()) == [
+            "# HELP hits_total Hits.",
+            "# TYPE hits_total counter",
+            'hits_total{result="hit"} 3',
+        ]
+        assert list(gauge.render())[-1] == "depth -2"
+
+    def test_histogram_is_cumulative_with_sum_and_count(self):
+        histogram = Histogram("t_seconds", "T.", ("op",), buckets=(0.1, 1.0), registry=None)
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value, "x")
+        assert list(histogram.render())[2:] == [
+            't_seconds_bucket{op="x",le="0.1"} 2',
+            't_seconds_bucket{op="x",le="1.0"} 3',
+            't_seconds_bucket{op="x",le="+Inf"} 4',
+            't_seconds_sum{op="x"} 5.65',
+            't_seconds_count{op="x"} 4',
+        ]
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("c_total", "C.", ("v",), registry=None)
+        counter.inc('a"b\\c\nd')
+        assert list(counter.render())[-1] == r'c_total{v="a\"b\\c\nd"} 1'
+
+
+class TestMiddleware:
+    @pytest.fixture()
+    def client(self):
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            return {"id": item_id}
+
+        app.add_middleware(MetricsMiddleware)
+        return TestClient(app)
+
+    def test_latency_is_labelled_with_route_template(self, client):
+        ok = ("GET", "/items/{item_id}", 200)
+        missing = ("GET", "/items/{item_id}", 404)
+        unmatched = ("GET", "unmatched", 404)
+        before = [_count(HTTP_REQUEST_SECONDS, *key) for key in (ok, missing, unmatched)]
+
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/items/0")
+        client.get("/nowhere")
+
+        after = [_count(HTTP_REQUEST_SECONDS, *key) for key in (ok, missing, unmatched)]
+        assert [b - a for a, b in zip(before, after)] == [2, 1, 1]
+        assert _value(HTTP_IN_FLIGHT, "GET") == 0
+
+
+class TestHotPathMetrics:
+    def test_verify_cache_results(self):
+        redis = FakeRedis()
+
+        async def scenario():
+            with patch("app.cache.get_redis", return_value=redis):
+                _, stamp = await get_verify_cache("t")
+                await set_verify_cache("t", str(USER_ID), {"version": 1}, stamp)
+                await get_verify_cache("t")
+                redis.down = True
+                await get_verify_cache("t")
+
+        before = {r: _value(VERIFY_CACHE_LOOKUPS, r) for r in ("miss", "hit", "error")}
+        asyncio.run(scenario())
+        assert {r: _value(VERIFY_CACHE_LOOKUPS, r) - before[r] for r in before} == {
+            "miss": 1,
+            "hit": 1,
+            "error": 1,
+        }
+
+    def test_password_hash_and_check_are_timed(self):
+        before = _count(PASSWORD_HASH_SECONDS, "hash"), _count(PASSWORD_HASH_SECONDS, "check")
+        hashed = get_password_hash("secret")
+        assert verify_password("secret", hashed)
+        after = _count(PASSWORD_HASH_SECONDS, "hash"), _count(PASSWORD_HASH_SECONDS, "check")
+        assert (after[0] - before[0], after[1] - before[1]) == (1, 1)
+
+    def test_db_helper_counts_calls_and_errors(self):
+        @db_helper
+        async def lookup_thing(fail: bool):
+            if fail:
+                raise RuntimeError("boom")
+            return "row"
+
+        assert asyncio.run(lookup_thing(False)) == "row"
+        with pytest.raises(RuntimeError):
+            asyncio.run(lookup_thing(True))
+        assert _count(DB_QUERY_SECONDS, "lookup_thing") == 2
+        assert _value(DB_QUERY_ERRORS, "lookup_thing") == 1
+
+    def test_outbound_records_outcome(self):
+        before = _count(OUTBOUND_SECONDS, "probe", "ok"), _count(OUTBOUND_SECONDS, "probe", "error")
+        with outbound("probe"):
+            pass
+        with pytest.raises(ValueError), outbound("probe"):
+            raise ValueError
+        after = _count(OUTBOUND_SECONDS, "probe", "ok"), _count(OUTBOUND_SECONDS, "probe", "error")
+        assert (after[0] - before[0], after[1] - before[1]) == (1, 1)
+
+
+class TestEndpoint:
+    def test_scrape(self):
+        app = FastAPI()
+        app.include_router(metrics_router)
+        resp = TestClient(app).get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == CONTENT_TYPE
+        body = resp.text
+        assert "# TYPE http_request_duration_seconds histogram" in body
+        assert "# TYPE verify_cache_lookups_total counter" in body
+        assert 'redis_breaker_state{state="closed"} 1' in body
+        assert 'mailer_messages_total{result="sent"} 0' in body
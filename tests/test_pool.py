@@ -0,0 +1,132 @@
+"""
+Tests for app/pool.py: connection config and the metered pool wrapper,
+driven by a stand-in for `asyncpg.Pool`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from tortoise.exceptions import DBConnectionError
+
+from app.pool import MeteredAsyncpgClient, MeteredPool, db_connection
+
+
+class FakeAsyncpgPool:
+    """`size` connections, handed out until none are idle; then acquire waits."""
+
+    def __init__(self, size: int = 1) -> None:
+        self._idle = [object() for _ in range(size)]
+        self._size = size
+        self._released = asyncio.Event()
+
+    async def acquire(self, timeout=None):
+        async def take():
+            while not self._idle:
+                self._released.clear()
+                await self._released.wait()
+            return self._idle.pop()
+
+        return await asyncio.wait_for(take(), timeout)
+
+    async def release(self, conn) -> None:
+        self._idle.append(conn)
+        self._released.set()
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_idle_size(self) -> int:
+        return len(self._idle)
+
+    def get_min_size(self) -> int:
+        return 1
+
+    def get_max_size(self) -> int:
+        return self._size
+
+
+class TestDbConnection:
+    def test_sqlite_is_passed_through(self):
+        assert db_connection("sqlite://:memory:") == "sqlite://:memory:"
+
+    def test_postgres_gets_metered_engine_and_settings(self):
+        with (
+            patch("app.pool.DB_POOL_MAX_SIZE", 12),
+            patch("app.pool.DB_STATEMENT_TIMEOUT", 2.5),
+        ):
+            config = db_connection("postgres://u:p@db:5432/users")
+        assert config["engine"] == "app.pool"
+        credentials = config["credentials"]
+        assert credentials["host"] == "db"
+        assert credentials["maxsize"] == 12
+        assert credentials["server_settings"] == {"statement_timeout": "2500"}
+        assert "acquire_timeout" in credentials
+        assert "statement_cache_size" in credentials
+
+    def test_url_parameters_win(self):
+        config = db_connection("postgres://u:p@db:5432/users?maxsize=40")
+        assert config["credentials"]["maxsize"] == "40"
+
+    def test_statement_timeout_can_be_disabled(self):
+        with patch("app.pool.DB_STATEMENT_TIMEOUT", 0):
+            config = db_connection("postgres://u:p@db:5432/users")
+        assert "server_settings" not in config["credentials"]
+
+    def test_client_keeps_acquire_timeout_out_of_pool_kwargs(self):
+        client = MeteredAsyncpgClient(
+            acquire_timeout="3", connection_name="default", host="db", statement_cache_size=0
+        )
+        assert client.acquire_timeout == 3.0
+        assert "acquire_timeout" not in client.extra
+        assert client.extra["statement_cache_size"] == 0
+
+
+class TestMeteredPool:
+    def test_acquire_is_timed_and_counted(self):
+        pool = MeteredPool(FakeAsyncpgPool(size=2), acquire_timeout=1)
+
+        async def scenario():
+            await pool.acquire()
+            return pool.snapshot()
+
+        snapshot = asyncio.run(scenario())
+        assert snapshot["in_use"] == 1
+        assert snapshot["idle"] == 1
+        assert snapshot["waiting"] == 0
+        wait = snapshot["acquire_wait_seconds"]
+        assert wait["count"] == 1
+        assert wait["buckets"]["+Inf"] == 1
+        assert list(wait["buckets"].values()) == sorted(wait["buckets"].values())
+
+    def test_waiters_are_visible_while_pool_is_exhausted(self):
+        pool = MeteredPool(FakeAsyncpgPool(size=1), acquire_timeout=1)
+
+        async def scenario():
+            conn = await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            during = pool.snapshot()
+            await pool.release(conn)
+            await waiter
+            return during, pool.snapshot()
+
+        during, after = asyncio.run(scenario())
+        assert during["waiting"] == 1
+        assert during["in_use"] == 1
+        assert after["waiting"] == 0
+        assert after["acquire_wait_seconds"]["count"] == 2
+
+    def test_acquire_timeout_raises_db_connection_error(self):
+        pool = MeteredPool(FakeAsyncpgPool(size=1), acquire_timeout=0.01)
+
+        async def scenario():
+            await pool.acquire()
+            await pool.acquire()
+
+        with pytest.raises(DBConnectionError):
+            asyncio.run(scenario())
+        assert pool.timeouts == 1
+        assert pool.waiting == 0
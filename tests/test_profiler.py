@@ -0,0 +1,146 @@
+"""
+Tests for the sampling profiler, the event-loop lag monitor (app/profiler.py)
+and the admin endpoints in app/routers/debug.py.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app.deps import get_current_admin_user
+from app.profiler import LoopMonitor, Profile, ProfilerBusy, SamplingProfiler
+from app.routers.debug import router as debug_router
+
+from .factories import make_admin
+
+STACK = (("main", "main.py", 1), ("handler", "app/routers/users.py", 10))
+
+
+def _busy_until(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def _app(admin=True) -> FastAPI:
+    app = FastAPI()
+    app.include_router(debug_router)
+    if admin:
+        app.dependency_overrides[get_current_admin_user] = lambda: make_admin()
+    return app
+
+
+class TestProfile:
+    def test_collapsed(self):
+        profile = Profile(Counter({("MainThread", STACK): 3, ("mailer", STACK[:1]): 1}), 0.01, 0.04)
+        assert profile.collapsed() == (
+            "MainThread;main (main.py:1);handler (app/routers/users.py:10) 3\n"
+            "mailer;main (main.py:1) 1\n"
+        )
+
+    def test_speedscope(self):
+        profile = Profile(Counter({("MainThread", STACK): 3, ("mailer", STACK[:1]): 1}), 0.01, 0.04)
+        doc = profile.speedscope("pod-1")
+        assert doc["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+        assert doc["shared"]["frames"] == [
+            {"name": "main", "file": "main.py", "line": 1},
+            {"name": "handler", "file": "app/routers/users.py", "line": 10},
+        ]
+        main, mailer = doc["profiles"]
+        assert (main["name"], main["samples"], main["weights"]) == ("MainThread", [[0, 1]], [0.03])
+        assert (mailer["samples"], mailer["endValue"]) == ([[0]], 0.04)
+
+
+class TestSamplingProfiler:
+    def test_samples_other_threads(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_until, args=(stop,), name="busy")
+        worker.start()
+        try:
+            profile = asyncio.run(SamplingProfiler().run(0.2, 0.005))
+        finally:
+            stop.set()
+            worker.join()
+        busy = [stack for (thread, stack), _ in profile.samples.items() if thread == "busy"]
+        assert busy and all(any(f[0] == "_busy_until" for f in stack) for stack in busy)
+        assert not any(thread == "profiler" for thread, _ in profile.samples)
+        assert "_busy_until (tests/test_profiler.py:" in profile.collapsed()
+
+    def test_one_profile_at_a_time(self):
+        profiler = SamplingProfiler()
+
+        async def scenario():
+            first = asyncio.create_task(profiler.run(0.1, 0.01))
+            await asyncio.sleep(0)
+            with pytest.raises(ProfilerBusy):
+                await profiler.run(0.1, 0.01)
+            await first
+            await profiler.run(0.01, 0.005)  # free again
+
+        asyncio.run(scenario())
+
+
+class TestLoopMonitor:
+    def test_stall_logged_with_blocking_stack(self):
+        messages: list[str] = []
+        sink = logger.add(lambda message: messages.append(message.record["message"]))
+        monitor = LoopMonitor(threshold_ms=50, interval=0.01)
+
+        def block_the_loop():
+            time.sleep(0.2)
+
+        async def scenario():
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.05)
+            block_the_loop()
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            logger.remove(sink)
+        assert monitor.stalls == 1
+        assert monitor.max_lag >= 0.15
+        blocked = [m for m in messages if m.startswith("Event loop blocked")]
+        assert len(blocked) == 1 and "block_the_loop" in blocked[0]
+        assert any(m.startswith("Event loop was blocked") for m in messages)
+        assert monitor.snapshot()["lag_seconds"]["count"] == monitor.lag.count > 1
+
+
+class TestDebugRouter:
+    def test_profile_download(self):
+        resp = TestClient(_app()).get("/debug/profile?seconds=0.05&interval_ms=5")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        assert resp.headers["content-disposition"].endswith('.folded"')
+        assert resp.text.endswith("\n")
+
+    def test_speedscope_download(self):
+        resp = TestClient(_app()).get("/debug/profile?seconds=0.05&format=speedscope")
+        assert resp.status_code == 200
+        assert resp.headers["content-disposition"].endswith('.speedscope.json"')
+        assert resp.json()["profiles"]
+
+    def test_limits(self):
+        client = TestClient(_app())
+        assert client.get("/debug/profile?seconds=3600").status_code == 422
+        assert client.get("/debug/profile?seconds=1&format=pprof").status_code == 422
+
+    def test_admin_only(self):
+        client = TestClient(_app(admin=False))
+        assert client.get("/debug/profile?seconds=0.05").status_code == 401
+        assert client.get("/debug/loop").status_code == 401
+
+    def test_loop_snapshot(self):
+        body = TestClient(_app()).get("/debug/loop").json()
+        assert set(body) == {"threshold_ms", "stalls", "max_lag_ms", "lag_seconds"}
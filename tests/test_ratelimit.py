@@ -0,0 +1,206 @@
+"""
+Tests for app/ratelimit.py: the GCRA bucket (via the FakeRedis twin), the
+in-process pre-filter, the Redis-down fallback and the 429 responses.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+from starlette.requests import Request
+
+from app.ratelimit import RULES, RateRule, client_ip, hit, parse_rule
+
+from .factories import FakeRedis, make_user
+
+MINUTE_US = 60_000_000
+
+
+def _limited(redis: FakeRedis, **rules: RateRule):
+    return (
+        patch("app.ratelimit.get_redis", return_value=redis),
+        patch.dict(RULES, {name.replace("_", ":"): rule for name, rule in rules.items()}),
+    )
+
+
+class TestBucket:
+    def test_parse_rule(self):
+        assert parse_rule("10/60") == RateRule(10, 60.0)
+
+    def test_allows_limit_then_refuses_until_refilled(self):
+        redis, local_clock = FakeRedis(), Mock()
+        local_clock.monotonic.return_value = 1000.0
+        redis_patch, rules_patch = _limited(redis, login_ip=RateRule(3, 60))
+
+        async def scenario():
+            with redis_patch, rules_patch, patch("app.ratelimit.time", local_clock):
+                assert [await hit("login:ip", "ip") for _ in range(3)] == [0, 0, 0]
+                retry_after = await hit("login:ip", "ip")
+                assert 0 < retry_after <= 20  # one token per 20s
+                redis._clock += MINUTE_US // 3
+                local_clock.monotonic.return_value += 20
+                assert await hit("login:ip", "ip") == 0
+                assert await hit("login:ip", "other") == 0  # keys are independent
+
+        asyncio.run(scenario())
+
+    def test_key_is_written_with_its_expiry_in_one_call(self):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, login_ip=RateRule(3, 60))
+
+        async def scenario():
+            with redis_patch, rules_patch:
+                await hit("login:ip", "ip")
+
+        asyncio.run(scenario())
+        assert redis.calls == 1
+        assert redis.script_calls == [(["rl:login:ip:ip"], [60_000, 3])]
+
+    def test_script_is_registered_once(self):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, login_ip=RateRule(10, 60))
+
+        async def scenario():
+            with redis_patch, rules_patch:
+                for _ in range(3):
+                    await hit("login:ip", "ip")
+
+        with patch.object(redis, "register_script", wraps=redis.register_script) as spy:
+            asyncio.run(scenario())
+        assert spy.call_count == 1
+
+    def test_local_prefilter_skips_redis_once_exhausted(self):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, login_ip=RateRule(2, 60))
+
+        async def scenario():
+            with redis_patch, rules_patch:
+                for _ in range(5):
+                    await hit("login:ip", "ip")
+
+        asyncio.run(scenario())
+        assert redis.calls == 2
+
+    def test_local_bucket_only_counts_what_redis_admitted(self):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, login_ip=RateRule(2, 60))
+        # Other pods already spent the shared bucket.
+        redis.data["rl:login:ip:ip"] = redis._clock // 1000 + 60_000
+
+        async def scenario():
+            with redis_patch, rules_patch:
+                assert await hit("login:ip", "ip") > 0
+                assert await hit("login:ip", "ip") > 0
+                del redis.data["rl:login:ip:ip"]
+                assert await hit("login:ip", "ip") == 0
+
+        asyncio.run(scenario())
+        assert redis.calls == 3
+
+    def test_redis_down_falls_back_to_local_limit(self):
+        redis = FakeRedis()
+        redis.down = True
+        redis_patch, rules_patch = _limited(redis, login_ip=RateRule(2, 60))
+
+        async def scenario():
+            with redis_patch, rules_patch:
+                return [await hit("login:ip", "ip") for _ in range(3)]
+
+        first, second, third = asyncio.run(scenario())
+        assert first == second == 0
+        assert third > 0
+
+
+def _request(forwarded: str | None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": ("10.0.0.9", 5000)})
+
+
+class TestClientIp:
+    def test_entry_appended_by_trusted_proxy(self):
+        assert client_ip(_request("6.6.6.6, 1.1.1.1")) == "1.1.1.1"
+        assert client_ip(_request("6.6.6.6, 1.1.1.1, 10.0.0.2"), trusted_hops=2) == "1.1.1.1"
+
+    def test_falls_back_to_peer(self):
+        assert client_ip(_request(None)) == "10.0.0.9"
+        assert client_ip(_request("1.1.1.1"), trusted_hops=0) == "10.0.0.9"
+        assert client_ip(_request("1.1.1.1"), trusted_hops=2) == "10.0.0.9"
+
+
+class TestRoutes:
+    def test_login_limited_per_username_with_retry_after(self, user_client):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, login_user=RateRule(2, 60))
+        with (
+            redis_patch,
+            rules_patch,
+            patch("app.routers.auth.authenticate_user", new=AsyncMock(return_value=None)),
+        ):
+            codes = [
+                user_client.post(
+                    "/auth/token", data={"username": name, "password": "x"}
+                ).status_code
+                for name in ("alice", "Alice", "alice", "bob")
+            ]
+            response = user_client.post(
+                "/auth/token", data={"username": "alice", "password": "x"}
+            )
+        assert codes == [401, 401, 429, 401]
+        assert response.status_code == 429
+        assert 0 < int(response.headers["Retry-After"]) <= 30
+
+    def test_username_bucket_is_per_client_ip(self, user_client):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, login_user=RateRule(1, 60))
+        with (
+            redis_patch,
+            rules_patch,
+            patch("app.routers.auth.authenticate_user", new=AsyncMock(return_value=None)),
+        ):
+            codes = [
+                user_client.post(
+                    "/auth/token",
+                    data={"username": "alice", "password": "x"},
+                    headers={"X-Forwarded-For": ip},
+                ).status_code
+                for ip in ("6.6.6.6", "6.6.6.6", "1.1.1.1")
+            ]
+        assert codes == [401, 429, 401]  # the attacker's misses don't lock out alice
+
+    def test_register_limited_per_ip(self, user_client):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, register_ip=RateRule(1, 3600))
+        body = {"username": "x", "email": "x@example.com", "password": "secret123"}
+        existing = make_user()  # taken username: 400 once past the limiter
+        with (
+            redis_patch,
+            rules_patch,
+            patch("app.routers.users.get_user_by_username", new=AsyncMock(return_value=existing)),
+        ):
+            first, second, other = (
+                user_client.post("/users/", json=body, headers={"X-Forwarded-For": ip})
+                for ip in ("1.1.1.1", "1.1.1.1", "2.2.2.2")
+            )
+        assert first.status_code == 400
+        assert second.status_code == 429
+        assert "Retry-After" in second.headers
+        assert other.status_code == 400
+
+    def test_spoofed_forwarded_for_does_not_bypass(self, user_client):
+        redis = FakeRedis()
+        redis_patch, rules_patch = _limited(redis, register_ip=RateRule(1, 3600))
+        body = {"username": "x", "email": "x@example.com", "password": "secret123"}
+        existing = make_user()
+        with (
+            redis_patch,
+            rules_patch,
+            patch("app.routers.users.get_user_by_username", new=AsyncMock(return_value=existing)),
+        ):
+            codes = [
+                user_client.post(
+                    "/users/", json=body, headers={"X-Forwarded-For": f"{spoof}, 1.1.1.1"}
+                ).status_code
+                for spoof in ("7.7.7.1", "7.7.7.2")
+            ]
+        assert codes == [400, 429]
@@ -0,0 +1,103 @@
+"""
+Unit tests for the compiled scope registry in app/scopes.py.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from app.auth import scope_claims, token_scopes
+from app.routers.auth import _identity_headers
+from app.scopes import (
+    DEFAULT_ADMIN_SCOPES,
+    DEFAULT_OWNER_SCOPES,
+    SCOPES,
+    BookingScope,
+    UnknownScopeError,
+    UserScope,
+    VenueScope,
+    decode_scopes,
+    encode_scopes,
+    granted_mask,
+    has_scopes,
+    missing_scopes,
+    required_mask,
+    scope_table,
+    unknown_scopes,
+)
+
+
+class TestScopeRegistry:
+    def test_every_enum_member_has_a_bit(self):
+        assert VenueScope.ADMIN_DELETE in SCOPES.bits
+        assert len(set(SCOPES.bits.values())) == len(SCOPES.names)
+
+    def test_nested_scopes_are_implied(self):
+        granted = granted_mask([VenueScope.ADMIN])
+        assert has_scopes(granted, required_mask([VenueScope.ADMIN_READ]))
+        assert has_scopes(granted, required_mask([VenueScope.ADMIN_DELETE]))
+        assert not has_scopes(granted, required_mask([VenueScope.READ]))
+
+    def test_implication_is_not_reversed(self):
+        granted = granted_mask([BookingScope.ADMIN_READ])
+        assert not has_scopes(granted, required_mask([BookingScope.ADMIN]))
+
+    def test_explicit_implication(self):
+        assert has_scopes(granted_mask([UserScope.ADMIN]), required_mask([UserScope.READ]))
+
+    def test_all_required(self):
+        granted = granted_mask([UserScope.ME])
+        required = required_mask([UserScope.ME, UserScope.READ])
+        assert not has_scopes(granted, required)
+        assert missing_scopes(granted, required) == [UserScope.READ]
+
+    def test_unknown_granted_scope_is_ignored(self):
+        assert granted_mask(["legacy:scope", UserScope.ME]) == granted_mask([UserScope.ME])
+
+    def test_unknown_required_scope_rejected(self):
+        with pytest.raises(UnknownScopeError):
+            required_mask(["nope:nope"])
+        assert unknown_scopes(["nope:nope", *DEFAULT_ADMIN_SCOPES]) == ["nope:nope"]
+
+
+class TestCompactEncoding:
+    def test_round_trip(self):
+        scopes = list(dict.fromkeys(DEFAULT_OWNER_SCOPES))
+        encoded = encode_scopes(scopes)
+        assert encoded.startswith("1.")
+        assert sorted(decode_scopes(encoded)) == sorted(scopes)
+
+    def test_unknown_scope_is_not_encodable(self):
+        assert encode_scopes([UserScope.ME, "legacy:scope"]) is None
+
+    @pytest.mark.parametrize("value", ["", "1", "x.ff", "99.1", f"1.{1 << 200:x}"])
+    def test_rejects_bad_values(self, value):
+        with pytest.raises(ValueError):
+            decode_scopes(value)
+
+    def test_table_matches_bits(self):
+        table = scope_table()
+        bit = SCOPES.bits[VenueScope.WRITE]
+        assert table["scopes"][bit.bit_length() - 1] == VenueScope.WRITE
+
+    @pytest.mark.parametrize("encoding", ["names", "both", "compact"])
+    def test_token_claims_decode_back(self, encoding):
+        scopes = [UserScope.ME, VenueScope.READ]
+        claims = scope_claims(scopes, encoding)
+        assert ("scp" in claims) is (encoding != "names")
+        assert ("scopes" in claims) is (encoding != "compact")
+        assert sorted(token_scopes(claims)) == sorted(scopes)
+
+    def test_compact_headers_drop_names(self):
+        payload = {
+            "user_id": "u1",
+            "username": "alice",
+            "scopes": "users:me venues:read",
+            "scope_bits": encode_scopes([UserScope.ME, VenueScope.READ]),
+        }
+        compact = _identity_headers(payload, "compact")
+        assert "X-User-Scopes" not in compact
+        assert compact["X-User-Scope-Bits"] == payload["scope_bits"]
+        both = _identity_headers(payload, "both")
+        assert both["X-User-Scopes"] == payload["scopes"]
+        assert "X-User-Scope-Bits" not in _identity_headers(payload, "names")
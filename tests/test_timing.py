@@ -0,0 +1,87 @@
+"""
+Tests for the Server-Timing middleware and request-local timers in
+app/timing.py.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app.auth import create_access_token, get_password_hash
+from app.timing import ServerTimingMiddleware, record, timer
+
+
+def _client(**options) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        for _ in range(2):
+            with timer("redis"):
+                await asyncio.sleep(0)
+        record("db", 0.002)
+        return {}
+
+    @app.get("/login")
+    async def login():
+        get_password_hash("secret")
+        return {"token": create_access_token({"sub": "ann"})}
+
+    app.add_middleware(ServerTimingMiddleware, **{"header": True, "slow_ms": 0, **options})
+    return TestClient(app)
+
+
+def _metrics(header: str) -> dict[str, str]:
+    return {part.split(";")[0]: part for part in header.split(", ")}
+
+
+class TestServerTiming:
+    def test_header_breaks_request_down(self):
+        resp = _client().get("/work")
+        metrics = _metrics(resp.headers["server-timing"])
+        assert list(metrics) == ["redis", "db", "total"]
+        assert metrics["redis"].endswith('desc="2 calls"')
+        assert metrics["db"] == 'db;dur=2.00;desc="1 call"'
+
+    def test_jwt_and_bcrypt_are_timed(self):
+        resp = _client().get("/login")
+        assert {"bcrypt", "jwt", "total"} == set(_metrics(resp.headers["server-timing"]))
+
+    def test_header_is_off_unless_enabled(self):
+        resp = _client(header=False).get("/work")
+        assert "server-timing" not in resp.headers
+
+    def test_token_restricts_header(self):
+        client = _client(token="s3cret")
+        assert "server-timing" not in client.get("/work").headers
+        resp = client.get("/work", headers={"X-Server-Timing-Token": "s3cret"})
+        assert "redis" in resp.headers["server-timing"]
+
+    def test_record_outside_a_request_is_ignored(self):
+        record("db", 1.0)
+        with timer("redis"):
+            pass
+
+
+class TestSlowRequestLog:
+    @pytest.fixture()
+    def logs(self):
+        messages: list[str] = []
+        sink = logger.add(messages.append, level="WARNING", format="{message}")
+        yield messages
+        logger.remove(sink)
+
+    def test_slow_request_is_logged_with_breakdown(self, logs):
+        _client(header=False, slow_ms=0.000001).get("/work")
+        [line] = logs
+        assert line.startswith("Slow request: GET /work took")
+        assert 'db;dur=2.00;desc="1 call"' in line
+
+    def test_fast_request_is_not_logged(self, logs):
+        _client(slow_ms=60_000).get("/work")
+        assert logs == []
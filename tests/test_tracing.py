@@ -0,0 +1,244 @@
+"""
+Tests for app/tracing.py: traceparent handling, sampling, the spans opened
+by the request middleware and the instrumented helpers, and OTLP export.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.auth import verify_password
+from app.cache import get_verify_cache
+from app.metrics import db_helper, outbound
+from app.routers.users import _send_verification_email
+from app.tracing import (
+    CLIENT,
+    SERVER,
+    InMemoryExporter,
+    OtlpExporter,
+    Span,
+    TracingMiddleware,
+    otlp_body,
+    parse_traceparent,
+    set_exporter,
+    span,
+    trace_headers,
+)
+
+from .factories import FakeRedis
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+HASHED = "$2b$04$e3PZTUd0K4LZPLKm4okej.mYmWVCP/EhM5WeihmHe5AHNrtlDbme6"  # "secret"
+
+
+@pytest.fixture
+def spans():
+    memory = InMemoryExporter()
+    previous = set_exporter(memory)
+    yield memory.spans
+    set_exporter(previous)
+
+
+@db_helper
+async def load_item(item_id: int) -> dict:
+    await asyncio.sleep(0)
+    return {"id": item_id}
+
+
+def _client(rate: float = 1.0) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(503, "down")
+        with outbound("notifications"):
+            headers = trace_headers()
+        return {**(await load_item(item_id)), "headers": headers}
+
+    app.add_middleware(TracingMiddleware, rate=rate)
+    return TestClient(app)
+
+
+class TestTraceparent:
+    def test_parse(self):
+        assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+        assert parse_traceparent(f"00-{TRACE_ID.upper()}-{PARENT_ID}-00") == (
+            TRACE_ID,
+            PARENT_ID,
+            False,
+        )
+        # later versions may append fields
+        assert parse_traceparent(f"01-{TRACE_ID}-{PARENT_ID}-01-x") == (TRACE_ID, PARENT_ID, True)
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "",
+            "garbage",
+            f"ff-{TRACE_ID}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+            f"00-{'0' * 32}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+            f"00-{TRACE_ID[:-1]}z-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{PARENT_ID}-1",
+        ],
+    )
+    def test_rejects_invalid(self, value):
+        assert parse_traceparent(value) is None
+
+    def test_outside_a_trace(self, spans):
+        with span("orphan") as orphan:
+            pass
+        assert orphan is span("other")  # the shared no-op
+        assert trace_headers() == {}
+        assert spans == []
+
+
+class TestMiddleware:
+    def test_server_span_with_children(self, spans):
+        resp = _client().get("/items/7")
+        assert resp.status_code == 200
+        by_name = {s.name: s for s in spans}
+        assert set(by_name) == {"GET /items/{item_id}", "notifications", "db.load_item"}
+        server = by_name["GET /items/{item_id}"]
+        assert server.kind == SERVER and server.parent_id is None
+        assert server.attributes["http.route"] == "/items/{item_id}"
+        assert server.attributes["http.response.status_code"] == 200
+        assert server.error is None
+        for child in ("notifications", "db.load_item"):
+            assert by_name[child].trace_id == server.trace_id
+            assert by_name[child].parent_id == server.span_id
+        assert by_name["notifications"].kind == CLIENT
+        assert by_name["db.load_item"].attributes == {"db.system": "postgresql"}
+        sent = resp.json()["headers"]["traceparent"]
+        assert sent == f"00-{server.trace_id}-{by_name['notifications'].span_id}-01"
+
+    def test_continues_incoming_trace(self, spans):
+        _client(rate=0.0001).get(
+            "/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+        server = next(s for s in spans if s.kind == SERVER)
+        assert (server.trace_id, server.parent_id) == (TRACE_ID, PARENT_ID)
+        assert all(s.trace_id == TRACE_ID for s in spans)
+
+    def test_unsampled_parent_is_propagated_not_recorded(self, spans):
+        resp = _client().get("/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+        assert spans == []
+        sent = parse_traceparent(resp.json()["headers"]["traceparent"])
+        assert sent is not None and sent[0] == TRACE_ID and sent[2] is False
+
+    def test_rate_zero_starts_no_trace(self, spans):
+        resp = _client(rate=0).get("/items/1")
+        assert resp.json()["headers"] == {}
+        assert spans == []
+
+    def test_rate_zero_still_follows_a_sampled_parent(self, spans):
+        _client(rate=0).get("/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+        server = next(s for s in spans if s.kind == SERVER)
+        assert (server.trace_id, server.parent_id) == (TRACE_ID, PARENT_ID)
+
+    def test_sampling_rate(self, spans):
+        client = _client(rate=0.5)
+        with patch("app.tracing.random.random", side_effect=[0.4, 0.6]):
+            client.get("/items/1")
+            client.get("/items/2")
+        assert sum(s.kind == SERVER for s in spans) == 1
+
+    def test_server_error_marks_span(self, spans):
+        _client().get("/items/0")
+        (server,) = spans
+        assert server.attributes["http.response.status_code"] == 503
+        assert server.error == "HTTP 503"
+
+
+class TestInstrumentedHelpers:
+    def _traced(self, body):
+        async def scenario():
+            with Span("root", TRACE_ID) as root:
+                await body()
+            return root
+
+        return asyncio.run(scenario())
+
+    def test_cache_and_bcrypt_spans(self, spans):
+        redis = FakeRedis()
+
+        async def body():
+            with patch("app.cache.get_redis", return_value=redis):
+                await get_verify_cache("t")
+            assert verify_password("secret", HASHED)
+
+        root = self._traced(body)
+        children = {s.name: s for s in spans if s is not root}
+        assert set(children) == {"cache.get_verify", "bcrypt.check"}
+        assert children["cache.get_verify"].attributes == {"db.system": "redis"}
+        assert all(s.parent_id == root.span_id for s in children.values())
+
+    def test_failed_call_sets_error(self, spans):
+        async def body():
+            with pytest.raises(ValueError), outbound("turnstile"):
+                raise ValueError("boom")
+
+        self._traced(body)
+        assert spans[0].name == "turnstile" and spans[0].error == "boom"
+
+    def test_notifications_receive_traceparent(self, spans):
+        client = MagicMock()
+        client.post = AsyncMock(return_value=MagicMock(raise_for_status=MagicMock()))
+        client.__aenter__ = AsyncMock(return_value=client)
+        client.__aexit__ = AsyncMock(return_value=False)
+
+        async def body():
+            with patch("app.routers.users.httpx.AsyncClient", return_value=client):
+                await _send_verification_email("ann@example.com", "tok")
+
+        self._traced(body)
+        call = next(s for s in spans if s.name == "notifications")
+        headers = client.post.call_args.kwargs["headers"]
+        assert headers["traceparent"] == f"00-{TRACE_ID}-{call.span_id}-01"
+
+
+class TestOtlpExport:
+    def test_body(self):
+        with patch("app.tracing.exporter", InMemoryExporter()):
+            with Span("GET /x", TRACE_ID, PARENT_ID, kind=SERVER) as server:
+                server.attributes.update({"http.response.status_code": 200, "ok": True})
+                server.error = "HTTP 500"
+        body = otlp_body([server], service="users-test")
+        resource = body["resourceSpans"][0]
+        assert resource["resource"]["attributes"] == [
+            {"key": "service.name", "value": {"stringValue": "users-test"}}
+        ]
+        (encoded,) = resource["scopeSpans"][0]["spans"]
+        assert encoded["traceId"] == TRACE_ID
+        assert encoded["parentSpanId"] == PARENT_ID
+        assert encoded["kind"] == 2
+        assert int(encoded["endTimeUnixNano"]) >= int(encoded["startTimeUnixNano"]) > 0
+        assert encoded["attributes"] == [
+            {"key": "http.response.status_code", "value": {"intValue": "200"}},
+            {"key": "ok", "value": {"boolValue": True}},
+        ]
+        assert encoded["status"] == {"code": 2, "message": "HTTP 500"}
+
+    def test_batches_and_bounds_queue(self):
+        otlp = OtlpExporter("http://collector:4318/", interval=1, max_queue=2)
+        for name in ("a", "b", "c"):
+            otlp.export(Span(name, TRACE_ID))
+        assert otlp.dropped == 1
+        client = MagicMock()
+        client.post = AsyncMock(return_value=MagicMock(raise_for_status=MagicMock()))
+        asyncio.run(otlp.flush(client))
+        asyncio.run(otlp.flush(client))  # nothing left: no second request
+        client.post.assert_awaited_once()
+        url, body = client.post.call_args.args[0], client.post.call_args.kwargs["json"]
+        assert url == "http://collector:4318/v1/traces"
+        spans = body["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [s["name"] for s in spans] == ["a", "b"]
@@ -0,0 +1,163 @@
+"""
+Tests for the CLIENT TRACKING backed local verify cache (app/tracking.py).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from redis.exceptions import ResponseError
+
+from app import tracking
+from app.cache import get_verify_cache, set_verify_cache
+from app.tracking import INVALIDATE_CHANNEL, TrackedCache, handle_push, track
+
+from .factories import USER_ID, FakeRedis, FakeTrackingConnection
+
+FLOOR = "auth:user_floor:"
+UID = str(USER_ID)
+
+
+def _cache(max_entries: int = 100) -> TrackedCache:
+    cache = TrackedCache(max_entries, ttl=60)
+    cache.enabled = True
+    return cache
+
+
+def _put(cache: TrackedCache, key: str, uid: str = UID) -> None:
+    cache.put(key, uid, {"user_id": uid}, cache.begin())
+
+
+class TestTrackedCache:
+    def test_disabled_is_a_passthrough(self):
+        cache = TrackedCache(100, ttl=60)
+        _put(cache, "k")
+        assert cache.get("k") is None
+
+    def test_floor_push_drops_all_of_a_users_tokens(self):
+        cache = _cache()
+        _put(cache, "a")
+        _put(cache, "b")
+        _put(cache, "c", uid="other")
+        cache.invalidate([f"{FLOOR}{UID}"], FLOOR)
+        assert cache.get("a") is None and cache.get("b") is None
+        assert cache.get("c") == {"user_id": "other"}
+
+    def test_key_push_and_flush(self):
+        cache = _cache()
+        _put(cache, "a")
+        _put(cache, "b")
+        cache.invalidate(["a"], FLOOR)
+        assert cache.get("a") is None and cache.get("b") is not None
+        cache.invalidate(None, FLOOR)
+        assert cache.get("b") is None
+
+    def test_read_racing_a_push_is_not_stored(self):
+        cache = _cache()
+        generation = cache.begin()  # Redis read in flight...
+        cache.invalidate([f"{FLOOR}{UID}"], FLOOR)  # ...invalidation lands first
+        cache.put("a", UID, {"user_id": UID}, generation)
+        assert cache.get("a") is None
+
+    def test_bounded(self):
+        cache = _cache(max_entries=2)
+        for key in ("a", "b", "c"):
+            _put(cache, key)
+        assert cache.get("a") is None
+        assert cache.snapshot()["entries"] == 2
+
+    def test_handle_push_ignores_other_messages(self):
+        cache = _cache()
+        _put(cache, "a")
+        handle_push(cache, ["subscribe", INVALIDATE_CHANNEL, 1], FLOOR)
+        handle_push(cache, ["pong", ""], FLOOR)
+        assert cache.get("a") is not None
+        handle_push(cache, ["message", INVALIDATE_CHANNEL, ["a"]], FLOOR)
+        assert cache.get("a") is None
+
+
+class TestVerifyCacheWithTracking:
+    def test_hits_are_served_locally_until_pushed(self):
+        redis, local = FakeRedis(), _cache()
+
+        async def scenario():
+            with (
+                patch("app.cache.get_redis", return_value=redis),
+                patch("app.cache.verify_local", local),
+            ):
+                _, stamp = await get_verify_cache("t")
+                await set_verify_cache("t", UID, {"user_id": UID}, stamp)
+                assert (await get_verify_cache("t")).payload == {"user_id": UID}
+                calls = redis.calls
+                for _ in range(5):
+                    assert (await get_verify_cache("t")).payload == {"user_id": UID}
+                assert redis.calls == calls
+
+                handle_push(local, ["message", INVALIDATE_CHANNEL, [f"{FLOOR}{UID}"]], FLOOR)
+                await get_verify_cache("t")
+                assert redis.calls == calls + 1
+
+        asyncio.run(scenario())
+
+
+class TestTrackLoop:
+    @staticmethod
+    def _pool(*conns):
+        pool = MagicMock()
+        pool.make_connection.side_effect = list(conns)
+        return pool
+
+    def test_enables_tracking_and_applies_pushes(self):
+        cache = _cache()
+        cache.enabled = False
+        listener = FakeTrackingConnection(
+            {"CLIENT ID": 42, "SUBSCRIBE": ["subscribe", INVALIDATE_CHANNEL, 1]},
+            pushes=[["message", INVALIDATE_CHANNEL, ["auth:verify:v2:x"]]],
+        )
+        anchor = FakeTrackingConnection({"CLIENT TRACKING": "OK"})
+        seen = {}
+
+        def spy(c, message, prefix):
+            seen["enabled"] = c.enabled
+            handle_push(c, message, prefix)
+
+        async def scenario():
+            pool = self._pool(listener, anchor)
+            with (
+                patch.object(tracking.ConnectionPool, "from_url", return_value=pool),
+                patch.object(tracking, "handle_push", side_effect=spy),
+                patch.object(tracking, "_RETRY_AFTER", 0),
+            ):
+                prefixes = ["auth:verify:v2:", FLOOR]
+                task = asyncio.create_task(track(cache, "redis://x", prefixes, FLOOR))
+                while not anchor.sent or "enabled" not in seen:
+                    await asyncio.sleep(0)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        assert anchor.sent[0] == (
+            "CLIENT", "TRACKING", "ON", "REDIRECT", 42, "BCAST",
+            "PREFIX", "auth:verify:v2:", "PREFIX", FLOOR,
+        )
+        assert seen["enabled"] is True
+        assert cache.enabled is False  # listener lost: bypass until reconnected
+
+    def test_server_without_tracking_falls_back(self):
+        cache = _cache()
+        listener = FakeTrackingConnection(
+            {"CLIENT ID": 1, "SUBSCRIBE": ["subscribe", INVALIDATE_CHANNEL, 1]}
+        )
+        anchor = FakeTrackingConnection(
+            {"CLIENT TRACKING": ResponseError("unknown subcommand")}
+        )
+
+        async def scenario():
+            pool = self._pool(listener, anchor)
+            with patch.object(tracking.ConnectionPool, "from_url", return_value=pool):
+                await track(cache, "redis://x", [FLOOR], FLOOR)
+
+        asyncio.run(scenario())
+        assert cache.enabled is False
+        assert not listener.connected and not anchor.connected
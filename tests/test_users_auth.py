@@ -13,9 +13,17 @@ from uuid import uuid4
 
 from fastapi.testclient import TestClient
 
+from app.crud import SearchTimeout
 from app.scopes import UserScope
 
-from .factories import OTHER_USER_ID, USER_ID, DummyUser, make_user, user_response
+from .factories import (
+    OTHER_USER_ID,
+    USER_ID,
+    DummyUser,
+    make_user,
+    user_response,
+    user_row,
+)
 
 USERS_CRUD_PATH = "app.routers.users"
 AUTH_CRUD_PATH = "app.routers.auth"
@@ -115,6 +123,80 @@ class TestRegisterUser:
         assert "Email" in resp.json()["detail"]
 
 
+# ---------------------------------------------------------------------------
+# GET /users/  &  GET /users/bulk
+# ---------------------------------------------------------------------------
+
+
+class TestListUsers:
+    def test_list_users(self, client_factory):
+        client = client_factory(make_user(scopes=[UserScope.READ]))
+        rows = [user_row(id=USER_ID), user_row(id=OTHER_USER_ID, username="other")]
+        with patch(f"{USERS_CRUD_PATH}.get_user_rows", new=AsyncMock(return_value=rows)):
+            resp = client.get("/users/")
+        assert resp.status_code == 200
+        assert [u["id"] for u in resp.json()] == [str(USER_ID), str(OTHER_USER_ID)]
+
+    def test_list_users_by_scope(self, client_factory):
+        client = client_factory(make_user(scopes=[UserScope.READ]))
+        mock = AsyncMock(return_value=[])
+        with patch(f"{USERS_CRUD_PATH}.get_user_rows", new=mock):
+            resp = client.get("/users/?scope=admin:venues&scope=bookings:manage")
+        assert resp.status_code == 200
+        assert mock.await_args.kwargs["scopes"] == ["admin:venues", "bookings:manage"]
+
+    def test_list_users_implied_scope(self, admin_client: TestClient):
+        with patch(f"{USERS_CRUD_PATH}.get_user_rows", new=AsyncMock(return_value=[])):
+            resp = admin_client.get("/users/")
+        assert resp.status_code == 200
+
+    def test_list_users_requires_scope(self, user_client: TestClient):
+        resp = user_client.get("/users/")
+        assert resp.status_code == 403
+
+    def test_bulk(self, user_client: TestClient):
+        rows = [user_row(id=OTHER_USER_ID, username="other")]
+        mock = AsyncMock(return_value=rows)
+        with patch(f"{USERS_CRUD_PATH}.get_user_rows_by_ids", new=mock):
+            resp = user_client.get(f"/users/bulk?ids={OTHER_USER_ID}")
+        assert resp.status_code == 200
+        assert resp.json()[0]["username"] == "other"
+        assert resp.json()[0]["scopes"] == rows[0]["scopes"]
+        assert mock.await_args.args[0] == [OTHER_USER_ID]
+
+
+# ---------------------------------------------------------------------------
+# GET /users/search
+# ---------------------------------------------------------------------------
+
+
+class TestSearchUsers:
+    def test_ranked_hits(self, admin_client: TestClient):
+        rows = [
+            {**user_row(id=OTHER_USER_ID, username="petrov"), "rank": 1.0},
+            {**user_row(username="ivan", full_name="Ivan Petrov"), "rank": 0.5},
+        ]
+        mock = AsyncMock(return_value=rows)
+        with patch(f"{USERS_CRUD_PATH}.search_users", new=mock):
+            resp = admin_client.get("/users/search?q=petrov&limit=10")
+        assert resp.status_code == 200
+        assert [hit["username"] for hit in resp.json()] == ["petrov", "ivan"]
+        assert resp.json()[0]["rank"] == 1.0
+        mock.assert_awaited_once_with("petrov", 10, 0)
+
+    def test_timeout(self, admin_client: TestClient):
+        with patch(
+            f"{USERS_CRUD_PATH}.search_users",
+            new=AsyncMock(side_effect=SearchTimeout("petrov")),
+        ):
+            resp = admin_client.get("/users/search?q=petrov")
+        assert resp.status_code == 504
+
+    def test_query_too_short(self, admin_client: TestClient):
+        resp = admin_client.get("/users/search?q=p")
+        assert resp.status_code == 422
+
+
 # ---------------------------------------------------------------------------
 # GET /scopes/
 # ---------------------------------------------------------------------------
@@ -162,6 +244,17 @@ class TestUserScopes:
         assert resp.status_code == 200
         assert resp.json() == {"scopes": new_scopes}
 
+    def test_put_user_scopes_rejects_unknown(self, admin_client: TestClient):
+        mock = AsyncMock()
+        with patch(f"{USERS_CRUD_PATH}.update_user_scopes", new=mock):
+            resp = admin_client.put(
+                f"/users/{OTHER_USER_ID}/scopes",
+                json={"scopes": [UserScope.READ, "users:everything"]},
+            )
+        assert resp.status_code == 422
+        assert "users:everything" in resp.json()["detail"]
+        mock.assert_not_awaited()
+
     def test_put_user_scopes_not_found(self, admin_client: TestClient):
         with patch(
             f"{USERS_CRUD_PATH}.update_user_scopes", new=AsyncMock(return_value=None)
@@ -172,6 +265,57 @@ class TestUserScopes:
         assert resp.status_code == 404
 
 
+# ---------------------------------------------------------------------------
+# ETag / If-None-Match
+# ---------------------------------------------------------------------------
+
+
+class TestConditionalGet:
+    def test_me_returns_etag(self, user_client: TestClient):
+        resp = user_client.get("/users/@me/get")
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] == f'"{USER_ID}-1"'
+
+    def test_me_not_modified(self, user_client: TestClient):
+        resp = user_client.get(
+            "/users/@me/get", headers={"If-None-Match": f'"{USER_ID}-1"'}
+        )
+        assert resp.status_code == 304
+        assert resp.content == b""
+
+    def test_me_stale_etag(self, user_client: TestClient):
+        resp = user_client.get(
+            "/users/@me/get", headers={"If-None-Match": f'"{USER_ID}-0"'}
+        )
+        assert resp.status_code == 200
+
+    def test_scopes_not_modified_skips_full_fetch(self, admin_client: TestClient):
+        full_fetch = AsyncMock()
+        with (
+            patch(f"{USERS_CRUD_PATH}.get_user_version", new=AsyncMock(return_value=3)),
+            patch(f"{USERS_CRUD_PATH}.get_user_by_id", new=full_fetch),
+        ):
+            resp = admin_client.get(
+                f"/users/{OTHER_USER_ID}/scopes",
+                headers={"If-None-Match": f'W/"{OTHER_USER_ID}-3"'},
+            )
+        assert resp.status_code == 304
+        full_fetch.assert_not_awaited()
+
+    def test_scopes_changed_version(self, admin_client: TestClient):
+        stored = DummyUser(user_id=OTHER_USER_ID, scopes=[UserScope.READ], version=4)
+        with (
+            patch(f"{USERS_CRUD_PATH}.get_user_version", new=AsyncMock(return_value=4)),
+            patch(f"{USERS_CRUD_PATH}.get_user_by_id", new=AsyncMock(return_value=stored)),
+        ):
+            resp = admin_client.get(
+                f"/users/{OTHER_USER_ID}/scopes",
+                headers={"If-None-Match": f'"{OTHER_USER_ID}-3"'},
+            )
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] == f'"{OTHER_USER_ID}-4"'
+
+
 # ---------------------------------------------------------------------------
 # GET /auth/verify-email
 # ---------------------------------------------------------------------------